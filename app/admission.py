@@ -0,0 +1,229 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from app import settings
+from app.metrics import registry, Counter, Gauge
+from app.tracing import span
+
+logger = logging.getLogger("ITA-Addon")
+
+ADMISSION_SHED = registry.add(Counter(
+    "addon_admission_shed_total", "Lavoro upstream rifiutato per sovraccarico, per motivo.", ("reason",)))
+ADMISSION_QUEUE = registry.add(Gauge(
+    "addon_admission_queue_depth", "Raccolte in attesa di uno slot upstream."))
+
+
+class Overloaded(Exception):
+    """Lavoro upstream rifiutato: la coda è troppo lunga o l'attesa supererebbe la deadline."""
+
+    def __init__(self, reason: str, wait: float = 0.0):
+        super().__init__(f"{reason} (attesa stimata {wait:.1f}s)" if wait else reason)
+        self.reason = reason
+        self.wait = wait
+
+
+class AdmissionController:
+    """
+    Governatore globale del lavoro upstream (una raccolta stream = fan-out su provider e resolver).
+    - Al massimo 'max_active' raccolte in esecuzione (0 = nessun limite).
+    - Chi è in attesa sta in una coda per utente (tenant = config): gli slot liberi vengono
+      assegnati a turno tra i tenant, così un client pesante non affama gli altri.
+    - Load shedding: se l'attesa stimata (posizione nel turno x durata media di una raccolta)
+      supera la deadline della richiesta, o la coda del tenant è piena, si rifiuta subito (Overloaded)
+      invece di accodare lavoro che arriverebbe comunque troppo tardi.
+    """
+
+    def __init__(self, max_active: int, tenant_queue: int, service_time: float):
+        self.max_active = max_active
+        self.tenant_queue = max(1, tenant_queue)
+        self.service_time = service_time  # Media mobile (EWMA) della durata di una raccolta
+        self.active = 0
+        self._queues = OrderedDict()  # tenant -> deque di future, in ordine di turno
+        self.admitted = 0
+        self.shed = 0
+
+    @property
+    def waiting(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def estimate_wait(self, tenant) -> float:
+        """Attesa prevista per un nuovo arrivo di 'tenant', con l'assegnazione a turno."""
+        if self.active < self.max_active and not self._queues:
+            return 0.0
+        position = len(self._queues.get(tenant, ())) + 1
+        # A turno: prima di noi passa al massimo 'position' raccolte di ogni altro tenant
+        ahead = sum(min(len(q), position) for t, q in self._queues.items() if t != tenant) + position
+        return ahead / self.max_active * self.service_time
+
+    def _reject(self, reason: str, wait: float = 0.0):
+        self.shed += 1
+        ADMISSION_SHED.inc(reason)
+        raise Overloaded(reason, wait)
+
+    async def acquire(self, tenant, deadline: float = None):
+        if self.max_active <= 0:
+            return
+        if self.active < self.max_active and not self._queues:
+            self.active += 1
+            self.admitted += 1
+            return
+        queue = self._queues.get(tenant)
+        if queue is not None and len(queue) >= self.tenant_queue:
+            self._reject("tenant_queue_full")
+        wait = self.estimate_wait(tenant)
+        if deadline and wait > deadline:
+            self._reject("deadline", wait)
+
+        if queue is None:
+            queue = self._queues[tenant] = deque()
+        waiter = asyncio.get_running_loop().create_future()
+        queue.append(waiter)
+        ADMISSION_QUEUE.set(self.waiting)
+        try:
+            # Lo slot viene passato direttamente da release() (active resta invariato)
+            with span("admission_wait"):
+                await asyncio.wait_for(waiter, timeout=deadline or None)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # Slot assegnato proprio mentre rinunciavamo: va restituito
+                self.release()
+            else:
+                self._discard(tenant, waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                self._reject("timeout", deadline)
+            raise
+        self.admitted += 1
+
+    def _discard(self, tenant, waiter):
+        queue = self._queues.get(tenant)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            if not queue:
+                del self._queues[tenant]
+        ADMISSION_QUEUE.set(self.waiting)
+
+    def release(self):
+        if self.max_active <= 0:
+            return
+        while self._queues:
+            # Turno: il primo tenant serve una raccolta e passa in fondo
+            tenant, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+            if queue:
+                self._queues.move_to_end(tenant)
+            else:
+                del self._queues[tenant]
+            if not waiter.done():
+                waiter.set_result(None)
+                ADMISSION_QUEUE.set(self.waiting)
+                return
+        self.active -= 1
+        ADMISSION_QUEUE.set(0)
+
+    def observe(self, elapsed: float):
+        self.service_time += 0.2 * (elapsed - self.service_time)
+
+    @asynccontextmanager
+    async def slot(self, tenant, deadline: float = None):
+        await self.acquire(tenant, deadline)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            if self.max_active > 0:
+                self.observe(time.monotonic() - started)
+            self.release()
+
+    def stats(self) -> dict:
+        return {
+            "max_active": self.max_active,
+            "active": self.active,
+            "waiting": self.waiting,
+            "tenants_waiting": len(self._queues),
+            "service_time": round(self.service_time, 3),
+            "admitted": self.admitted,
+            "shed": self.shed,
+        }
+
+
+class TokenBucket:
+    """'rate' richieste/secondo con picchi fino a 'burst'. Le prenotazioni in attesa si accodano nel tempo."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def reserve(self, max_wait: float = None):
+        """Prende un gettone e ritorna i secondi da attendere; None se l'attesa supererebbe max_wait."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        wait = max(0.0, (1 - self.tokens) / self.rate)
+        if max_wait is not None and wait > max_wait:
+            return None
+        self.tokens -= 1
+        return wait
+
+
+class HostBuckets:
+    """
+    Token bucket per host upstream. I limiti si scelgono per frammento del nome host
+    (UPSTREAM_HOST_RATES="vixsrc=5,mixdrop=3": vale per tutti i domini mixdrop),
+    altrimenti UPSTREAM_HOST_RATE (0 = nessun limite).
+    """
+
+    def __init__(self, rates: dict, default_rate: float, burst: float, max_wait: float, max_hosts: int = 1024):
+        self.rates = rates
+        self.default_rate = default_rate
+        self.burst = burst
+        self.max_wait = max_wait
+        self.max_hosts = max_hosts
+        self._buckets = OrderedDict()  # host -> bucket, dal meno recente
+        self.rejected = 0
+
+    def _rate_for(self, host: str) -> float:
+        for fragment, rate in self.rates.items():
+            if fragment in host:
+                return rate
+        return self.default_rate
+
+    def _bucket(self, host: str):
+        if host in self._buckets:
+            self._buckets.move_to_end(host)
+            return self._buckets[host]
+        rate = self._rate_for(host)
+        bucket = self._buckets[host] = TokenBucket(rate, self.burst) if rate > 0 else None
+        if len(self._buckets) > self.max_hosts:
+            # Host usato meno di recente: se torna riparte con il bucket pieno
+            self._buckets.popitem(last=False)
+        return bucket
+
+    async def wait(self, host: str):
+        bucket = self._bucket(host)
+        if bucket is None:
+            return
+        delay = bucket.reserve(self.max_wait if self.max_wait > 0 else None)
+        if delay is None:
+            self.rejected += 1
+            ADMISSION_SHED.inc("host_rate")
+            raise Overloaded(f"limite di richieste per {host}")
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        return {
+            host: round(bucket.tokens, 2) for host, bucket in self._buckets.items() if bucket is not None
+        }
+
+
+admission = AdmissionController(
+    settings.ADMISSION_MAX_ACTIVE, settings.ADMISSION_TENANT_QUEUE, settings.ADMISSION_SERVICE_TIME,
+)
+host_buckets = HostBuckets(
+    settings.UPSTREAM_HOST_RATES, settings.UPSTREAM_HOST_RATE,
+    settings.UPSTREAM_HOST_BURST, settings.UPSTREAM_HOST_MAX_WAIT, settings.HTTP_TRACKED_HOSTS,
+)
@@ -0,0 +1,129 @@
+import logging
+import time
+from collections import deque
+from app import settings
+
+logger = logging.getLogger("ITA-Addon")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class UpstreamError(Exception):
+    """
+    Fonte condivisa di un provider in errore (HTTP 5xx/429/403, rete). Il provider la solleva
+    invece di ritornare [], così process_provider la conta come fallimento nel suo breaker.
+    "Non trovato" (404, pagina senza player) non è un errore: il provider ritorna [] come prima.
+    """
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker con finestra mobile (BREAKER_WINDOW secondi) di esiti e latenze.
+    Esiti registrati da chi lo usa: per i provider (process_provider) timeout ed eccezioni,
+    comprese le UpstreamError; per gli host dei resolver gli errori di rete/HTTP (ResolveError.host_fault).
+    - closed: tutto passa; si apre se l'error rate supera BREAKER_ERROR_RATE
+      (le chiamate più lente di BREAKER_SLOW_CALL contano come errori).
+    - open: le chiamate vengono saltate subito per BREAKER_COOLDOWN secondi.
+    - half_open: passa una sola chiamata di prova; se va bene si richiude.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = CLOSED
+        self._calls = deque()  # (timestamp, ok, latency)
+        self._opened_at = 0.0
+        self._probing = False
+        self.skipped = 0
+
+    def _trim(self, now):
+        limit = now - settings.BREAKER_WINDOW
+        while self._calls and self._calls[0][0] < limit:
+            self._calls.popleft()
+
+    def allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        now = time.monotonic()
+        if self.state == OPEN and now - self._opened_at >= settings.BREAKER_COOLDOWN:
+            self.state = HALF_OPEN
+            self._probing = False
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        self.skipped += 1
+        return False
+
+    def record(self, ok: bool, latency: float):
+        now = time.monotonic()
+        ok = ok and latency < settings.BREAKER_SLOW_CALL
+        if self.state == HALF_OPEN:
+            self._probing = False
+            if ok:
+                self.state = CLOSED
+                self._calls.clear()
+                logger.info(f"🟢 Circuito {self.name} richiuso.")
+            else:
+                self._open(now, "probe fallito")
+            return
+        self._calls.append((now, ok, latency))
+        self._trim(now)
+        if self.state == CLOSED and len(self._calls) >= settings.BREAKER_MIN_CALLS:
+            if self.error_rate() >= settings.BREAKER_ERROR_RATE:
+                self._open(now, f"error rate {self.error_rate():.0%}")
+
+    def release(self):
+        """Chiamata annullata senza esito (es. shutdown): libera lo slot di probe."""
+        if self.state == HALF_OPEN:
+            self._probing = False
+
+    def _open(self, now, reason):
+        self.state = OPEN
+        self._opened_at = now
+        logger.warning(f"🔴 Circuito {self.name} aperto ({reason}), pausa di {settings.BREAKER_COOLDOWN}s.")
+
+    def error_rate(self) -> float:
+        if not self._calls:
+            return 0.0
+        return sum(1 for _ts, ok, _lat in self._calls if not ok) / len(self._calls)
+
+    def health(self) -> float:
+        """Punteggio 0..1: quota di successi, penalizzata dalla latenza media."""
+        if self.state == OPEN:
+            return 0.0
+        if not self._calls:
+            return 1.0
+        avg_latency = sum(lat for _ts, _ok, lat in self._calls) / len(self._calls)
+        slowness = min(avg_latency / settings.BREAKER_SLOW_CALL, 1.0)
+        return round((1 - self.error_rate()) * (1 - 0.5 * slowness), 3)
+
+    def snapshot(self) -> dict:
+        self._trim(time.monotonic())
+        latencies = sorted(lat for _ts, _ok, lat in self._calls)
+        return {
+            "state": self.state,
+            "calls": len(self._calls),
+            "error_rate": round(self.error_rate(), 3),
+            "p50_ms": round(latencies[len(latencies) // 2] * 1000) if latencies else None,
+            "health": self.health(),
+            "skipped": self.skipped,
+        }
+
+
+class BreakerRegistry:
+    def __init__(self):
+        self._breakers = {}
+
+    def get(self, name: str) -> CircuitBreaker:
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            breaker = self._breakers[name] = CircuitBreaker(name)
+        return breaker
+
+    def snapshot(self) -> dict:
+        return {name: b.snapshot() for name, b in sorted(self._breakers.items())}
+
+
+# Un breaker per provider ("provider:VixSrc") e per host dei resolver ("host:MixDrop")
+breakers = BreakerRegistry()
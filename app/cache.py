@@ -0,0 +1,73 @@
+import asyncio
+import time
+from collections import OrderedDict
+from app.metrics import cache_lookup
+
+# Sentinella per distinguere "non in cache" da un valore None salvato (miss negativo)
+MISSING = object()
+
+
+class TTLCache:
+    """
+    Cache in memoria con scadenza per singola voce e limite di dimensione (LRU).
+    Non thread-safe: va usata solo dall'event loop.
+    Con 'name' le letture vengono contate nelle metriche (hit/miss).
+    """
+
+    def __init__(self, maxsize: int, ttl: float, name: str = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self._data = OrderedDict()  # key -> (expires_at, value)
+
+    def get(self, key, default=MISSING):
+        item = self._data.get(key)
+        if item is not None and item[0] <= time.monotonic():
+            del self._data[key]
+            item = None
+        if self.name:
+            cache_lookup(self.name, item is not None)
+        if item is None:
+            return default
+        self._data.move_to_end(key)
+        return item[1]
+
+    def set(self, key, value, ttl: float = None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SingleFlight:
+    """
+    Unisce chiamate concorrenti con la stessa chiave in un'unica esecuzione:
+    chi arriva mentre la prima è in corso ne attende il risultato.
+    """
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, fn):
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _t: self._calls.pop(key, None))
+        # shield: se un chiamante viene cancellato, gli altri continuano ad attendere
+        return await asyncio.shield(task)
+
+    def __contains__(self, key):
+        return key in self._calls
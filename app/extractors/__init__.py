@@ -1,11 +1,54 @@
-from .vix import VixProvider
-from .guardahd import GuardaHDProvider
-
-# Lista dei provider attivi che il server interrogherà.
-# Inserendo le istanze qui, il ciclo nel main.py le eseguirà tutte automaticamente.
-PROVIDERS = [
-    VixProvider(),
-    GuardaHDProvider(),
+import importlib
+
+class ProviderSpec:
+    """
+    Descrizione di un provider: cosa sa fare e cosa gli serve.
+    Il modulo del provider viene importato solo al primo uso.
+    - types: tipi Stremio supportati ("movie", "series")
+    - requires: chiavi della config utente senza le quali il provider non può funzionare
+    - cost: costo indicativo di una ricerca (richieste upstream); i più economici partono per primi
+    """
+
+    def __init__(self, name: str, module: str, cls: str, types=("movie", "series"), requires=(), cost: int = 1):
+        self.name = name
+        self.module = module
+        self.cls = cls
+        self.types = tuple(types)
+        self.requires = tuple(requires)
+        self.cost = cost
+        self._instance = None
+
+    @property
+    def provider(self):
+        if self._instance is None:
+            module = importlib.import_module(f"{__name__}.{self.module}")
+            self._instance = getattr(module, self.cls)()
+        return self._instance
+
+    def can_run(self, type: str, config: dict) -> bool:
+        return type in self.types and all(config.get(key) for key in self.requires)
+
+
+# Registro dei provider, nell'ordine in cui compaiono i loro stream nella risposta.
+# Per aggiungerne uno basta una riga qui: main.py interroga quelli utilizzabili per la richiesta.
+REGISTRY = [
+    ProviderSpec("VixSrc", "vix", "VixProvider", types=("movie", "series"), requires=("tmdb_key",), cost=1),
+    ProviderSpec("GuardaHD", "guardahd", "GuardaHDProvider", types=("movie",), requires=("tmdb_key", "mfp_url"), cost=3),
 ]
 
-__all__ = ["PROVIDERS"]
+def enabled_for(config: dict) -> list:
+    """
+    Provider scelti dall'utente: chiave "providers" della config (lista di nomi).
+    Senza la chiave sono attivi tutti.
+    """
+    chosen = config.get("providers")
+    if not isinstance(chosen, list):
+        return list(REGISTRY)
+    chosen = {str(name).lower() for name in chosen}
+    return [spec for spec in REGISTRY if spec.name.lower() in chosen]
+
+def providers_for(type: str, config: dict) -> list:
+    """Provider da interrogare per questa richiesta: abilitati dall'utente e in grado di rispondere."""
+    return [spec for spec in enabled_for(config) if spec.can_run(type, config)]
+
+__all__ = ["REGISTRY", "ProviderSpec", "enabled_for", "providers_for"]
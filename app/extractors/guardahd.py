@@ -1,19 +1,30 @@
+import asyncio
 import logging
-import json
 import os
 import time
 import base64
 import urllib.parse
-from bs4 import BeautifulSoup
+from app import settings
 from app.utils import get_tmdb_info
-from app.resolvers import resolve_supervideo, resolve_mixdrop, resolve_maxstream
+from app.resolvers import NOT_FOUND, ResolveError, resolve_cached, resolver_for
+from app.store import PersistentCache
+from app.scanners import MovieLinksScanner
+from app.breaker import breakers
+from app.metrics import RESOLVER_FAILURES, RESOLVER_LATENCY, cache_lookup
+from app.refresh import refresher
+from app.admission import Overloaded
+from app.tracing import span
+from app.logs import SampledLogger
 
 logger = logging.getLogger("ITA-Addon")
+request_log = SampledLogger(logger)
 
 # --- COSTANTI DAL FILE JS ---
-CACHE_FILE = os.path.join(os.getcwd(), 'config', 'guardahd_embeds.json')
-CACHE_TTL = 12 * 60 * 60  # 12 Ore in secondi
-BASE_URL = 'https://mostraguarda.stream'
+CACHE_FILE = os.path.join(os.getcwd(), 'config', 'guardahd_embeds.json')  # Vecchio formato, importato una volta
+CACHE_DB = os.path.join(os.getcwd(), 'config', 'guardahd_embeds.db')
+CACHE_TTL = settings.GUARDAHD_CACHE_TTL    # 12 Ore in secondi: poi la voce è "stale"
+STALE_TTL = settings.GUARDAHD_STALE_TTL    # Oltre, la voce viene eliminata
+BASE_URL = settings.GUARDAHD_BASE_URL
 
 # Header copiati ESATTAMENTE dal file JS per bypassare protezioni
 HEADERS_DEF = {
@@ -22,41 +33,35 @@ HEADERS_DEF = {
     'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8'
 }
 
+# Cache embed: SQLite (WAL) + indice in memoria, I/O fuori dall'event loop
+embed_cache = PersistentCache(CACHE_DB, table="guardahd_embeds", legacy_json=CACHE_FILE)
+
+# Semafori per host dei resolver (es. "MixDrop" -> Semaphore)
+_host_limits = {}
+
+def movie_page_fields(scanner: MovieLinksScanner):
+    """
+    Titolo ed embed grezzi trovati dallo scanner nella pagina mostraguarda.
+    Ritorna (titolo o None, lista url).
+    """
+    # Estrazione Titolo
+    title = None
+    if scanner.title is not None:
+        title = scanner.title.replace('Streaming', '').strip()
+
+    # Estrazione Embed (extractEmbedUrlsFromHtml del JS)
+    raw_urls = []
+    for u in scanner.links:
+        if u.startswith('//'): u = 'https:' + u
+        raw_urls.append(u)
+    return title, raw_urls
+
 class GuardaHDProvider:
     def get_name(self):
         return "GuardaHD"
 
     # ==========================================
-    # 1. GESTIONE CACHE (Uguale al JS)
-    # ==========================================
-    def _read_cache(self):
-        if not os.path.exists(CACHE_FILE):
-            return {}
-        try:
-            with open(CACHE_FILE, 'r') as f:
-                return json.load(f)
-        except Exception:
-            return {}
-
-    def _write_cache(self, cache_data):
-        try:
-            os.makedirs(os.path.dirname(CACHE_FILE), exist_ok=True)
-            with open(CACHE_FILE, 'w') as f:
-                json.dump(cache_data, f, indent=2)
-        except Exception:
-            pass
-
-    def _purge_cache(self, cache):
-        now = time.time()
-        keys_to_remove = [k for k, v in cache.items() if now - (v.get('timestamp', 0) / 1000) > CACHE_TTL] # JS usa ms, Python s. Adattiamo.
-        
-        if keys_to_remove:
-            for k in keys_to_remove:
-                del cache[k]
-            self._write_cache(cache)
-
-    # ==========================================
-    # 2. HELPER TITOLI (Stile JS)
+    # 1. HELPER TITOLI (Stile JS)
     # ==========================================
     def _generate_rich_description(self, title, quality="HD"):
         # Replica la funzione generateRichDescription del JS
@@ -69,14 +74,119 @@ class GuardaHDProvider:
         ]
         return "\n".join(lines)
 
+    async def _drop_embed(self, clean_id: str, link: str):
+        """Toglie dalla lista in cache un embed il cui file non esiste più."""
+        entry = await embed_cache.get(clean_id)
+        if not entry or link not in entry.get('embedUrls', []):
+            return
+        entry = {**entry, "embedUrls": [u for u in entry['embedUrls'] if u != link]}
+        await embed_cache.set(clean_id, entry, timestamp=entry.get('timestamp'))
+        logger.info(f"[GH] Embed rimosso dalla cache di {clean_id}: {link}")
+
+    async def _resolve_limited(self, resolver, link, clean_id, client):
+        # Massimo N risoluzioni simultanee per host, per non farsi limitare da mixdrop/supervideo
+        host_name = resolver.name
+        sem = _host_limits.get(host_name)
+        if sem is None:
+            sem = _host_limits[host_name] = asyncio.Semaphore(settings.RESOLVER_PER_HOST_LIMIT)
+        breaker = breakers.get(f"host:{host_name}")
+
+        async def _fetch():
+            # Host giù (circuito aperto): niente attesa fino al timeout
+            if not breaker.allow():
+                return None
+            async with sem:
+                started = time.monotonic()
+                host_ok = False
+                try:
+                    direct_url = await resolver.resolve(link, client)
+                    host_ok = True
+                    return direct_url
+                except ResolveError as e:
+                    # Un file rimosso o una pagina senza link non sono colpa dell'host
+                    host_ok = not e.host_fault
+                    RESOLVER_FAILURES.inc(host_name, e.reason)
+                    logger.debug(f"[GH] {host_name}: {link} non risolto ({e})")
+                    if e.reason == NOT_FOUND:
+                        await self._drop_embed(clean_id, link)
+                    return None
+                except Overloaded:
+                    host_ok = None  # Limite di richieste nostro: nessun esito per il breaker
+                    raise
+                except asyncio.CancelledError:
+                    host_ok = None  # Client disconnesso o deadline: l'host non ha colpe
+                    raise
+                finally:
+                    elapsed = time.monotonic() - started
+                    if host_ok is None:
+                        breaker.release()
+                    else:
+                        breaker.record(host_ok, elapsed)
+                        RESOLVER_LATENCY.observe(elapsed, host_name)
+
+        # Il limite vale solo per le risoluzioni reali, i link in cache tornano subito
+        return await resolve_cached(link, _fetch)
+
+    async def _scrape(self, clean_id: str, target_url: str, request_headers: dict, client):
+        """
+        Scarica la pagina del film (via proxy MFP) e salva gli embed in cache.
+        Ritorna (titolo o None, lista embed).
+        Gli errori qui non vanno al breaker del provider (nessuna UpstreamError): la richiesta passa
+        dal MFP dell'utente e un proxy rotto aprirebbe il circuito per tutti. Gli host degli embed
+        hanno invece i loro breaker (_resolve_limited).
+        """
+        # --- SCRAPING (Replica JS fetchText) ---
+        # URL: {PROXY}/{BASE_URL}/movie/{IMDB}
+        real_title = None
+        embed_urls = []
+        try:
+            # Timeout aumentato come nel JS (10000ms)
+            # Lettura in streaming fino alla fine della lista degli embed
+            scanner = MovieLinksScanner()
+            with span("mostraguarda"):
+                res = await client.scan(target_url, scanner, headers=request_headers, allow_redirects=True, timeout=10)
+            
+            if res.status_code == 200:
+                page_title, raw_urls = movie_page_fields(scanner)
+                if page_title:
+                    real_title = page_title
+                
+                # Filtro host supportati (quelli con un resolver registrato)
+                for u in raw_urls:
+                    if not u or not u.startswith('http'): continue
+                    if 'mostraguarda' in u: continue # Evita self-reference
+                    
+                    if resolver_for(u) is not None:
+                        if u not in embed_urls:
+                            embed_urls.append(u)
+                
+                # Salvataggio Cache
+                if embed_urls:
+                    now_ms = time.time() * 1000
+                    await embed_cache.set(clean_id, {
+                        "timestamp": now_ms,
+                        "embedUrls": embed_urls,
+                        "title": real_title or clean_id
+                    }, timestamp=now_ms)
+                    request_log.info("[GH] Trovati %d embed.", len(embed_urls))
+                else:
+                    logger.warning(f"[GH] Nessun embed valido trovato per {clean_id}")
+            else:
+                logger.warning(f"[GH] Errore HTTP {res.status_code} su {target_url}")
+
+        except Overloaded:
+            raise  # Limite nostro sull'host del proxy: nessuna lista, ma non "film senza embed"
+        except Exception as e:
+            logger.error(f"[GH] Errore Scraping: {e}")
+        return real_title, embed_urls
+
     # ==========================================
-    # 3. LOGICA PRINCIPALE
+    # 2. LOGICA PRINCIPALE
     # ==========================================
     async def get_stream(self, imdb_id: str, type: str, config: dict, client):
         if type != "movie":
             return []  # Il JS gestisce solo film
 
-        streams = []
         mfp_url = config.get("mfp_url")
         mfp_pass = config.get("mfp_pass")
 
@@ -101,117 +211,116 @@ class GuardaHDProvider:
         # Pulizia ID (tt12345)
         clean_id = imdb_id.split(":")[0]
 
-        # --- GESTIONE CACHE ---
-        cache = self._read_cache()
+        # --- GESTIONE CACHE (stale-while-revalidate) ---
+        # Purge incrementale delle voci oltre lo STALE_TTL (pochi elementi per volta)
+        await embed_cache.purge(STALE_TTL)
         # Nota: nel JS il timestamp è in ms, qui usiamo ms per compatibilità
         now_ms = time.time() * 1000
+        target_url = f"{base_proxy}{BASE_URL}/movie/{clean_id}"
+
+        async def refresh(refresh_client):
+            # Usato dallo scheduler: ritorna la nuova scadenza (epoch s) se lo scraping è riuscito
+            _title, urls = await self._scrape(clean_id, target_url, request_headers, refresh_client)
+            return time.time() + CACHE_TTL if urls else None
         
-        cached_entry = cache.get(clean_id)
+        with span("embed_cache"):
+            cached_entry = await embed_cache.get(clean_id)
         embed_urls = []
         real_title = clean_id
         
-        # Verifica validità cache (TTL)
-        if cached_entry and (now_ms - cached_entry.get('timestamp', 0) < (CACHE_TTL * 1000)):
-            logger.info(f"[GH] Cache HIT per {clean_id}")
+        # Verifica validità cache: fresca (CACHE_TTL) o stale (fino a STALE_TTL)
+        age_ms = now_ms - cached_entry.get('timestamp', 0) if cached_entry else None
+        cache_hit = age_ms is not None and age_ms < STALE_TTL * 1000
+        cache_lookup("guardahd_embeds", cache_hit)
+        if cache_hit:
             embed_urls = cached_entry.get('embedUrls', [])
             real_title = cached_entry.get('title', clean_id)
+            if age_ms < CACHE_TTL * 1000:
+                request_log.info("[GH] Cache HIT per %s", clean_id)
+            else:
+                # Voce scaduta: la serviamo subito e la rinfreschiamo in background
+                request_log.info("[GH] Cache STALE per %s, rinfresco in background.", clean_id)
+                refresher.refresh(("guardahd", clean_id), refresh)
+            expires_at = cached_entry.get('timestamp', 0) / 1000 + CACHE_TTL
         else:
-            logger.info(f"[GH] Cache MISS per {clean_id}. Scraping...")
-            
-            # --- SCRAPING (Replica JS fetchText) ---
-            # URL: {PROXY}/{BASE_URL}/movie/{IMDB}
-            target_url = f"{base_proxy}{BASE_URL}/movie/{clean_id}"
-            
-            try:
-                # Timeout aumentato come nel JS (10000ms)
-                res = await client.get(target_url, headers=request_headers, allow_redirects=True, timeout=10)
-                
-                if res.status_code == 200:
-                    html = res.text
-                    soup = BeautifulSoup(html, 'lxml')
-                    
-                    # Estrazione Titolo
-                    page_title = soup.find('h1')
-                    if page_title:
-                        real_title = page_title.text.strip().replace('Streaming', '').strip()
-
-                    # Estrazione Embed (extractEmbedUrlsFromHtml del JS)
-                    raw_urls = []
-                    for tag in soup.select('[data-link]'):
-                        u = tag.get('data-link', '').strip()
-                        if u.startswith('//'): u = 'https:' + u
-                        raw_urls.append(u)
-                    
-                    # Filtro domini supportati (Mixdrop/Supervideo)
-                    supported_domains = ['mixdrop', 'supervideo']
-                    embed_urls = []
-                    for u in raw_urls:
-                        if not u or not u.startswith('http'): continue
-                        if 'mostraguarda' in u: continue # Evita self-reference
-                        
-                        # Verifica se contiene uno dei domini supportati
-                        if any(d in u for d in supported_domains):
-                            if u not in embed_urls:
-                                embed_urls.append(u)
-                    
-                    # Salvataggio Cache
-                    if embed_urls:
-                        cache[clean_id] = {
-                            "timestamp": now_ms,
-                            "embedUrls": embed_urls,
-                            "title": real_title
-                        }
-                        self._write_cache(cache)
-                        logger.info(f"[GH] Trovati {len(embed_urls)} embed.")
-                    else:
-                        logger.warning(f"[GH] Nessun embed valido trovato per {clean_id}")
-                else:
-                    logger.warning(f"[GH] Errore HTTP {res.status_code} su {target_url}")
+            request_log.info("[GH] Cache MISS per %s. Scraping...", clean_id)
+            scraped_title, embed_urls = await self._scrape(clean_id, target_url, request_headers, client)
+            real_title = scraped_title or clean_id
+            expires_at = time.time() + CACHE_TTL
 
-            except Exception as e:
-                logger.error(f"[GH] Errore Scraping: {e}")
+        # Popolarità per il rinfresco anticipato (i titoli richiesti spesso non scadono mai sul percorso utente)
+        if embed_urls:
+            refresher.track(("guardahd", clean_id), expires_at, refresh)
 
         # --- RISOLUZIONE STREAM ---
         # Il JS usa estrattori specifici, qui usiamo i resolver Python equivalenti
         # ma formattiamo l'output come nel JS ("🦁 GuardaHD...")
-        
-        logger.info(f"[GH] Risoluzione di {len(embed_urls)} url...")
-        
-        unique_streams = set()
+        return await self._resolve_embeds(embed_urls, real_title, clean_id, request_headers, client)
 
+    async def _resolve_embeds(self, embed_urls: list, real_title, clean_id: str, request_headers: dict, client):
+        """
+        Link diretti degli embed, nell'ordine degli embed.
+        Solleva Overloaded se qualche embed non è stato risolto per i nostri limiti.
+        """
+        request_log.info("[GH] Risoluzione di %d url...", len(embed_urls))
+        
+        # Risoluzione concorrente: limite per host e deadline complessiva.
+        # I risultati vengono poi letti nell'ordine degli embed (output deterministico).
+        # Resolver scelto per host (registro in app/resolvers.py)
+        jobs = []
         for link in embed_urls:
+            resolver = resolver_for(link)
+            if resolver is not None:
+                jobs.append((link, resolver))
+
+        tasks = [
+            asyncio.ensure_future(self._resolve_limited(resolver, link, clean_id, client))
+            for link, resolver in jobs
+        ]
+        if tasks:
             try:
-                resolver = None
-                host_name = ""
+                with span("guardahd_resolve", embeds=len(tasks)):
+                    _done, pending = await asyncio.wait(tasks, timeout=settings.GUARDAHD_RESOLVE_DEADLINE)
+                if pending:
+                    logger.warning(f"[GH] Deadline superata: {len(pending)} embed non risolti in tempo.")
+            finally:
+                for task in tasks:
+                    if not task.done():
+                        task.cancel()
+
+        streams = []
+        unique_streams = set()
+        shed = late = 0
+
+        for (link, resolver), task in zip(jobs, tasks):
+            if not task.done() or task.cancelled():
+                late += 1
+                continue
+            error = task.exception()
+            if error is not None:
+                shed += isinstance(error, Overloaded)
+                continue
+            direct_url = task.result()
+
+            if direct_url and direct_url not in unique_streams:
+                unique_streams.add(direct_url)
                 
-                if 'mixdrop' in link:
-                    resolver = resolve_mixdrop
-                    host_name = "MixDrop"
-                elif 'supervideo' in link:
-                    resolver = resolve_supervideo
-                    host_name = "SuperVideo"
+                # Generazione Titolo "Rich" stile JS
+                rich_title = self._generate_rich_description(real_title, "HD")
                 
-                if resolver:
-                    # Risoluzione
-                    direct_url = await resolver(link, client)
-                    
-                    if direct_url and direct_url not in unique_streams:
-                        unique_streams.add(direct_url)
-                        
-                        # Generazione Titolo "Rich" stile JS
-                        rich_title = self._generate_rich_description(real_title, "HD")
-                        
-                        streams.append({
-                            "name": f"🦁 GuardaHD\n⚡ {host_name}",
-                            "title": rich_title,
-                            "url": direct_url,
-                            "behaviorHints": {
-                                "bingeGroup": "guardahd",
-                                "notWebReady": True,
-                                "proxyHeaders": {"request": {"User-Agent": request_headers['User-Agent']}}
-                            }
-                        })
-            except Exception:
-                pass
+                streams.append({
+                    "name": f"🦁 GuardaHD\n⚡ {resolver.name}",
+                    "title": rich_title,
+                    "url": direct_url,
+                    "behaviorHints": {
+                        "bingeGroup": "guardahd",
+                        "notWebReady": True,
+                        "proxyHeaders": {"request": {"User-Agent": request_headers['User-Agent']}}
+                    }
+                })
 
+        if shed or late:
+            # Mirror saltati per limiti nostri (token bucket per host, deadline): risposta incompleta,
+            # il provider risulta fallito e la raccolta va in cache solo per STREAM_CACHE_EMPTY_TTL
+            raise Overloaded(f"[GH] {shed} embed rifiutati dal limite per host, {late} oltre la deadline")
         return streams
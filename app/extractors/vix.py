@@ -1,12 +1,41 @@
 import re
 import logging
-from bs4 import BeautifulSoup, SoupStrainer
-from fake_headers import Headers
+from app import settings
 from app.utils import get_tmdb_info
+from app.resolvers import resolve_cached
+from app.admission import Overloaded
+from app.breaker import UpstreamError
+from app.scanners import BodyScriptScanner
+from app.tracing import span
+from app.logs import SampledLogger
 
-SC_DOMAIN = "https://vixsrc.to"
+SC_DOMAIN = settings.VIX_DOMAIN
 User_Agent = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/139.0.0.0 Safari/537.36"
 logger = logging.getLogger(__name__)
+request_log = SampledLogger(logger)
+
+def parse_player_script(script: str):
+    """Dati del player dal primo <script> del body (vedi BodyScriptScanner)."""
+    if not script:
+        return None
+    
+    # Regex (dal tuo vixcloud.py)
+    token_match = re.search(r"'token':\s*'(\w+)'", script)
+    expires_match = re.search(r"'expires':\s*'(\d+)'", script)
+    server_url_match = re.search(r"url:\s*'([^']+)'", script)
+    
+    if not (token_match and expires_match and server_url_match):
+        return None
+    
+    quality_match = re.search(r'"quality":(\d+)', script)
+
+    return {
+        "token": token_match.group(1),
+        "expires": expires_match.group(1),
+        "server_url": server_url_match.group(1),
+        "quality": quality_match.group(1) if quality_match else "HD",
+        "fhd": "window.canPlayFHD = true" in script,
+    }
 
 class VixProvider:
     def get_name(self):
@@ -39,71 +68,81 @@ class VixProvider:
             # URL Serie: /tv/ID/Stagione/Episodio
             site_url = f"{SC_DOMAIN}/tv/{tmdb_id}/{season}/{episode}/"
 
-        logger.info(f"Vix Scraping: {site_url}")
+        # Link risolto in cache fino alla scadenza del suo token ('expires')
+        resolved = await resolve_cached(
+            site_url, lambda: self._resolve_page(site_url, client), url_of=lambda v: v["url"]
+        )
+        if not resolved:
+            return []
+
+        streams.append({
+            "name": "VixSrc",
+            "title": f"VixCloud {resolved['quality']}p\n{info['title']}",
+            "url": resolved["url"],
+            "behaviorHints": {
+                "notWebReady": True,
+                "proxyHeaders": {"request": {"User-Agent": User_Agent}}
+            }
+        })
+
+        return streams
+
+    async def _resolve_page(self, site_url: str, client):
+        """
+        Scarica la pagina vixsrc e costruisce il link .m3u8 finale.
+        Ritorna {'url': ..., 'quality': ...} oppure None (titolo non presente);
+        solleva UpstreamError se vixsrc non risponde o risponde con un errore.
+        """
+        request_log.info("Vix Scraping: %s", site_url)
 
-        random_headers = Headers().generate()
+        # User-Agent e header del browser li mette il profilo (coerenti con l'impersonation TLS),
+        # insieme ai cookie/clearance ottenuti nelle richieste precedenti
         headers = {
             'Referer': f"{SC_DOMAIN}/",
             'Origin': f"{SC_DOMAIN}",
-            'User-Agent': User_Agent,
         }
-        headers.update(random_headers)
 
+        # Lettura in streaming: ci serve solo il primo <script> del body,
+        # il resto della pagina non viene nemmeno scaricato
+        scanner = BodyScriptScanner()
         try:
-            response = await client.get(site_url, headers=headers)
-            
-            if response.status_code != 200:
-                logger.error(f"Vix Error: {response.status_code}")
-                return []
-
-            # Logica di estrazione (dal tuo vixcloud.py)
-            soup = BeautifulSoup(response.text, "lxml", parse_only=SoupStrainer("body"))
-            script_tag = soup.find("body").find("script")
-            
-            if not script_tag:
-                return []
-                
-            script = script_tag.text
-            
-            # Regex
-            token_match = re.search(r"'token':\s*'(\w+)'", script)
-            expires_match = re.search(r"'expires':\s*'(\d+)'", script)
-            server_url_match = re.search(r"url:\s*'([^']+)'", script)
-            
-            if not (token_match and expires_match and server_url_match):
-                return []
-            
-            token = token_match.group(1)
-            expires = expires_match.group(1)
-            server_url = server_url_match.group(1)
-            
-            try:
-                quality = re.search(r'"quality":(\d+)', script).group(1)
-            except:
-                quality = "HD"
+            with span("vix_page"):
+                response = await client.scan(site_url, scanner, headers=headers, profiled=True)
+        except Overloaded:
+            raise  # Limite di richieste nostro, non un errore di vixsrc
+        except Exception as e:
+            raise UpstreamError(f"Vix: {e}") from e
+
+        if response.status_code in (404, 410):
+            return None  # Titolo non disponibile su vixsrc
+        if response.status_code != 200:
+            logger.error(f"Vix Error: {response.status_code}")
+            raise UpstreamError(f"Vix HTTP {response.status_code}")
+
+        try:
+            with span("vix_parse"):
+                player = parse_player_script(scanner.script)
+            if not player:
+                return None
+
+            token = player["token"]
+            expires = player["expires"]
+            server_url = player["server_url"]
 
             # Costruzione Link Finale
             separator = "&" if "?" in server_url else "?"
             final_url = f"{server_url}{separator}token={token}&expires={expires}"
 
-            if "window.canPlayFHD = true" in script:
+            if player["fhd"]:
                 final_url += "&h=1"
 
             # Adattamento per player (aggiunta .m3u8)
             parts = final_url.split("?")
             playable_url = parts[0] + ".m3u8?" + parts[1]
 
-            streams.append({
-                "name": "VixSrc",
-                "title": f"VixCloud {quality}p\n{info['title']}",
-                "url": playable_url,
-                "behaviorHints": {
-                    "notWebReady": True,
-                    "proxyHeaders": {"request": {"User-Agent": User_Agent}}
-                }
-            })
+            return {"url": playable_url, "quality": player["quality"]}
 
         except Exception as e:
             logger.error(f"Errore Vix: {e}")
 
-        return streams
+        return None
@@ -0,0 +1,266 @@
+import asyncio
+import codecs
+import logging
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
+from urllib.parse import urlsplit
+from curl_cffi import CurlOpt, CurlHttpVersion
+from curl_cffi.requests import AsyncSession
+from app import settings
+from app.metrics import UPSTREAM_RESPONSES
+from app.sessions import ProfilePool, CHALLENGE_PEEK
+from app.admission import host_buckets
+
+logger = logging.getLogger("ITA-Addon")
+
+_HTTP_VERSIONS = {
+    "1.1": CurlHttpVersion.V1_1,
+    "2": CurlHttpVersion.V2TLS,
+}
+
+
+# Host con un'etichetta propria nelle metriche: frammenti configurati + host dei domini upstream
+_METRIC_HOSTS = tuple(settings.UPSTREAM_METRIC_HOSTS) + tuple(
+    urlsplit(url).hostname or "" for url in (settings.TMDB_API_URL, settings.VIX_DOMAIN, settings.GUARDAHD_BASE_URL)
+)
+_metric_labels = {}
+
+
+def metric_host(host: str) -> str:
+    """Etichetta 'host' per UPSTREAM_RESPONSES: gli host non previsti vanno sotto "other" (cardinalità fissa)."""
+    label = _metric_labels.get(host)
+    if label is None:
+        label = host if any(fragment and fragment in host for fragment in _METRIC_HOSTS) else "other"
+        if len(_metric_labels) >= settings.HTTP_TRACKED_HOSTS:
+            _metric_labels.clear()
+        _metric_labels[host] = label
+    return label
+
+
+def _decoder(encoding: str):
+    try:
+        return codecs.getincrementaldecoder(encoding or "utf-8")(errors="replace")
+    except LookupError:
+        return codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+
+async def _read_head(response, limit: int) -> str:
+    """Primi 'limit' byte del corpo in streaming, decodificati ("" se la lettura fallisce)."""
+    data = b""
+    try:
+        async for chunk in response.aiter_content():
+            data += chunk
+            if len(data) >= limit:
+                break
+    except Exception as e:
+        logger.debug(f"Lettura corpo {response.status_code} fallita: {e}")
+    return _decoder(response.encoding).decode(data[:limit], final=True)
+
+
+class HttpPool:
+    """
+    Client HTTP unico per tutto il processo.
+    Una sola AsyncSession (keep-alive + cache DNS) aperta/chiusa dal lifespan di FastAPI
+    e condivisa da provider e resolver, con un limite di richieste simultanee per host
+    e un token bucket per host (UPSTREAM_HOST_RATES, vedi app/admission.py).
+    Espone get/head/request come AsyncSession, quindi i provider non cambiano.
+
+    Con profiled=True la richiesta usa invece uno dei profili di navigazione a lunga vita
+    (impersonation + cookie propri, vedi app/sessions.py), per gli host protetti da challenge.
+    """
+
+    def __init__(self):
+        self._session = None
+        self._host_limits = OrderedDict()  # host -> semaforo, dal meno recente
+        self.profiles = ProfilePool(self._new_session)
+
+    def _host_limit(self, host: str) -> asyncio.Semaphore:
+        sem = self._host_limits.get(host)
+        if sem is None:
+            sem = self._host_limits[host] = asyncio.Semaphore(settings.HTTP_PER_HOST_LIMIT)
+            if len(self._host_limits) > settings.HTTP_TRACKED_HOSTS:
+                # Si scarta l'host usato meno di recente (CDN di un link visto una volta)
+                self._host_limits.popitem(last=False)
+        else:
+            self._host_limits.move_to_end(host)
+        return sem
+
+    def _new_session(self, impersonate: str) -> AsyncSession:
+        options = {
+            "impersonate": impersonate,
+            "verify": False,
+            "timeout": settings.HTTP_TIMEOUT,
+            "max_clients": settings.HTTP_MAX_CLIENTS,
+            "curl_options": {
+                CurlOpt.DNS_CACHE_TIMEOUT: settings.HTTP_DNS_CACHE_TTL,
+                CurlOpt.TCP_KEEPALIVE: 1,
+                CurlOpt.MAXCONNECTS: settings.HTTP_MAX_CLIENTS,
+            },
+        }
+        if settings.HTTP_VERSION in _HTTP_VERSIONS:
+            options["http_version"] = _HTTP_VERSIONS[settings.HTTP_VERSION]
+        return AsyncSession(**options)
+
+    async def start(self):
+        if self._session is not None:
+            return
+        self._session = self._new_session(settings.HTTP_IMPERSONATE)
+        self.profiles.start()
+
+    async def close(self):
+        if self._session is None:
+            return
+        session, self._session = self._session, None
+        try:
+            await session.close()
+        except Exception as e:
+            logger.warning(f"Errore chiusura client HTTP: {e}")
+        finally:
+            # Anche se la sessione principale fallisce: cookie dei profili salvati e sessioni chiuse
+            await self.profiles.close()
+
+    async def warmup(self, urls=None, profiled_urls=None):
+        """
+        Apre in anticipo le connessioni verso gli upstream noti (errori ignorati).
+        Gli host usati con profiled=True (vixsrc) vanno scaldati su ogni profilo:
+        sono quelle le sessioni che li useranno, non la principale.
+        """
+        urls = settings.HTTP_WARMUP_URLS if urls is None else urls
+        profiled_urls = settings.HTTP_WARMUP_PROFILED_URLS if profiled_urls is None else profiled_urls
+
+        async def _touch(session, url, headers=None):
+            try:
+                await session.head(url, headers=headers, timeout=5, allow_redirects=False)
+            except Exception as e:
+                logger.debug(f"Warmup fallito per {url}: {e}")
+
+        await self.start()
+        touches = [_touch(self._session, u) for u in urls]
+        for profile in self.profiles.profiles:
+            touches.extend(_touch(profile.session, u, profile.headers) for u in profiled_urls)
+        await asyncio.gather(*touches)
+        logger.info(f"Warmup connessioni completato ({len(urls)} host, {len(profiled_urls)} sui profili).")
+
+    async def _session_for(self, profiled: bool, kwargs: dict):
+        if self._session is None:
+            # Uso fuori dal lifespan (script, CLI): apertura lazy
+            await self.start()
+        if not profiled:
+            return self._session, None
+        profile = self.profiles.pick()
+        # Gli header del profilo restano fissi; quelli della richiesta (Referer...) si aggiungono
+        kwargs["headers"] = {**profile.headers, **(kwargs.get("headers") or {})}
+        return profile.session, profile
+
+    async def request(self, method: str, url: str, profiled: bool = False, **kwargs):
+        session, profile = await self._session_for(profiled, kwargs)
+        host = urlsplit(url).hostname or ""
+        await host_buckets.wait(host)
+        async with self._host_limit(host):
+            try:
+                response = await session.request(method, url, **kwargs)
+            except Exception:
+                UPSTREAM_RESPONSES.inc(metric_host(host), "error")
+                raise
+        UPSTREAM_RESPONSES.inc(metric_host(host), str(response.status_code))
+        if profile is not None:
+            await self.profiles.report(profile, response)
+        return response
+
+    async def scan(self, url: str, scanner, max_bytes: int = None, profiled: bool = False,
+                   host_limits: bool = True, **kwargs):
+        """
+        GET in streaming: il corpo arriva a pezzi a scanner.feed() e la connessione viene chiusa
+        appena lo scanner ha trovato ciò che cerca, o superati max_bytes (SCAN_MAX_BYTES).
+        Ritorna la risposta (senza corpo): i dati estratti restano nello scanner.
+        Con status diverso da 200 il corpo non viene letto, tranne l'inizio dei 403/503 sui
+        profili (per riconoscere una pagina di challenge, vedi sessions.is_blocked).
+        Con host_limits=False niente token bucket né semaforo per host: il lavoro in background
+        (probe dei link) ha i suoi limiti e non consuma quelli del traffico utente.
+        """
+        max_bytes = settings.SCAN_MAX_BYTES if max_bytes is None else max_bytes
+        session, profile = await self._session_for(profiled, kwargs)
+        host = urlsplit(url).hostname or ""
+        body = None
+        if host_limits:
+            await host_buckets.wait(host)
+        async with self._host_limit(host) if host_limits else nullcontext():
+            try:
+                response = await session.request("GET", url, stream=True, **kwargs)
+            except Exception:
+                UPSTREAM_RESPONSES.inc(metric_host(host), "error")
+                raise
+            UPSTREAM_RESPONSES.inc(metric_host(host), str(response.status_code))
+            try:
+                if response.status_code == 200:
+                    decoder = _decoder(response.encoding)
+                    received = 0
+                    async for chunk in response.aiter_content():
+                        received += len(chunk)
+                        if scanner.feed(decoder.decode(chunk)):
+                            break
+                        if received >= max_bytes:
+                            logger.warning(f"Pagina oltre {max_bytes} byte, lettura interrotta: {url}")
+                            break
+                    else:
+                        scanner.feed(decoder.decode(b"", final=True))
+                    scanner.close()
+                elif profile is not None and response.status_code in (403, 503):
+                    body = await _read_head(response, CHALLENGE_PEEK)
+            finally:
+                await response.aclose()
+        if profile is not None:
+            await self.profiles.report(profile, response, body)
+        return response
+
+    async def get(self, url: str, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def head(self, url: str, **kwargs):
+        return await self.request("HEAD", url, **kwargs)
+
+
+class HostRateLimiter:
+    """Al massimo 'rate' richieste al secondo per host (0 = nessun limite), distribuite nel tempo."""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0
+        self._next_slot = OrderedDict()
+
+    async def wait(self, host: str):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        slot = max(now, self._next_slot.pop(host, 0))
+        self._next_slot[host] = slot + self.interval
+        if len(self._next_slot) > settings.HTTP_TRACKED_HOSTS:
+            self._next_slot.popitem(last=False)
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class RateLimitedClient:
+    """Stessa interfaccia di http_pool, con il limite di velocità per host davanti."""
+
+    def __init__(self, client, limiter: HostRateLimiter):
+        self.client = client
+        self.limiter = limiter
+
+    async def request(self, method: str, url: str, **kwargs):
+        await self.limiter.wait(urlsplit(url).hostname or "")
+        return await self.client.request(method, url, **kwargs)
+
+    async def get(self, url: str, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def scan(self, url: str, scanner, **kwargs):
+        await self.limiter.wait(urlsplit(url).hostname or "")
+        return await self.client.scan(url, scanner, **kwargs)
+
+    async def head(self, url: str, **kwargs):
+        return await self.request("HEAD", url, **kwargs)
+
+
+# Istanza condivisa dal processo
+http_pool = HttpPool()
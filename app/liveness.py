@@ -0,0 +1,196 @@
+import asyncio
+import inspect
+import logging
+import time
+from collections import OrderedDict
+from app import settings
+from app.http import http_pool, HostRateLimiter, RateLimitedClient
+from app.admission import Overloaded
+from app.metrics import registry, Counter
+
+logger = logging.getLogger("ITA-Addon")
+
+LINK_PROBES = registry.add(Counter(
+    "addon_link_probes_total", "Probe di vitalità dei link in cache per esito (alive/dead/error/shed).", ("result",)))
+
+ALIVE = "alive"
+DEAD = "dead"
+UNKNOWN = "unknown"
+
+# Risposte che dicono "link morto" senza bisogno di riprovare (file rimosso).
+# 401/403 no: molti CDN li danno anche per un blocco temporaneo o per l'IP del server,
+# contano come errori (morto solo dopo LIVENESS_MAX_FAILURES di fila).
+_DEAD_STATUSES = (404, 410)
+
+
+class _FirstChunk:
+    """Scanner per HttpPool.scan: basta il primo pezzo del corpo, poi la connessione si chiude."""
+
+    def feed(self, text: str) -> bool:
+        return True
+
+    def close(self):
+        pass
+
+
+class LinkChecker:
+    """
+    Validatore in background dei link degli stream già trovati (priorità bassa).
+    - watch(url, headers): mette in coda il link per un probe leggero (GET Range: bytes=0-0,
+      letto solo il primo pezzo), con lo User-Agent che mandiamo al player (proxyHeaders).
+    - on_dead(url, key, fn): fn() viene chiamata quando il link risulta morto
+      (es. invalidare il link risolto o la risposta in cache che lo contiene).
+    - order(streams): stream vivi prima (dal più veloce), poi non verificati, poi morti.
+    Ogni LIVENESS_INTERVAL al massimo LIVENESS_BUDGET probe, LIVENESS_CONCURRENCY alla volta
+    e limitati per host; nessun probe se il traffico utente è alto (is_busy).
+    """
+
+    def __init__(self, interval: float, budget: int, concurrency: int, rate: float,
+                 recheck: float, timeout: float, max_failures: int, max_tracked: int):
+        self.interval = interval
+        self.budget = budget
+        self.concurrency = max(1, concurrency)
+        self.recheck = recheck
+        self.timeout = timeout
+        self.max_failures = max(1, max_failures)
+        self.max_tracked = max_tracked
+        self.client = RateLimitedClient(http_pool, HostRateLimiter(rate))
+        self.is_busy = lambda: False
+        self._state = OrderedDict()   # url -> {"status", "latency", "checked", "failures"}
+        self._queue = OrderedDict()   # url -> headers, in ordine di arrivo
+        self._callbacks = {}          # url -> {key: fn}
+        self.probed = 0
+        self.dead = 0
+
+    def status(self, url: str):
+        """(stato, latenza) del link; UNKNOWN se mai verificato o verificato troppo tempo fa."""
+        state = self._state.get(url)
+        if state is None or time.time() - state["checked"] > self.recheck * 2:
+            return UNKNOWN, None
+        return state["status"], state["latency"]
+
+    def watch(self, url: str, headers: dict = None):
+        if not url or self.budget <= 0 or url in self._queue:
+            return
+        state = self._state.get(url)
+        if state is not None and time.time() - state["checked"] < self.recheck:
+            return
+        if len(self._queue) >= self.max_tracked:
+            return  # Coda piena: il link verrà proposto di nuovo alla prossima raccolta
+        self._queue[url] = headers or {}
+
+    def on_dead(self, url: str, key, fn):
+        if not url:
+            return
+        callbacks = self._callbacks.get(url)
+        if callbacks is None:
+            if len(self._callbacks) >= self.max_tracked:
+                # Si dimentica il link registrato per primo
+                self._callbacks.pop(next(iter(self._callbacks)))
+            callbacks = self._callbacks[url] = {}
+        callbacks[key] = fn
+
+    def order(self, streams: list) -> list:
+        """Ordine stabile: a parità di stato resta quello dei provider."""
+        def rank(stream):
+            status, latency = self.status(stream.get("url", ""))
+            if status == ALIVE:
+                return (0, latency or 0.0)
+            return (1 if status == UNKNOWN else 2, 0.0)
+        return sorted(streams, key=rank)
+
+    async def probe(self, url: str, headers: dict):
+        request_headers = {**headers, "Range": "bytes=0-0"}
+        started = time.monotonic()
+        try:
+            # Fuori dai token bucket/semafori per host di http_pool: i probe non tolgono posto
+            # alle richieste degli utenti (il loro limite è il HostRateLimiter del client)
+            response = await self.client.scan(
+                url, _FirstChunk(), headers=request_headers, timeout=self.timeout, allow_redirects=True,
+                host_limits=False,
+            )
+            code = response.status_code
+        except Overloaded:
+            # Limite nostro, non un esito del link: si riprova al prossimo giro, senza contare errori
+            LINK_PROBES.inc("shed")
+            if url not in self._queue and len(self._queue) < self.max_tracked:
+                self._queue[url] = headers
+            return
+        except Exception as e:
+            logger.debug(f"Probe {url} fallito: {e}")
+            code = None
+        latency = time.monotonic() - started
+        self.probed += 1
+
+        state = self._state.pop(url, None) or {"status": UNKNOWN, "latency": None, "failures": 0}
+        state["checked"] = time.time()
+        if code is not None and 200 <= code < 400:
+            state.update(status=ALIVE, latency=latency, failures=0)
+            LINK_PROBES.inc("alive")
+        elif code in _DEAD_STATUSES:
+            state.update(status=DEAD, failures=state["failures"] + 1)
+            LINK_PROBES.inc("dead")
+        else:
+            # 401/403/429/5xx/rete: morto solo dopo più errori di fila
+            state["failures"] += 1
+            if state["failures"] >= self.max_failures:
+                state["status"] = DEAD
+            LINK_PROBES.inc("error")
+        self._state[url] = state
+        while len(self._state) > self.max_tracked:
+            self._state.popitem(last=False)
+
+        if state["status"] == DEAD:
+            self.dead += 1
+            await self._notify_dead(url)
+
+    async def _notify_dead(self, url: str):
+        for key, fn in (self._callbacks.pop(url, None) or {}).items():
+            try:
+                result = fn()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.warning(f"Invalidazione di {key} per link morto fallita: {e}")
+        logger.info(f"Link morto rimosso dalle cache: {url[:80]}")
+
+    async def _tick(self):
+        if self.is_busy() or not self._queue:
+            return
+        batch = []
+        while self._queue and len(batch) < self.budget:
+            batch.append(self._queue.popitem(last=False))
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def run(url, headers):
+            async with slots:
+                await self.probe(url, headers)
+
+        await asyncio.gather(*(run(url, headers) for url, headers in batch))
+
+    async def run(self):
+        """Ciclo del validatore (task avviato dal lifespan)."""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self._tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Errore validatore link: {e}")
+
+    def stats(self) -> dict:
+        alive = sum(1 for state in self._state.values() if state["status"] == ALIVE)
+        return {
+            "queued": len(self._queue),
+            "tracked": len(self._state),
+            "alive": alive,
+            "probed": self.probed,
+            "dead": self.dead,
+        }
+
+
+liveness = LinkChecker(
+    settings.LIVENESS_INTERVAL, settings.LIVENESS_BUDGET, settings.LIVENESS_CONCURRENCY, settings.LIVENESS_RATE,
+    settings.LIVENESS_RECHECK, settings.LIVENESS_TIMEOUT, settings.LIVENESS_MAX_FAILURES, settings.LIVENESS_TRACKED,
+)
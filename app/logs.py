@@ -0,0 +1,77 @@
+import atexit
+import logging
+import queue
+import random
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from app import settings
+
+# Logging dell'addon.
+# - Con LOG_QUEUE le righe vanno in una coda in memoria e un thread le scrive su stderr:
+#   la richiesta non resta mai ferma su una write lenta (stdout di Docker, pipe piena).
+# - Le righe INFO per-richiesta passano da SampledLogger: con LOG_REQUEST_SAMPLE < 1 si tiene
+#   solo una parte delle richieste (tutte le righe di una richiesta o nessuna).
+#   Warning ed errori non sono mai campionati.
+
+FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
+DATEFMT = "%H:%M:%S"
+
+_listener = None
+_sampled = ContextVar("log_sampled", default=True)
+
+
+def setup_logging():
+    """
+    Configura il root logger una volta sola (come basicConfig: se ha già degli handler,
+    es. una config esterna, si imposta solo il livello).
+    """
+    global _listener
+    root = logging.getLogger()
+    level = settings.LOG_LEVEL.upper()
+    root.setLevel(level if isinstance(logging.getLevelName(level), int) else logging.INFO)
+    if root.handlers:
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(FORMAT, datefmt=DATEFMT))
+    if not settings.LOG_QUEUE:
+        root.addHandler(handler)
+        return
+    records = queue.SimpleQueue()
+    root.addHandler(QueueHandler(records))
+    _listener = QueueListener(records, handler, respect_handler_level=True)
+    _listener.start()
+    # All'uscita del processo il thread svuota la coda (anche i log scritti dopo il lifespan)
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def sample_request():
+    """Decide una volta per richiesta se le sue righe INFO finiscono nel log (vale anche per i task figli)."""
+    rate = settings.LOG_REQUEST_SAMPLE
+    _sampled.set(rate >= 1 or random.random() < rate)
+
+
+class SampledLogger:
+    """
+    Righe INFO per-richiesta: scritte solo per le richieste campionate e solo se il livello
+    le lascia passare. Usare gli argomenti %s (non f-string) così la riga scartata non costa
+    nemmeno la formattazione.
+    """
+
+    __slots__ = ("logger",)
+
+    def __init__(self, logger: logging.Logger):
+        self.logger = logger
+
+    def enabled(self) -> bool:
+        return _sampled.get() and self.logger.isEnabledFor(logging.INFO)
+
+    def info(self, msg, *args):
+        if _sampled.get() and self.logger.isEnabledFor(logging.INFO):
+            self.logger.info(msg, *args)
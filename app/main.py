@@ -1,30 +1,131 @@
 import asyncio
+import functools
+import hashlib
 import logging
 import json
+import time
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from curl_cffi.requests import AsyncSession
 
 # Import interni
 from app.manifest import MANIFEST
-from app.extractors import PROVIDERS
-from app.utils import decode_config
-
-# Configurazione Logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    datefmt="%H:%M:%S"
-)
+from app.extractors import providers_for, REGISTRY
+from app import settings
+from app.utils import decode_config, links_ttl
+from app.http import http_pool
+from app.cache import TTLCache, SingleFlight, MISSING
+from app.store import close_all as close_stores
+from app.shared import shared_cache
+from app.workers import cpu_pool
+from app.prefetch import prefetcher, next_episode_ids
+from app.refresh import refresher
+from app.admission import admission, host_buckets, Overloaded
+from app.liveness import liveness
+from app.breaker import breakers
+from app import metrics
+from app.responses import JSONPayload, payload_response
+from app.tracing import TracingMiddleware, span
+from app.logs import setup_logging, sample_request, SampledLogger
+
+# Configurazione Logging (coda + thread di scrittura, vedi app/logs.py)
+setup_logging()
 logger = logging.getLogger("ITA-Addon")
+request_log = SampledLogger(logger)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Apre il client HTTP condiviso all'avvio (con warmup delle connessioni)
+    e lo chiude allo shutdown insieme alle cache persistenti.
+    """
+    await http_pool.start()
+    warmup = asyncio.create_task(http_pool.warmup())
+    loop_lag = asyncio.create_task(metrics.monitor_loop_lag())
+    refresh_loop = asyncio.create_task(refresher.run())
+    liveness_loop = asyncio.create_task(liveness.run())
+    preload_task = asyncio.create_task(preload()) if settings.PRELOAD else None
+    try:
+        yield
+    finally:
+        warmup.cancel()
+        loop_lag.cancel()
+        refresh_loop.cancel()
+        liveness_loop.cancel()
+        if preload_task is not None:
+            preload_task.cancel()
+        refresher.cancel_all()
+        await http_pool.close()
+        prefetcher.cancel_all()
+        await close_stores()
+        await shared_cache.close()
+        cpu_pool.shutdown()
+
+async def preload():
+    """
+    Subito dopo l'avvio (il server risponde già): importa i moduli dei provider e prepara
+    la pagina di configurazione in un thread, così la prima richiesta /stream non li paga.
+    """
+    def load():
+        for spec in REGISTRY:
+            spec.provider
+        configure_page()
+    # Prima lascia passare le richieste dell'avvio (health check, manifest)
+    await asyncio.sleep(1)
+    try:
+        await asyncio.to_thread(load)
+    except Exception as e:
+        logger.warning(f"Preload all'avvio fallito: {e}")
 
 # Inizializzazione App
-app = FastAPI(title="ITA Streaming Addon", version="1.0.0")
+app = FastAPI(title="ITA Streaming Addon", version="1.0.0", lifespan=lifespan)
+
+# Manifest serializzato una volta sola (corpo + ETag), servito sempre uguale
+_MANIFEST_PAYLOAD = JSONPayload(MANIFEST)
+_EMPTY_STREAMS = JSONPayload({"streams": []})
 
-# Setup Templates (per la pagina configure.html)
-templates = Jinja2Templates(directory="templates")
+# Cache delle risposte stream: (type, id, provider attivi) -> JSONPayload già serializzato
+_stream_cache = TTLCache(maxsize=settings.STREAM_CACHE_SIZE, ttl=settings.STREAM_CACHE_TTL, name="streams")
+_stream_flight = SingleFlight()
+# Risultati per-provider delle raccolte in corso (per le risposte parziali)
+_partial_streams = {}
+
+# Prefetch e rinfresco anticipato rinunciano quando ci sono troppe raccolte utente in corso
+prefetcher.is_busy = lambda: len(_partial_streams) > settings.PREFETCH_MAX_FOREGROUND
+refresher.is_busy = prefetcher.is_busy
+liveness.is_busy = prefetcher.is_busy
+
+# Gauge calcolati al momento dell'esportazione di /metrics
+_CPU_POOL_QUEUE = metrics.registry.add(metrics.Gauge(
+    "addon_cpu_pool_queue_depth", "Job in attesa nel pool CPU (parsing/unpack)."))
+_CPU_POOL_RUNNING = metrics.registry.add(metrics.Gauge(
+    "addon_cpu_pool_running", "Job in esecuzione nel pool CPU."))
+_CACHE_ENTRIES = metrics.registry.add(metrics.Gauge(
+    "addon_cache_entries", "Voci presenti per livello di cache.", ("cache",)))
+_BREAKER_OPEN = metrics.registry.add(metrics.Gauge(
+    "addon_breaker_open", "1 se il circuito non è chiuso (open/half_open).", ("breaker",)))
+
+@metrics.registry.collector
+def _collect_gauges():
+    stats = cpu_pool.stats()
+    _CPU_POOL_QUEUE.set(stats["queue_depth"])
+    _CPU_POOL_RUNNING.set(stats["running"])
+    _CACHE_ENTRIES.set(len(_stream_cache), "streams")
+    _CACHE_ENTRIES.set(len(_partial_streams), "streams_inflight")
+    for name, state in breakers.snapshot().items():
+        _BREAKER_OPEN.set(0 if state["state"] == "closed" else 1, name)
+
+@functools.lru_cache(maxsize=1)
+def configure_page() -> str:
+    """
+    Pagina configure.html compilata e renderizzata una volta sola (non dipende dalla richiesta).
+    Jinja viene importato qui: all'avvio non serve.
+    """
+    from jinja2 import Environment, FileSystemLoader
+
+    env = Environment(loader=FileSystemLoader("templates"), autoescape=True)
+    return env.get_template("configure.html").render()
 
 # --- CONFIGURAZIONE CORS ---
 # Fondamentale per far funzionare l'addon su Stremio Web e Desktop
@@ -36,6 +137,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Latenza e richieste in corso per endpoint (/metrics)
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Server-Timing / trace log: il middleware esiste solo se attivato dalla configurazione
+if TracingMiddleware.enabled():
+    app.add_middleware(TracingMiddleware)
+
 # --- ENDPOINTS ---
 
 @app.get("/", response_class=HTMLResponse)
@@ -43,100 +151,285 @@ async def root(request: Request):
     """
     Pagina principale: Mostra il form di configurazione.
     """
-    return templates.TemplateResponse("configure.html", {"request": request})
+    return HTMLResponse(configure_page())
 
 @app.get("/manifest.json")
-async def get_base_manifest():
+async def get_base_manifest(request: Request):
     """
     Manifest base (senza configurazione).
     Utile per check di installazione, ma redirige l'utente a configurare.
     """
-    return MANIFEST
+    return payload_response(request, _MANIFEST_PAYLOAD)
 
 @app.get("/{config}/manifest.json")
-async def get_configured_manifest(config: str):
+async def get_configured_manifest(config: str, request: Request):
     """
     Manifest configurato.
     Stremio chiama questo quando l'utente installa l'addon col link generato.
     """
     # Possiamo opzionalmente modificare il manifest in base alla config (es. aggiungere info all'utente)
-    return MANIFEST
+    return payload_response(request, _MANIFEST_PAYLOAD)
+
+@app.get("/status")
+async def get_status():
+    """
+    Stato interno del server (pool CPU, cache, circuit breaker) per monitoraggio.
+    """
+    return {
+        "cpu_pool": cpu_pool.stats(),
+        "stream_cache": {"entries": len(_stream_cache), "inflight": len(_partial_streams)},
+        "prefetch": prefetcher.stats(),
+        "refresh": refresher.stats(),
+        "liveness": liveness.stats(),
+        "breakers": breakers.snapshot(),
+        "admission": {**admission.stats(), "host_tokens": host_buckets.stats()},
+        "session_profiles": http_pool.profiles.stats(),
+    }
+
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Metriche in formato Prometheus (text exposition).
+    """
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/{config}/stream/{type}/{id}.json")
-async def get_streams(config: str, type: str, id: str):
+async def get_streams(config: str, type: str, id: str, request: Request):
     """
     CORE LOGIC:
     1. Decodifica la configurazione (TMDB Key, MFP).
-    2. Crea un browser virtuale (AsyncSession).
-    3. Lancia tutti gli scraper in parallelo.
-    4. Raccoglie e restituisce i risultati.
+    2. Cerca la risposta in cache (o si accoda a una richiesta identica già in corso).
+    3. Altrimenti lancia tutti gli scraper in parallelo (collect_streams).
+    4. Raccoglie e restituisce i risultati (con ETag: 304 se il client ha già la stessa lista).
     """
     # 1. Decodifica Config
-    user_config = decode_config(config)
+    with span("decode_config"):
+        user_config = decode_config(config)
     tmdb_key = user_config.get('tmdb_key')
     
     if not tmdb_key:
         logger.error("Richiesta ricevuta senza TMDB Key valida.")
-        return {"streams": []} # Ritorna vuoto se manca la chiave
-
-    logger.info(f"Richiesta Stream: [{type}] ID: {id}")
+        return payload_response(request, _EMPTY_STREAMS) # Ritorna vuoto se manca la chiave
 
-    streams = []
-
-    # 2. Setup Sessione Browser (Impersonate Chrome)
-    # Usiamo 'chrome110' per simulare un browser reale e bypassare Cloudflare/Controlli
-    async with AsyncSession(impersonate="chrome110", verify=False) as client:
-        
-        # 3. Preparazione Task Paralleli
-        tasks = []
-        for provider in PROVIDERS:
-            # Creiamo un task asincrono per ogni provider
-            tasks.append(
-                process_provider(provider, id, type, user_config, client)
-            )
+    # 2. Cache risposte + coalescing: richieste identiche in volo attendono lo stesso scraping
+    cache_key = stream_cache_key(type, id, user_config)
+    if not cache_key[2]:
+        # Nessun provider abilitato può rispondere (es. solo GuardaHD e richiesta di una serie)
+        return payload_response(request, _EMPTY_STREAMS)
 
-        # 4. Esecuzione Parallela
-        # return_exceptions=True impedisce che un errore in un provider blocchi tutto
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+    sample_request()
+    request_log.info("Richiesta Stream: [%s] ID: %s", type, id)
+    with span("stream_cache"):
+        payload = _stream_cache.get(cache_key)
+    partial = False
+    if payload is MISSING:
+        # 3. Budget di latenza: allo scadere rispondiamo con quanto raccolto finora.
+        # Lo scraping continua in background (shield nel SingleFlight) e riempie la cache.
+        # La raccolta passa dall'admission control: la config è il tenant della coda equa.
+        deadline = settings.STREAM_RESPONSE_DEADLINE
+        pending = _stream_flight.do(
+            cache_key, lambda: collect_streams(type, id, user_config, cache_key, tenant=config, deadline=deadline)
+        )
+        try:
+            with span("collect"):
+                payload = await asyncio.wait_for(pending, timeout=deadline if deadline > 0 else None)
+        except asyncio.TimeoutError:
+            payload = JSONPayload({"streams": partial_streams(cache_key)})
+            partial = True
+            logger.warning(f"Deadline di {deadline}s superata per [{type}] {id}: risposta parziale.")
+        except Overloaded as e:
+            # Load shedding: meglio una risposta vuota subito che una lista in ritardo per tutti
+            payload = _EMPTY_STREAMS
+            partial = True
+            logger.warning(f"Sovraccarico, raccolta rifiutata per [{type}] {id}: {e}")
+    else:
+        request_log.info("Cache HIT stream per [%s] %s", type, id)
 
-        # 5. Raccolta Risultati
-        for res in results:
-            if isinstance(res, list):
-                streams.extend(res)
-            elif isinstance(res, Exception):
-                logger.error(f"Eccezione non gestita in un provider: {res}")
+    # 4. Serie: prepariamo in background l'episodio successivo (autoplay)
+    if type == "series" and settings.PREFETCH_EPISODES > 0:
+        prefetcher.schedule(cache_key, lambda: prefetch_next_episodes(id, user_config))
 
     # Ordina i risultati (Opzionale: es. prima 1080p)
     # streams.sort(key=lambda x: x.get('title', ''), reverse=True)
 
-    logger.info(f"Totale stream trovati: {len(streams)}")
+    request_log.info("Totale stream trovati: %d", len(payload.data["streams"]))
     
-    # Header Cache-Control per evitare richieste doppie immediate da Stremio
-    return JSONResponse(
-        content={"streams": streams},
-        headers={"Cache-Control": "max-age=3600, public"} # Cache di 1 ora
+    # Header Cache-Control per evitare richieste doppie immediate da Stremio.
+    # Le risposte parziali durano poco: la prossima richiesta troverà la cache completa.
+    return payload_response(
+        request, payload,
+        headers={"Cache-Control": "max-age=60, public" if partial else "max-age=3600, public"} # Cache di 1 ora
     )
 
+def credentials_digest(config: dict) -> str:
+    """
+    Impronta delle credenziali dell'utente (TMDB Key, URL e password MFP).
+    Una chiave sbagliata o un MFP irraggiungibile svuotano il risultato: senza l'impronta
+    nella chiave quella risposta vuota verrebbe servita anche a chi ha credenziali valide.
+    """
+    raw = "\0".join(str(config.get(key) or "") for key in ("tmdb_key", "mfp_url", "mfp_pass"))
+    return hashlib.sha256(raw.encode()).hexdigest()[:16]
+
+def stream_cache_key(type: str, id: str, config: dict):
+    """
+    Chiave della cache risposte: richiesta, provider attivi e credenziali.
+    Condividono la voce (e la raccolta in corso) solo gli utenti con la stessa configurazione.
+    """
+    return (type, id, tuple(spec.name for spec in providers_for(type, config)), credentials_digest(config))
+
+def partial_streams(cache_key):
+    """Stream dei provider già terminati per una raccolta ancora in corso (in ordine di provider)."""
+    streams = []
+    for res in _partial_streams.get(cache_key) or []:
+        if res:
+            streams.extend(res)
+    return streams
+
+async def collect_streams(type: str, id: str, user_config: dict, cache_key, tenant="background", deadline: float = None):
+    """
+    Lancia tutti i provider in parallelo e salva il risultato nella cache risposte,
+    già serializzato (JSONPayload): i cache hit non ricodificano il JSON.
+    I risultati dei singoli provider sono visibili in _partial_streams appena arrivano.
+    Prima attende uno slot dell'admission control (coda di 'tenant'); solleva Overloaded
+    se l'attesa supererebbe 'deadline'.
+    """
+    streams = []
+
+    # Client condiviso (Impersonate Chrome, keep-alive), aperto nel lifespan
+    client = http_pool
+
+    # Solo i provider abilitati dall'utente e adatti alla richiesta: per gli altri nessun task
+    specs = providers_for(type, user_config)
+    results = [None] * len(specs)
+
+    async def run(index, spec):
+        results[index] = await process_provider(spec.provider, id, type, user_config, client)
+
+    # I più economici partono per primi; i risultati restano nell'ordine del registro
+    order = sorted(range(len(specs)), key=lambda i: specs[i].cost)
+
+    # Esecuzione Parallela
+    # return_exceptions=True impedisce che un errore in un provider blocchi tutto
+    async with admission.slot(tenant, deadline if deadline and deadline > 0 else None):
+        _partial_streams[cache_key] = results
+        try:
+            outcomes = await asyncio.gather(
+                *(run(i, specs[i]) for i in order), return_exceptions=True
+            )
+        finally:
+            _partial_streams.pop(cache_key, None)
+
+    # Raccolta Risultati (nell'ordine del registro)
+    # None = provider fallito (errore, timeout, circuito aperto, sovraccarico): risultato incompleto
+    outcomes = dict(zip(order, outcomes))
+    degraded = False
+    for index, res in enumerate(results):
+        outcome = outcomes[index]
+        if isinstance(outcome, Exception):
+            logger.error(f"Eccezione non gestita in un provider: {outcome}")
+            degraded = True
+        elif res is None:
+            degraded = True
+        elif res:
+            streams.extend(res)
+
+    # Link vivi e veloci per primi; tutti in coda per il validatore in background
+    streams = liveness.order(streams)
+    watch_streams(streams, cache_key)
+
+    # La voce non deve sopravvivere ai token ('expires') contenuti nei link.
+    # Risposte vuote o incomplete durano poco: alla prossima richiesta si riprova.
+    if streams and not degraded:
+        ttl = links_ttl((s.get("url", "") for s in streams), settings.STREAM_CACHE_TTL)
+    else:
+        ttl = settings.STREAM_CACHE_EMPTY_TTL
+    payload = JSONPayload({"streams": streams})
+    _stream_cache.set(cache_key, payload, ttl=ttl)
+
+    return payload
+
+def watch_streams(streams: list, cache_key):
+    """
+    Affida i link al validatore: il probe usa lo User-Agent che il player manderà (proxyHeaders)
+    e un link morto fa cadere la risposta in cache, così la prossima richiesta la ricalcola.
+    """
+    for stream in streams:
+        url = stream.get("url")
+        hints = stream.get("behaviorHints") or {}
+        headers = ((hints.get("proxyHeaders") or {}).get("request")) or {}
+        liveness.watch(url, headers)
+        liveness.on_dead(url, ("streams", cache_key), lambda key=cache_key: _stream_cache.delete(key))
+
+async def prefetch_next_episodes(id: str, user_config: dict):
+    """
+    Risolve e mette in cache gli episodi successivi a 'id' (uno alla volta, priorità bassa).
+    """
+    next_ids = await next_episode_ids(id, user_config.get("tmdb_key"), http_pool, settings.PREFETCH_EPISODES)
+    for next_id in next_ids:
+        key = stream_cache_key("series", next_id, user_config)
+        if _stream_cache.get(key) is not MISSING or key in _stream_flight:
+            continue
+        request_log.info("Prefetch episodio %s", next_id)
+        await _stream_flight.do(key, lambda: collect_streams("series", next_id, user_config, key))
+
 async def process_provider(provider, id, type, config, client):
     """
     Wrapper per gestire errori singoli dei provider senza crashare l'app.
+    Con il circuito aperto (provider giù) il provider viene saltato subito.
+    Ritorna la lista degli stream ([] = nessun risultato) oppure None se il provider è fallito.
     """
+    provider_name = provider.get_name()
+    breaker = breakers.get(f"provider:{provider_name}")
+    if not breaker.allow():
+        logger.info(f"⏭️ {provider_name}: circuito aperto, saltato.")
+        metrics.PROVIDER_RESULTS.inc(provider_name, "skipped")
+        return None
+
+    started = time.monotonic()
     try:
-        provider_name = provider.get_name()
         # logger.debug(f"Avvio provider: {provider_name}")
         
-        provider_streams = await provider.get_stream(id, type, config, client)
+        timeout = settings.PROVIDER_TIMEOUTS.get(provider_name, settings.PROVIDER_TIMEOUT)
+        with span(f"provider_{provider_name.lower()}"):
+            provider_streams = await asyncio.wait_for(
+                provider.get_stream(id, type, config, client), timeout=timeout if timeout > 0 else None
+            )
+        elapsed = time.monotonic() - started
+        breaker.record(True, elapsed)
+        metrics.PROVIDER_LATENCY.observe(elapsed, provider_name)
         
         if provider_streams:
-            logger.info(f"✅ {provider_name}: {len(provider_streams)} stream trovati.")
+            metrics.PROVIDER_RESULTS.inc(provider_name, "success")
+            request_log.info("✅ %s: %d stream trovati.", provider_name, len(provider_streams))
             return provider_streams
         else:
+            metrics.PROVIDER_RESULTS.inc(provider_name, "empty")
             # logger.debug(f"❌ {provider_name}: Nessun stream.")
             return []
             
+    except asyncio.CancelledError:
+        breaker.release()
+        raise
+    except asyncio.TimeoutError:
+        elapsed = time.monotonic() - started
+        breaker.record(False, elapsed)
+        metrics.PROVIDER_LATENCY.observe(elapsed, provider_name)
+        metrics.PROVIDER_RESULTS.inc(provider_name, "timeout")
+        logger.warning(f"⏱️ {provider_name}: timeout, nessun risultato.")
+        return None
+    except Overloaded as e:
+        # Limite di richieste per host raggiunto da noi: l'upstream non ha colpe
+        breaker.release()
+        metrics.PROVIDER_RESULTS.inc(provider_name, "shed")
+        logger.warning(f"🚦 {provider_name}: {e}")
+        return None
     except Exception as e:
-        logger.error(f"⚠️ Errore critico in {provider.get_name()}: {e}")
-        return []
+        elapsed = time.monotonic() - started
+        breaker.record(False, elapsed)
+        metrics.PROVIDER_LATENCY.observe(elapsed, provider_name)
+        metrics.PROVIDER_RESULTS.inc(provider_name, "error")
+        logger.error(f"⚠️ Errore critico in {provider_name}: {e}")
+        return None
 
 # Blocco per avvio locale (senza Docker) per debug rapido
 if __name__ == "__main__":
@@ -0,0 +1,168 @@
+import asyncio
+import bisect
+import time
+
+# Metriche in formato testo Prometheus, senza dipendenze esterne.
+# Ogni operazione è un accesso a dict + somma: abbastanza economica da restare sempre attiva.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self._values = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        for labels, value in self._values.items():
+            yield f"{self.name}{_labels(self.label_names, labels)} {value}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, *labels):
+        self._values[labels] = value
+
+    def dec(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [conteggi per bucket (+Inf incluso), somma]
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self):
+        for labels, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = _labels(self.label_names + ("le",), labels + (bound,))
+                yield f"{self.name}_bucket{le} {cumulative}"
+            base = _labels(self.label_names, labels)
+            yield f"{self.name}_sum{base} {total}"
+            yield f"{self.name}_count{base} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn):
+        """fn() viene chiamata prima di ogni esportazione (per gauge calcolati al volo)."""
+        self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        for fn in self._collectors:
+            try:
+                fn()
+            except Exception:
+                pass
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_LATENCY = registry.add(Histogram(
+    "addon_request_duration_seconds", "Durata delle richieste HTTP per endpoint.", ("route", "method")))
+REQUESTS_INFLIGHT = registry.add(Gauge(
+    "addon_requests_inflight", "Richieste HTTP in corso per endpoint.", ("route",)))
+PROVIDER_LATENCY = registry.add(Histogram(
+    "addon_provider_duration_seconds", "Durata di ogni provider.", ("provider",)))
+PROVIDER_RESULTS = registry.add(Counter(
+    "addon_provider_results_total", "Esiti dei provider (success/empty/error/timeout/skipped/shed).",
+    ("provider", "result")))
+RESOLVER_LATENCY = registry.add(Histogram(
+    "addon_resolver_duration_seconds", "Durata delle risoluzioni per host.", ("host",)))
+RESOLVER_FAILURES = registry.add(Counter(
+    "addon_resolver_failures_total", "Risoluzioni fallite per host e motivo (network/http_status/no_packed/...).",
+    ("host", "reason")))
+UPSTREAM_RESPONSES = registry.add(Counter(
+    "addon_upstream_responses_total", "Risposte HTTP ricevute dagli upstream per host e status.",
+    ("host", "status")))
+CACHE_REQUESTS = registry.add(Counter(
+    "addon_cache_requests_total", "Letture cache per livello ed esito (hit/miss).", ("cache", "result")))
+LOOP_LAG = registry.add(Histogram(
+    "addon_event_loop_lag_seconds", "Ritardo dell'event loop rispetto al previsto.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)))
+
+
+def cache_lookup(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache, "hit" if hit else "miss")
+
+
+async def monitor_loop_lag(interval: float = 0.5):
+    """Misura di quanto l'event loop ritarda un semplice sleep (CPU bloccante = lag)."""
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        LOOP_LAG.observe(max(time.perf_counter() - started - interval, 0))
+
+
+def _endpoint(path: str) -> str:
+    if "/stream/" in path:
+        return "stream"
+    if path.endswith("manifest.json"):
+        return "manifest"
+    if path in ("/", "/metrics", "/status"):
+        return path
+    return "other"
+
+
+class MetricsMiddleware:
+    """Middleware ASGI: latenza e richieste in corso, etichettate con il path della route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        # Prima del routing conosciamo solo il path grezzo: per il gauge basta una classificazione
+        endpoint = _endpoint(scope.get("path", ""))
+        REQUESTS_INFLIGHT.inc(endpoint)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            REQUESTS_INFLIGHT.dec(endpoint)
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            REQUEST_LATENCY.observe(time.perf_counter() - started, path, scope.get("method", ""))
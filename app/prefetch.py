@@ -0,0 +1,99 @@
+import asyncio
+import logging
+from app import settings
+from app.utils import get_tmdb_info, get_tmdb_seasons
+
+logger = logging.getLogger("ITA-Addon")
+
+
+class Prefetcher:
+    """
+    Esegue lavoro di prefetch in background con un budget globale:
+    - al massimo PREFETCH_CONCURRENCY job alla volta,
+    - al massimo PREFETCH_MAX_PENDING job in attesa (gli altri vengono scartati),
+    - nessun avvio se il traffico utente supera la soglia indicata da is_busy().
+    """
+
+    def __init__(self, concurrency: int, max_pending: int, delay: float):
+        self.concurrency = max(1, concurrency)
+        self.max_pending = max_pending
+        self.delay = delay
+        self.is_busy = lambda: False
+        self._slots = None
+        self._pending = {}
+        self.completed = 0
+        self.dropped = 0
+
+    def schedule(self, key, fn) -> bool:
+        """Pianifica fn() (coroutine function). False se scartato o già pianificato."""
+        if key in self._pending:
+            return False
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            return False
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+        task = asyncio.create_task(self._run(key, fn))
+        self._pending[key] = task
+        task.add_done_callback(lambda _t: self._pending.pop(key, None))
+        return True
+
+    async def _run(self, key, fn):
+        try:
+            await asyncio.sleep(self.delay)
+            async with self._slots:
+                # Priorità bassa: se il traffico utente è alto si rinuncia
+                if self.is_busy():
+                    self.dropped += 1
+                    return
+                await fn()
+                self.completed += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.debug(f"Prefetch {key} fallito: {e}")
+
+    def stats(self) -> dict:
+        return {"pending": len(self._pending), "completed": self.completed, "dropped": self.dropped}
+
+    def cancel_all(self):
+        for task in list(self._pending.values()):
+            task.cancel()
+
+
+prefetcher = Prefetcher(settings.PREFETCH_CONCURRENCY, settings.PREFETCH_MAX_PENDING, settings.PREFETCH_DELAY)
+
+
+async def next_episode_ids(id: str, tmdb_key: str, client, count: int) -> list:
+    """
+    ID Stremio dei 'count' episodi successivi a 'tt123:S:E'.
+    Il passaggio alla stagione successiva avviene solo se TMDB conferma gli episodi;
+    senza dati TMDB si prova solo E+1 nella stessa stagione.
+    """
+    parts = id.split(":")
+    if len(parts) != 3 or count <= 0:
+        return []
+    try:
+        clean_id, season, episode = parts[0], int(parts[1]), int(parts[2])
+    except ValueError:
+        return []
+
+    seasons = None
+    info = await get_tmdb_info(clean_id, "series", tmdb_key, client)
+    if info:
+        seasons = await get_tmdb_seasons(info["tmdb_id"], tmdb_key, client)
+
+    result = []
+    for _ in range(count):
+        if seasons is None:
+            if result:
+                break
+            episode += 1
+        elif episode < seasons.get(season, 0):
+            episode += 1
+        elif seasons.get(season + 1, 0) > 0:
+            season, episode = season + 1, 1
+        else:
+            break
+        result.append(f"{clean_id}:{season}:{episode}")
+    return result
@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import time
+from app import settings
+from app.http import http_pool, HostRateLimiter, RateLimitedClient
+
+logger = logging.getLogger("ITA-Addon")
+
+
+class RefreshScheduler:
+    """
+    Rinfresco in background delle voci di cache, fuori dal percorso delle richieste.
+    - refresh(key, fn): subito, per le voci già scadute ma ancora servite (stale-while-revalidate);
+    - track(key, expires_at, fn): conta le richieste per titolo; ogni REFRESH_INTERVAL le voci
+      più popolari che scadono entro REFRESH_AHEAD vengono rinfrescate in anticipo.
+    fn(client) è una coroutine function che ricarica la voce e ritorna la nuova scadenza
+    (epoch in secondi) oppure None se il rinfresco non è riuscito. Il client che riceve ha
+    un limite di velocità per host (REFRESH_RATE), così i rinfreschi non fanno bloccare l'addon.
+    """
+
+    FORGET_BELOW = 0.05
+
+    def __init__(self, interval: float, ahead: float, top: int, min_hits: float,
+                 concurrency: int, rate: float, max_tracked: int, half_life: float):
+        self.interval = interval
+        # La popolarità decade (dimezza ogni half_life): conta quanto un titolo è richiesto di recente
+        self.decay = 0.5 ** (interval / half_life) if half_life > 0 else 1.0
+        self.ahead = ahead
+        self.top = top
+        self.min_hits = min_hits
+        self.concurrency = max(1, concurrency)
+        self.max_tracked = max_tracked
+        self.client = RateLimitedClient(http_pool, HostRateLimiter(rate))
+        self.is_busy = lambda: False
+        self._entries = {}  # key -> {"score", "expires_at", "fn", "not_before"}
+        self._running = {}
+        self._slots = None
+        self.refreshed = 0
+        self.failed = 0
+
+    def track(self, key, expires_at: float, fn):
+        entry = self._entries.get(key)
+        if entry is None:
+            if len(self._entries) >= self.max_tracked:
+                # Si dimentica il titolo meno richiesto
+                coldest = min(self._entries, key=lambda k: self._entries[k]["score"])
+                del self._entries[coldest]
+            entry = self._entries[key] = {"score": 0.0, "not_before": 0}
+        entry["score"] += 1
+        entry["expires_at"] = expires_at
+        entry["fn"] = fn
+
+    def refresh(self, key, fn) -> bool:
+        """Rinfresco immediato (una sola volta per chiave). False se già in corso."""
+        if key in self._running:
+            return False
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+        task = asyncio.create_task(self._run(key, fn))
+        self._running[key] = task
+        task.add_done_callback(lambda _t: self._running.pop(key, None))
+        return True
+
+    async def _run(self, key, fn):
+        async with self._slots:
+            try:
+                expires_at = await fn(self.client)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.debug(f"Rinfresco {key} fallito: {e}")
+                expires_at = None
+        entry = self._entries.get(key)
+        if expires_at:
+            self.refreshed += 1
+            if entry is not None:
+                entry["expires_at"] = expires_at
+        else:
+            self.failed += 1
+            if entry is not None:
+                # Niente tentativi a raffica su un titolo che non si riesce a rinfrescare
+                entry["not_before"] = time.time() + max(self.interval * 5, self.ahead / 4)
+
+    def due(self) -> list:
+        """Chiavi da rinfrescare in questo giro, dalle più richieste."""
+        now = time.time()
+        candidates = [
+            (entry["score"], key) for key, entry in self._entries.items()
+            if entry["score"] >= self.min_hits
+            and entry["expires_at"] - now <= self.ahead
+            and entry["not_before"] <= now
+            and key not in self._running
+        ]
+        candidates.sort(reverse=True)
+        return [key for _score, key in candidates[:self.top]]
+
+    def _tick(self):
+        keys = [] if self.is_busy() else self.due()
+        for key in keys:
+            self.refresh(key, self._entries[key]["fn"])
+        if keys:
+            logger.info(f"Rinfresco anticipato di {len(keys)} titoli popolari.")
+        for key in list(self._entries):
+            entry = self._entries[key]
+            entry["score"] *= self.decay
+            if entry["score"] < self.FORGET_BELOW and key not in self._running:
+                del self._entries[key]
+
+    async def run(self):
+        """Ciclo dello scheduler (task avviato dal lifespan)."""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self._tick()
+            except Exception as e:
+                logger.error(f"Errore scheduler rinfresco: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "tracked": len(self._entries),
+            "running": len(self._running),
+            "refreshed": self.refreshed,
+            "failed": self.failed,
+        }
+
+    def cancel_all(self):
+        for task in list(self._running.values()):
+            task.cancel()
+
+
+refresher = RefreshScheduler(
+    settings.REFRESH_INTERVAL, settings.REFRESH_AHEAD, settings.REFRESH_TOP, settings.REFRESH_MIN_HITS,
+    settings.REFRESH_CONCURRENCY, settings.REFRESH_RATE, settings.REFRESH_TRACKED, settings.REFRESH_HALF_LIFE,
+)
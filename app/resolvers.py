@@ -1,52 +1,241 @@
 
 import re
+import asyncio
 import logging
-from app.utils import unpack_js
+from urllib.parse import urlsplit
+from app import settings
+from app.cache import TTLCache, SingleFlight, MISSING
+from app.shared import shared_cache
+from app.admission import Overloaded
+from app.breaker import UpstreamError
+from app.liveness import liveness
+from app.tracing import span
+from app.utils import unpack_js, links_ttl
+from app.workers import run_cpu
 
 logger = logging.getLogger(__name__)
 
-async def resolve_supervideo(url: str, client):
-    try:
-        response = await client.get(url, allow_redirects=True)
-        html = response.text
-        
-        # Check Packed JS
-        packed = re.search(r"(eval\(function\(p,a,c,k,e,d\).*?\.split\('\|'\)\)\))", html)
-        if packed:
-            unpacked = unpack_js(packed.group(1))
-            if unpacked:
-                html = unpacked
-        
-        # Cerca file m3u8/mp4
-        match = re.search(r'file:\s*"([^"]+)"', html) or re.search(r"src:\s*'([^']+)'", html)
-        if match:
-            return match.group(1)
-            
-    except Exception as e:
-        logger.error(f"SV Error: {e}")
-    return None
+# Cache dei link diretti già risolti, per URL di embed/pagina
+_resolved_cache = TTLCache(maxsize=settings.RESOLVED_CACHE_SIZE, ttl=settings.RESOLVED_CACHE_TTL, name="resolved")
+_resolved_flight = SingleFlight()
 
-async def resolve_maxstream(url: str, client):
-    try:
-        response = await client.get(url)
-        match = re.search(r'sources\W+src\W+(.*)",', response.text)
-        if match:
-            return match.group(1).replace('"', '').strip()
-    except:
-        pass
-    return None
+async def resolve_cached(key: str, resolve, url_of=lambda value: value):
+    """
+    Risolve 'key' (URL embed) tramite la coroutine resolve(), con cache del risultato.
+    Il TTL segue la scadenza del token nel link diretto (url_of(value)) se presente,
+    altrimenti RESOLVED_CACHE_TTL. Una risoluzione fallita invalida la voce.
+    Le UpstreamError arrivano al chiamante (per il circuit breaker del provider).
+    Se il validatore in background trova morto il link, la voce viene invalidata.
+    """
+    cached = _resolved_cache.get(key)
+    if cached is not MISSING:
+        _track(key, cached, url_of)
+        return cached
+
+    async def _resolve():
+        # Un altro worker potrebbe averlo già risolto
+        shared = await shared_cache.get("resolved", key)
+        if shared is not None:
+            value, ttl = shared
+            _resolved_cache.set(key, value, ttl=ttl)
+            return value
+        try:
+            value = await resolve()
+        except (UpstreamError, Overloaded, asyncio.CancelledError):
+            raise  # Breaker del provider, limite nostro, richiesta annullata: non sono "link non trovato"
+        except Exception:
+            value = None
+        if not value:
+            _resolved_cache.delete(key)
+            await shared_cache.delete("resolved", key)
+            return None
+        ttl = links_ttl([url_of(value)], settings.RESOLVED_CACHE_TTL)
+        _resolved_cache.set(key, value, ttl=ttl)
+        await shared_cache.set("resolved", key, value, ttl=ttl)
+        return value
+
+    value = await _resolved_flight.do(key, _resolve)
+    _track(key, value, url_of)
+    return value
+
+def _track(key: str, value, url_of):
+    if value:
+        liveness.on_dead(url_of(value), ("resolved", key), lambda: invalidate_resolved(key))
+
+async def invalidate_resolved(key: str):
+    """Rimuove un link risolto dalla cache, anche da quella condivisa (es. link morto o token revocato)."""
+    _resolved_cache.delete(key)
+    await shared_cache.delete("resolved", key)
+
+# ==========================================
+# RESOLVER PER HOST
+# ==========================================
+
+# Script 'packed' (Dean Edwards) nelle pagine embed. La coda varia tra i mirror:
+# ".split('|')))" oppure ".split('|'),0,{}))"
+PACKED_RE = re.compile(r"eval\(function\(p,a,c,k,e,d\).*?\.split\('\|'\)(?:,0,\{\})?\)\)", re.S)
+
+# Motivi di fallimento (etichetta 'reason' nelle metriche)
+NETWORK = "network"            # Errore di connessione/timeout
+HTTP_STATUS = "http_status"    # Risposta diversa da 200 (host in difficoltà o che ci blocca)
+NOT_FOUND = "not_found"        # 404/410: file rimosso
+NO_PACKED = "no_packed"        # Nessuno script packed dove serviva
+UNPACK_FAILED = "unpack_failed"
+NO_MATCH = "no_match"          # Pagina letta ma link non trovato (layout cambiato?)
+
+
+class ResolveError(Exception):
+    """Risoluzione fallita, con un motivo strutturato (vedi costanti sopra)."""
+
+    def __init__(self, reason: str, detail: str = ""):
+        super().__init__(reason, detail)
+        self.reason = reason
+        self.detail = detail
+
+    @property
+    def host_fault(self) -> bool:
+        """True se il problema è dell'host (conta per il circuit breaker), non del singolo file."""
+        return self.reason in (NETWORK, HTTP_STATUS)
+
+    def __str__(self):
+        return f"{self.reason}: {self.detail}" if self.detail else self.reason
+
+
+class Resolver:
+    """
+    Resolver di un host di embed. Le sottoclassi dichiarano:
+    - name: nome mostrato negli stream e usato per breaker/metriche
+    - hosts: domini e nomi del marchio che servono (es. "mixdrop" vale per mixdrop.ag, .co, ...)
+    - regex già compilate come attributi di classe, usate da extract()
+    - profiled: True per usare i profili di navigazione di HttpPool (host con challenge)
+    extract() è sincrona e gira nel pool CPU: deve sollevare ResolveError se non trova il link.
+    """
+
+    name = ""
+    hosts = ()
+    profiled = False
+
+    def normalize(self, url: str) -> str:
+        return url
+
+    async def fetch(self, url: str, client) -> str:
+        try:
+            response = await client.get(url, allow_redirects=True, profiled=self.profiled)
+        except (Overloaded, asyncio.CancelledError):
+            raise  # Limite nostro o richiesta annullata, non un problema dell'host
+        except Exception as e:
+            raise ResolveError(NETWORK, str(e)) from e
+        if response.status_code in (404, 410):
+            raise ResolveError(NOT_FOUND, str(response.status_code))
+        if response.status_code != 200:
+            raise ResolveError(HTTP_STATUS, str(response.status_code))
+        return response.text
+
+    def extract(self, html: str) -> str:
+        raise NotImplementedError
+
+    async def resolve(self, url: str, client) -> str:
+        """Link diretto per l'embed 'url'. Solleva ResolveError."""
+        key = self.name.lower()
+        with span(f"{key}_fetch"):
+            html = await self.fetch(self.normalize(url), client)
+        # Estrazione (unpack_js compreso) nel pool CPU
+        with span(f"{key}_extract"):
+            return await run_cpu(self.extract, html)
+
+    @staticmethod
+    def unpack(html: str, required: bool = True):
+        """Contenuto decodificato del primo script packed (None se assente e non obbligatorio)."""
+        packed = PACKED_RE.search(html)
+        if not packed:
+            if required:
+                raise ResolveError(NO_PACKED)
+            return None
+        unpacked = unpack_js(packed.group(0))
+        if not unpacked:
+            raise ResolveError(UNPACK_FAILED)
+        return unpacked
+
+
+class SuperVideoResolver(Resolver):
+    name = "SuperVideo"
+    hosts = ("supervideo",)
+
+    FILE_RE = re.compile(r'file:\s*"([^"]+)"')
+    SRC_RE = re.compile(r"src:\s*'([^']+)'")
+
+    def extract(self, html: str) -> str:
+        # Il player può essere packed o in chiaro
+        source = self.unpack(html, required=False) or html
+        match = self.FILE_RE.search(source) or self.SRC_RE.search(source)
+        if not match:
+            raise ResolveError(NO_MATCH, "file/src")
+        return match.group(1)
+
+
+class MixDropResolver(Resolver):
+    name = "MixDrop"
+    hosts = ("mixdrop", "m1xdrop", "mixdrp")
+    profiled = True
+
+    WURL_RE = re.compile(r'wurl\s*=\s*"([^"]+)"')
+
+    def normalize(self, url: str) -> str:
+        # Il vecchio dominio .club reindirizza a .cv, senza il suffisso del titolo
+        if (urlsplit(url).hostname or "").endswith(".club"):
+            url = url.replace("club", "cv").split("/2")[0]
+        return url
+
+    def extract(self, html: str) -> str:
+        match = self.WURL_RE.search(self.unpack(html))
+        if not match:
+            raise ResolveError(NO_MATCH, "wurl")
+        link = match.group(1)
+        return "https:" + link if link.startswith("//") else link
+
+
+class MaxStreamResolver(Resolver):
+    name = "MaxStream"
+    hosts = ("maxstream",)
+
+    SOURCES_RE = re.compile(r'sources\W+src\W+(.*)",')
+
+    def extract(self, html: str) -> str:
+        match = self.SOURCES_RE.search(html)
+        if not match:
+            raise ResolveError(NO_MATCH, "sources")
+        return match.group(1).replace('"', '').strip()
+
+
+RESOLVERS = [SuperVideoResolver(), MixDropResolver(), MaxStreamResolver()]
+
+# Dominio o nome del marchio -> resolver. Un mirror nuovo è una voce in più, non un if in più.
+_BY_HOST = {host: resolver for resolver in RESOLVERS for host in resolver.hosts}
+_BY_NAME = {resolver.name.lower(): resolver for resolver in RESOLVERS}
+for _alias, _name in settings.RESOLVER_HOST_ALIASES.items():
+    if _name.lower() in _BY_NAME:
+        _BY_HOST[_alias.lower()] = _BY_NAME[_name.lower()]
+    else:
+        logger.warning(f"RESOLVER_HOST_ALIASES: resolver '{_name}' sconosciuto per {_alias}")
+
+
+# Host dell'URL (senza schema, credenziali e porta): più veloce di urlsplit sul percorso caldo
+_HOST_RE = re.compile(r"(?:[A-Za-z][A-Za-z0-9+.-]*:)?//(?:[^@/?#]*@)?([^/?#:]+)")
 
-async def resolve_mixdrop(url: str, client):
-    try:
-        if "club" in url: url = url.replace("club", "cv").split("/2")[0]
-        response = await client.get(url)
-        packed = re.search(r"(eval\(function\(p,a,c,k,e,d\).*?\.split\('\|'\)\)\))", response.text)
-        if packed:
-            unpacked = unpack_js(packed.group(1))
-            if unpacked:
-                match = re.search(r'wurl="([^"]+)"', unpacked)
-                if match:
-                    return "https:" + match.group(1) if match.group(1).startswith("//") else match.group(1)
-    except:
-        pass
+def resolver_for(url: str):
+    """
+    Resolver per l'URL di un embed, o None se l'host non è supportato.
+    Si cercano l'host completo e i suoi domini padre, poi il nome del marchio
+    (secondo livello: "mixdrop" per www.mixdrop.ag): poche lookup in un dict.
+    """
+    match = _HOST_RE.match(url)
+    if not match:
+        return None
+    labels = match.group(1).lower().split(".")
+    for i in range(len(labels) - 1):
+        resolver = _BY_HOST.get(".".join(labels[i:]))
+        if resolver is not None:
+            return resolver
+    if len(labels) >= 2:
+        return _BY_HOST.get(labels[-2])
     return None
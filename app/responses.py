@@ -0,0 +1,50 @@
+import hashlib
+import json
+from fastapi import Request
+from fastapi.responses import Response
+
+# orjson è opzionale: se manca si ripiega sul modulo json standard
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def dumps(data) -> bytes:
+    """Serializza in JSON compatto (UTF-8), con orjson se disponibile."""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class JSONPayload:
+    """Corpo JSON serializzato una sola volta, con ETag forte calcolato sul contenuto."""
+
+    __slots__ = ("data", "body", "etag")
+
+    def __init__(self, data):
+        self.data = data
+        self.body = dumps(data)
+        self.etag = '"' + hashlib.blake2b(self.body, digest_size=12).hexdigest() + '"'
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def payload_response(request: Request, payload: JSONPayload, headers: dict = None) -> Response:
+    """
+    Risposta JSON precalcolata. Se il client ha già questa versione
+    (If-None-Match) risponde 304 senza corpo.
+    """
+    headers = dict(headers or {})
+    headers["ETag"] = payload.etag
+    if _etag_matches(request.headers.get("if-none-match"), payload.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(payload.body, media_type="application/json", headers=headers)
@@ -0,0 +1,159 @@
+import html
+import re
+
+# Scanner incrementali per le pagine HTML scaricate in streaming (HttpPool.scan).
+# Ricevono il testo a pezzi e dicono quando hanno trovato tutto: da lì in poi
+# il resto della pagina non serve e la connessione viene chiusa.
+
+_TAG_RE = re.compile(r"<[^>]+>")
+
+
+class TextScanner:
+    """
+    Base: richiama _scan() a ogni pezzo finché non è 'done'.
+    Il buffer tiene solo la coda non ancora consumata: dopo ogni scansione si scarta tutto
+    quello che precede _keep_from() e le sottoclassi spostano le loro posizioni (_shift).
+    Così ogni pezzo costa quanto la sua lunghezza, non quanto la pagina letta finora.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.done = False
+
+    def feed(self, text: str) -> bool:
+        if not self.done:
+            self.buffer += text
+            self.done = self._scan()
+            if not self.done:
+                self._compact()
+        return self.done
+
+    def close(self):
+        """Fine del corpo (o limite di dimensione raggiunto): ultima scansione su quanto arrivato."""
+        if not self.done:
+            self.done = self._scan(final=True)
+
+    def _compact(self):
+        cut = self._keep_from()
+        if cut > 0:
+            self.buffer = self.buffer[cut:]
+            self._shift(cut)
+
+    def _scan(self, final: bool = False) -> bool:
+        raise NotImplementedError
+
+    def _keep_from(self) -> int:
+        """Prima posizione del buffer che serve ancora."""
+        return 0
+
+    def _shift(self, cut: int):
+        """Le posizioni salvate vanno indietro di 'cut' caratteri."""
+
+
+class BodyScriptScanner(TextScanner):
+    """Contenuto del primo <script> dentro <body> (pagina player vixsrc)."""
+
+    _BODY_RE = re.compile(r"<body\b[^>]*>", re.I)
+    _OPEN_RE = re.compile(r"<script\b[^>]*>", re.I)
+    _CLOSE_RE = re.compile(r"</script\s*>", re.I)
+    _MAX_TAG = 4096  # Come MovieLinksScanner: oltre questa lunghezza un tag aperto non si aspetta
+
+    def __init__(self):
+        super().__init__()
+        self.script = None
+        self._pos = 0         # Da dove riprendere la ricerca
+        self._parts = None    # Contenuto dello script già letto (pezzi), dopo il tag di apertura
+        self._in_body = False
+
+    def _scan(self, final: bool = False) -> bool:
+        buf = self.buffer
+        if not self._in_body:
+            match = self._BODY_RE.search(buf, self._pos)
+            if not match:
+                # Il tag potrebbe essere spezzato tra due pezzi: si riparte dall'ultimo '<'
+                self._pos = self._resume_at(buf)
+                return False
+            self._in_body = True
+            self._pos = match.end()
+        if self._parts is None:
+            match = self._OPEN_RE.search(buf, self._pos)
+            if not match:
+                self._pos = self._resume_at(buf)
+                return False
+            self._parts = []
+            self._pos = match.end()
+        match = self._CLOSE_RE.search(buf, self._pos)
+        if not match:
+            # Il contenuto letto passa nei pezzi; nel buffer restano gli ultimi caratteri
+            # (una chiusura spezzata tra due pezzi)
+            keep = max(self._pos, len(buf) - 16)
+            self._parts.append(buf[self._pos:keep])
+            self._pos = keep
+            return False
+        self._parts.append(buf[self._pos:match.start()])
+        self.script = "".join(self._parts)
+        return True
+
+    def _resume_at(self, buf: str) -> int:
+        """Un tag non ancora completo (anche con attributi lunghi) può iniziare solo dall'ultimo '<'."""
+        last_tag = buf.rfind("<", self._pos)
+        return max(last_tag if last_tag >= 0 else len(buf), len(buf) - self._MAX_TAG, self._pos)
+
+    def _keep_from(self) -> int:
+        return self._pos
+
+    def _shift(self, cut: int):
+        self._pos -= cut
+
+
+class MovieLinksScanner(TextScanner):
+    """
+    Titolo (<h1>) ed embed ([data-link]) della pagina film di mostraguarda.
+    I link vengono cercati fino alla fine della pagina (come select('[data-link]')):
+    i mirror possono stare in più liste (schede, "altri server").
+    """
+
+    _H1_OPEN_RE = re.compile(r"<h1\b", re.I)
+    _H1_RE = re.compile(r"<h1\b[^>]*>(.*?)</h1\s*>", re.I | re.S)
+    _LINK_RE = re.compile(r"<[a-z][^>]*?\sdata-link\s*=\s*([\"'])(.*?)\1[^>]*>", re.I | re.S)
+    _MAX_TAG = 4096  # Un tag incompleto più lungo di così non è un link: non lo si aspetta
+
+    def __init__(self):
+        super().__init__()
+        self.title = None
+        self.links = []
+        self._link_pos = 0
+        self._h1_pos = 0
+
+    def _scan(self, final: bool = False) -> bool:
+        buf = self.buffer
+        if self.title is None:
+            opening = self._H1_OPEN_RE.search(buf, self._h1_pos)
+            if opening:
+                # Da qui in poi si cerca solo la chiusura, senza riscandire l'inizio della pagina
+                self._h1_pos = opening.start()
+                match = self._H1_RE.match(buf, self._h1_pos)
+                if match:
+                    self.title = html.unescape(_TAG_RE.sub("", match.group(1))).strip()
+            else:
+                self._h1_pos = max(0, len(buf) - 3)
+        # Solo tag completi: un tag spezzato a metà verrà letto col pezzo successivo
+        while True:
+            match = self._LINK_RE.search(buf, self._link_pos)
+            if not match:
+                break
+            self.links.append(html.unescape(match.group(2)).strip())
+            self._link_pos = match.end()
+        # Un link non ancora completo può iniziare solo dall'ultimo '<'
+        last_tag = buf.rfind("<", self._link_pos)
+        self._link_pos = max(last_tag if last_tag >= 0 else len(buf), len(buf) - self._MAX_TAG)
+        return final
+
+    def _keep_from(self) -> int:
+        if self.title is None:
+            return min(self._h1_pos, self._link_pos)
+        return self._link_pos
+
+    def _shift(self, cut: int):
+        self._link_pos -= cut
+        self._h1_pos = max(0, self._h1_pos - cut)
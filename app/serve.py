@@ -0,0 +1,49 @@
+"""
+Avvio del server secondo la configurazione (variabili d'ambiente, vedi app/settings.py).
+
+  python -m app.serve                          # uvicorn, WEB_WORKERS processi
+  SERVER=gunicorn WEB_WORKERS=4 python -m app.serve
+
+Con WEB_WORKERS > 1 ogni processo ha le sue cache in memoria; TMDB, link risolti
+ed embed GuardaHD passano anche dalla cache condivisa (SHARED_CACHE_URL, default SQLite).
+"""
+import importlib.util
+import os
+import sys
+from app import settings
+
+APP = "app.main:app"
+
+
+def run_uvicorn():
+    import uvicorn
+
+    uvicorn.run(APP, host=settings.HOST, port=settings.PORT, workers=max(1, settings.WEB_WORKERS))
+
+
+def run_gunicorn():
+    if importlib.util.find_spec("gunicorn") is None:
+        sys.exit("SERVER=gunicorn richiede il pacchetto gunicorn (pip install gunicorn)")
+    # Il processo viene sostituito da gunicorn (master + worker UvicornWorker)
+    argv = [
+        sys.executable, "-m", "gunicorn", APP,
+        "--worker-class", "uvicorn.workers.UvicornWorker",
+        "--workers", str(max(1, settings.WEB_WORKERS)),
+        "--bind", f"{settings.HOST}:{settings.PORT}",
+        "--graceful-timeout", "20",
+    ]
+    os.execv(sys.executable, argv)
+
+
+def main():
+    server = settings.SERVER.lower()
+    if server == "gunicorn":
+        run_gunicorn()
+    elif server == "uvicorn":
+        run_uvicorn()
+    else:
+        sys.exit(f"SERVER non supportato: {settings.SERVER} (uvicorn o gunicorn)")
+
+
+if __name__ == "__main__":
+    main()
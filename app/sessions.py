@@ -0,0 +1,194 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+import time
+from http.cookiejar import Cookie
+from app import settings
+
+logger = logging.getLogger("ITA-Addon")
+
+# Lingue coerenti con un utente italiano: una per profilo, sempre la stessa per tutta la sua vita
+_ACCEPT_LANGUAGES = [
+    "it-IT,it;q=0.9,en-US;q=0.8,en;q=0.7",
+    "it-IT,it;q=0.9",
+    "it,en-US;q=0.9,en;q=0.8",
+]
+
+# Indizi di una pagina di challenge/blocco (Cloudflare & simili)
+_CHALLENGE_MARKERS = ("challenge-platform", "cf-chl", "Just a moment...", "Attention Required!")
+# Inizio del corpo in cui cercarli (HttpPool.scan legge solo questo delle risposte 403/503)
+CHALLENGE_PEEK = 4096
+
+
+def is_blocked(response, body: str = None) -> bool:
+    """
+    True se la risposta è un blocco/challenge e non un normale errore dell'upstream.
+    body: inizio del corpo già letto (risposte in streaming), altrimenti response.text.
+    """
+    status = response.status_code
+    if status == 429:
+        return True
+    if status not in (403, 503):
+        return False
+    if response.headers.get("cf-mitigated") == "challenge":
+        return True
+    if body is None:
+        try:
+            body = response.text
+        except Exception:
+            return False
+    head = body[:CHALLENGE_PEEK]
+    return any(marker in head for marker in _CHALLENGE_MARKERS)
+
+
+class Profile:
+    """
+    Identità di navigazione stabile: target di impersonation (TLS + header del browser),
+    Accept-Language fisso e cookie jar proprio, tutti riusati richiesta dopo richiesta.
+    Così una clearance ottenuta resta valida finché il profilo vive.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, target: str, accept_language: str, session):
+        self.id = next(self._ids)
+        self.target = target
+        self.headers = {"Accept-Language": accept_language}
+        self.session = session
+        self.created = time.time()
+        self.requests = 0
+        self.strikes = 0  # Blocchi consecutivi
+
+    def export_cookies(self) -> list:
+        now = time.time()
+        return [
+            {"name": c.name, "value": c.value, "domain": c.domain, "path": c.path,
+             "secure": c.secure, "expires": c.expires}
+            for c in self.session.cookies.jar
+            if c.expires is None or c.expires > now
+        ]
+
+    def import_cookies(self, cookies: list):
+        now = time.time()
+        for c in cookies:
+            if c.get("expires") and c["expires"] <= now:
+                continue
+            domain, path = c.get("domain", ""), c.get("path", "/")
+            # Cookie completo, per conservare la scadenza originale
+            self.session.cookies.jar.set_cookie(Cookie(
+                0, c["name"], c["value"], None, False, domain, bool(domain), domain.startswith("."),
+                path, True, c.get("secure", False), c.get("expires"), False, None, None, {},
+            ))
+
+    def snapshot(self) -> dict:
+        return {
+            "id": self.id,
+            "target": self.target,
+            "requests": self.requests,
+            "strikes": self.strikes,
+            "cookies": len(self.session.cookies.jar),
+            "age": round(time.time() - self.created),
+        }
+
+
+class ProfilePool:
+    """
+    Pool di profili a lunga vita, usati a rotazione (round robin) dalle richieste 'profiled'
+    di HttpPool. Un profilo bloccato SESSION_PROFILE_STRIKES volte di fila viene ritirato
+    e sostituito da uno nuovo (sessione e cookie puliti). I cookie vengono salvati su file
+    allo shutdown e ricaricati all'avvio.
+    """
+
+    RETIRE_GRACE = 60  # Secondi prima di chiudere la sessione di un profilo ritirato
+
+    def __init__(self, new_session, targets=None, path: str = None):
+        self._new_session = new_session  # target -> AsyncSession configurata
+        self.targets = list(targets or settings.SESSION_PROFILES)
+        self.path = settings.SESSION_PROFILES_FILE if path is None else path
+        self.profiles = []
+        self.retired = 0
+        self._turn = 0
+        self._spawned = 0
+
+    def _spawn(self, target: str) -> Profile:
+        language = _ACCEPT_LANGUAGES[self._spawned % len(_ACCEPT_LANGUAGES)]
+        self._spawned += 1
+        return Profile(target, language, self._new_session(target))
+
+    def start(self):
+        if self.profiles:
+            return
+        saved = self._load()
+        for index, target in enumerate(self.targets):
+            profile = self._spawn(target)
+            if index < len(saved) and saved[index].get("target") == target:
+                profile.import_cookies(saved[index].get("cookies", []))
+            self.profiles.append(profile)
+
+    def pick(self) -> Profile:
+        if not self.profiles:
+            self.start()
+        profile = self.profiles[self._turn % len(self.profiles)]
+        self._turn += 1
+        profile.requests += 1
+        return profile
+
+    async def report(self, profile: Profile, response, body: str = None):
+        """Aggiorna lo stato del profilo in base alla risposta; ritira quelli bloccati."""
+        if not is_blocked(response, body):
+            profile.strikes = 0
+            return
+        profile.strikes += 1
+        logger.warning(f"Profilo {profile.id} ({profile.target}) bloccato ({response.status_code}), "
+                       f"{profile.strikes}/{settings.SESSION_PROFILE_STRIKES}")
+        if profile.strikes < settings.SESSION_PROFILE_STRIKES or profile not in self.profiles:
+            return
+        index = self.profiles.index(profile)
+        self.profiles[index] = self._spawn(profile.target)
+        self.retired += 1
+        logger.warning(f"Profilo {profile.id} ritirato, sostituito da {self.profiles[index].id}.")
+        # Chiusura ritardata: altre richieste potrebbero usare ancora la sua sessione
+        asyncio.get_running_loop().call_later(
+            self.RETIRE_GRACE, lambda: asyncio.ensure_future(self._close_session(profile))
+        )
+
+    async def _close_session(self, profile: Profile):
+        try:
+            await profile.session.close()
+        except Exception as e:
+            logger.debug(f"Errore chiusura sessione profilo {profile.id}: {e}")
+
+    def _load(self) -> list:
+        if not self.path or not os.path.exists(self.path):
+            return []
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            return data if isinstance(data, list) else []
+        except (OSError, ValueError) as e:
+            logger.warning(f"Cookie dei profili non caricati ({self.path}): {e}")
+            return []
+
+    def _save(self):
+        if not self.path or not self.profiles:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            data = [{"target": p.target, "cookies": p.export_cookies()} for p in self.profiles]
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning(f"Cookie dei profili non salvati ({self.path}): {e}")
+
+    async def close(self):
+        self._save()
+        profiles, self.profiles = self.profiles, []
+        for profile in profiles:
+            await self._close_session(profile)
+
+    def stats(self) -> dict:
+        return {"retired": self.retired, "profiles": [p.snapshot() for p in self.profiles]}
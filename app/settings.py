@@ -0,0 +1,178 @@
+import os
+
+# Impostazioni del server lette dalle variabili d'ambiente (docker-compose / Dockerfile).
+# La configurazione per-utente (TMDB Key, MFP) resta invece nell'URL, vedi decode_config.
+
+
+def _env_str(name: str, default: str) -> str:
+    return os.environ.get(name, default).strip()
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_list(name: str, default: str) -> list:
+    return [v.strip() for v in _env_str(name, default).split(",") if v.strip()]
+
+
+def _env_map(name: str, default: str = "") -> dict:
+    """Formato "chiave=valore,chiave2=valore2" (es. RESOLVER_HOST_ALIASES="mdzsmutpcvykb.net=MixDrop")."""
+    result = {}
+    for item in _env_list(name, default):
+        key, sep, value = item.partition("=")
+        if sep and key.strip() and value.strip():
+            result[key.strip()] = value.strip()
+    return result
+
+
+def _env_float_map(name: str, default: str = "") -> dict:
+    """Formato "Nome=valore,Nome2=valore2" (es. PROVIDER_TIMEOUTS="GuardaHD=12,VixSrc=6")."""
+    result = {}
+    for item in _env_list(name, default):
+        key, sep, value = item.partition("=")
+        if not sep:
+            continue
+        try:
+            result[key.strip()] = float(value)
+        except ValueError:
+            continue
+    return result
+
+
+# --- DOMINI UPSTREAM (sovrascrivibili per mirror o per i benchmark con upstream finti) ---
+TMDB_API_URL = _env_str("TMDB_API_URL", "https://api.themoviedb.org/3").rstrip("/")
+VIX_DOMAIN = _env_str("VIX_DOMAIN", "https://vixsrc.to").rstrip("/")
+GUARDAHD_BASE_URL = _env_str("GUARDAHD_BASE_URL", "https://mostraguarda.stream").rstrip("/")
+
+# --- CLIENT HTTP CONDIVISO ---
+HTTP_IMPERSONATE = _env_str("HTTP_IMPERSONATE", "chrome110")
+HTTP_MAX_CLIENTS = _env_int("HTTP_MAX_CLIENTS", 64)          # Handle curl totali nel pool
+HTTP_PER_HOST_LIMIT = _env_int("HTTP_PER_HOST_LIMIT", 8)     # Richieste simultanee per host
+HTTP_VERSION = _env_str("HTTP_VERSION", "")                  # "", "1.1", "2" (vuoto = default impersonate)
+HTTP_DNS_CACHE_TTL = _env_int("HTTP_DNS_CACHE_TTL", 300)     # Secondi
+HTTP_TIMEOUT = _env_float("HTTP_TIMEOUT", 15)
+HTTP_WARMUP_URLS = _env_list("HTTP_WARMUP_URLS", "https://api.themoviedb.org")   # Warmup con la sessione principale
+HTTP_WARMUP_PROFILED_URLS = _env_list("HTTP_WARMUP_PROFILED_URLS", VIX_DOMAIN)      # Warmup di ogni profilo (host 'profiled')
+SCAN_MAX_BYTES = _env_int("SCAN_MAX_BYTES", 2 * 1024 * 1024)  # Limite corpo delle pagine lette in streaming
+HTTP_TRACKED_HOSTS = _env_int("HTTP_TRACKED_HOSTS", 1024)    # Host con limiti in memoria (semaforo, token bucket), i meno recenti si scartano
+# Frammenti di host con una propria etichetta in addon_upstream_responses_total (più gli host dei domini sopra);
+# gli altri (CDN dei link, proxy MFP degli utenti) finiscono sotto "other"
+UPSTREAM_METRIC_HOSTS = _env_list("UPSTREAM_METRIC_HOSTS", "themoviedb,vixsrc,mostraguarda,mixdrop,supervideo,maxstream")
+
+# --- PROFILI DI NAVIGAZIONE (richieste verso host protetti, es. vixsrc) ---
+SESSION_PROFILES = _env_list("SESSION_PROFILES", "chrome110,chrome116,chrome120")  # Un profilo per target
+SESSION_PROFILE_STRIKES = _env_int("SESSION_PROFILE_STRIKES", 3)   # Blocchi consecutivi prima del ritiro
+SESSION_PROFILES_FILE = _env_str("SESSION_PROFILES_FILE", os.path.join(os.getcwd(), "config", "session_profiles.json"))
+
+# --- CACHE TMDB (IMDB -> TMDB) ---
+TMDB_CACHE_SIZE = _env_int("TMDB_CACHE_SIZE", 20000)
+TMDB_CACHE_TTL = _env_int("TMDB_CACHE_TTL", 7 * 24 * 60 * 60)   # La mappatura non cambia
+TMDB_NEGATIVE_TTL = _env_int("TMDB_NEGATIVE_TTL", 30 * 60)      # "Non trovato" dura meno
+TMDB_SEASONS_TTL = _env_int("TMDB_SEASONS_TTL", 6 * 60 * 60)    # Episodi per stagione (serie in corso)
+
+# --- CACHE RISPOSTE STREAM ---
+STREAM_CACHE_SIZE = _env_int("STREAM_CACHE_SIZE", 5000)
+STREAM_CACHE_TTL = _env_int("STREAM_CACHE_TTL", 15 * 60)        # Limitato anche dagli 'expires' nei link
+STREAM_CACHE_EMPTY_TTL = _env_int("STREAM_CACHE_EMPTY_TTL", 60)  # Risposte vuote: poco, per riprovare presto
+
+# --- RISOLUZIONE EMBED ---
+RESOLVED_CACHE_SIZE = _env_int("RESOLVED_CACHE_SIZE", 20000)
+RESOLVED_CACHE_TTL = _env_int("RESOLVED_CACHE_TTL", 20 * 60)              # Se il link non dichiara la scadenza
+RESOLVER_PER_HOST_LIMIT = _env_int("RESOLVER_PER_HOST_LIMIT", 3)        # Risoluzioni simultanee per host
+GUARDAHD_RESOLVE_DEADLINE = _env_float("GUARDAHD_RESOLVE_DEADLINE", 8)  # Secondi, poi si restituisce il parziale
+RESOLVER_HOST_ALIASES = _env_map("RESOLVER_HOST_ALIASES")                 # Mirror extra: "dominio=NomeResolver"
+
+# --- BUDGET DI LATENZA ---
+STREAM_RESPONSE_DEADLINE = _env_float("STREAM_RESPONSE_DEADLINE", 6)  # Secondi, 0 = nessun limite
+PROVIDER_TIMEOUT = _env_float("PROVIDER_TIMEOUT", 20)                 # Default per provider, 0 = nessun limite
+PROVIDER_TIMEOUTS = _env_float_map("PROVIDER_TIMEOUTS")               # Override per nome provider
+
+# --- POOL CPU (parsing HTML / unpack_js) ---
+PARSER_EXECUTOR = _env_str("PARSER_EXECUTOR", "thread")                   # "thread" o "process"
+PARSER_WORKERS = _env_int("PARSER_WORKERS", min(4, os.cpu_count() or 1))
+PARSER_QUEUE_LIMIT = _env_int("PARSER_QUEUE_LIMIT", 64)                   # Job accettati oltre i quali si attende
+
+# --- PREFETCH EPISODI SUCCESSIVI ---
+PREFETCH_EPISODES = _env_int("PREFETCH_EPISODES", 1)              # Episodi da preparare dopo quello richiesto, 0 = off
+PREFETCH_CONCURRENCY = _env_int("PREFETCH_CONCURRENCY", 2)        # Prefetch simultanei in tutto il processo
+PREFETCH_MAX_PENDING = _env_int("PREFETCH_MAX_PENDING", 50)       # Oltre, i nuovi prefetch vengono scartati
+PREFETCH_DELAY = _env_float("PREFETCH_DELAY", 2)                  # Secondi di attesa prima di partire
+PREFETCH_MAX_FOREGROUND = _env_int("PREFETCH_MAX_FOREGROUND", 20) # Raccolte utente in corso oltre cui si rinuncia
+
+# --- CIRCUIT BREAKER (provider e host dei resolver) ---
+BREAKER_WINDOW = _env_float("BREAKER_WINDOW", 60)          # Secondi di storico considerati
+BREAKER_MIN_CALLS = _env_int("BREAKER_MIN_CALLS", 5)       # Chiamate minime prima di poter aprire
+BREAKER_ERROR_RATE = _env_float("BREAKER_ERROR_RATE", 0.5) # Soglia di apertura
+BREAKER_SLOW_CALL = _env_float("BREAKER_SLOW_CALL", 10)    # Secondi oltre cui una chiamata conta come errore
+BREAKER_COOLDOWN = _env_float("BREAKER_COOLDOWN", 30)      # Secondi in stato open prima del probe
+
+# --- PROCESSI WORKER E CACHE CONDIVISA (python -m app.serve) ---
+SERVER = _env_str("SERVER", "uvicorn")             # "uvicorn" o "gunicorn" (worker UvicornWorker)
+HOST = _env_str("HOST", "0.0.0.0")
+PORT = _env_int("PORT", 7000)
+WEB_WORKERS = _env_int("WEB_WORKERS", 1)           # Processi worker, 1 = modalità singolo processo
+SHARED_CACHE_URL = _env_str("SHARED_CACHE_URL", "")  # "", memory://, sqlite:///percorso.db, redis://host:6379/0
+SHARED_CACHE_POOL = _env_int("SHARED_CACHE_POOL", 4)  # Connessioni verso il backend redis
+
+# --- CACHE EMBED GUARDAHD (stale-while-revalidate) ---
+GUARDAHD_CACHE_TTL = _env_int("GUARDAHD_CACHE_TTL", 12 * 60 * 60)  # Dopo: voce "stale", servita e rinfrescata in background
+GUARDAHD_STALE_TTL = _env_int("GUARDAHD_STALE_TTL", 48 * 60 * 60)  # Dopo: voce eliminata, serve uno scraping sul percorso utente
+
+# --- RINFRESCO IN BACKGROUND DEI TITOLI POPOLARI ---
+REFRESH_INTERVAL = _env_float("REFRESH_INTERVAL", 60)       # Secondi tra un giro dello scheduler e l'altro
+REFRESH_AHEAD = _env_float("REFRESH_AHEAD", 60 * 60)        # Rinfresca le voci che scadono entro questi secondi
+REFRESH_TOP = _env_int("REFRESH_TOP", 50)                   # Voci rinfrescate al massimo per giro (le più richieste)
+REFRESH_MIN_HITS = _env_float("REFRESH_MIN_HITS", 2)        # Popolarità minima (richieste, con decadimento)
+REFRESH_HALF_LIFE = _env_float("REFRESH_HALF_LIFE", 6 * 60 * 60)  # Secondi in cui la popolarità si dimezza
+REFRESH_CONCURRENCY = _env_int("REFRESH_CONCURRENCY", 2)    # Rinfreschi simultanei
+REFRESH_RATE = _env_float("REFRESH_RATE", 1)                # Richieste/secondo per host dei rinfreschi (0 = nessun limite)
+REFRESH_TRACKED = _env_int("REFRESH_TRACKED", 5000)         # Titoli seguiti al massimo
+
+# --- ADMISSION CONTROL (lavoro upstream sotto carico) ---
+ADMISSION_MAX_ACTIVE = _env_int("ADMISSION_MAX_ACTIVE", 32)          # Raccolte stream simultanee, 0 = nessun limite
+ADMISSION_TENANT_QUEUE = _env_int("ADMISSION_TENANT_QUEUE", 8)       # Raccolte in coda per singola config utente
+ADMISSION_SERVICE_TIME = _env_float("ADMISSION_SERVICE_TIME", 2)     # Stima iniziale (s) della durata di una raccolta
+UPSTREAM_HOST_RATE = _env_float("UPSTREAM_HOST_RATE", 0)             # Richieste/secondo per host non elencato, 0 = nessun limite
+UPSTREAM_HOST_RATES = _env_float_map("UPSTREAM_HOST_RATES", "vixsrc=8,mixdrop=4,supervideo=4")  # Per frammento del nome host
+UPSTREAM_HOST_BURST = _env_float("UPSTREAM_HOST_BURST", 8)           # Richieste concesse in un picco
+UPSTREAM_HOST_MAX_WAIT = _env_float("UPSTREAM_HOST_MAX_WAIT", 3)     # Oltre questa attesa la richiesta fallisce subito, 0 = attende sempre
+
+# --- VALIDAZIONE IN BACKGROUND DEI LINK IN CACHE ---
+LIVENESS_INTERVAL = _env_float("LIVENESS_INTERVAL", 30)       # Secondi tra un giro di probe e l'altro
+LIVENESS_BUDGET = _env_int("LIVENESS_BUDGET", 20)             # Probe al massimo per giro, 0 = validatore spento
+LIVENESS_CONCURRENCY = _env_int("LIVENESS_CONCURRENCY", 2)    # Probe simultanei
+LIVENESS_RATE = _env_float("LIVENESS_RATE", 1)                # Probe/secondo per host
+LIVENESS_RECHECK = _env_float("LIVENESS_RECHECK", 10 * 60)    # Un link verificato non si riprova prima di così
+LIVENESS_TIMEOUT = _env_float("LIVENESS_TIMEOUT", 5)          # Secondi per un singolo probe
+LIVENESS_MAX_FAILURES = _env_int("LIVENESS_MAX_FAILURES", 2)  # Errori (401/403/5xx/rete) di fila per considerare morto un link
+LIVENESS_TRACKED = _env_int("LIVENESS_TRACKED", 5000)         # Link seguiti al massimo
+
+# --- TRACING (Server-Timing e trace log) ---
+SERVER_TIMING = _env_bool("SERVER_TIMING", False)            # Header Server-Timing con le durate per fase
+TRACE_LOG_FILE = _env_str("TRACE_LOG_FILE", "")              # File JSON lines delle tracce, vuoto = spento
+TRACE_SAMPLE_RATE = _env_float("TRACE_SAMPLE_RATE", 0.01)    # Quota di richieste scritte nel trace log
+TRACE_SLOW_MS = _env_float("TRACE_SLOW_MS", 3000)            # Le richieste più lente vanno sempre nel log, 0 = no
+
+# --- LOGGING E AVVIO ---
+LOG_LEVEL = _env_str("LOG_LEVEL", "info")                    # debug, info, warning, error
+LOG_QUEUE = _env_bool("LOG_QUEUE", True)                     # Scrittura dei log in un thread dedicato (non blocca le richieste)
+LOG_REQUEST_SAMPLE = _env_float("LOG_REQUEST_SAMPLE", 1.0)   # Quota di richieste con le righe INFO nel log (1 = tutte)
+PRELOAD = _env_bool("PRELOAD", True)                         # Dopo l'avvio prepara in background provider e pagina di configurazione
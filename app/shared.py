@@ -0,0 +1,286 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, unquote
+from app import settings
+
+logger = logging.getLogger("ITA-Addon")
+
+# Se non configurata, con più worker si usa un file SQLite condiviso accanto alle altre cache
+DEFAULT_SQLITE_PATH = os.path.join(os.getcwd(), 'config', 'shared_cache.db')
+
+
+class MemoryBackend:
+    """Sostituto locale (singolo processo): stessa interfaccia dei backend veri, per sviluppo e prove."""
+
+    def __init__(self):
+        self._data = {}  # key -> (expires_at, raw)
+
+    async def get(self, key):
+        item = self._data.get(key)
+        if item is None or item[0] <= time.time():
+            self._data.pop(key, None)
+            return None
+        return item[1], item[0] - time.time()
+
+    async def set(self, key, raw: str, ttl: float):
+        self._data[key] = (time.time() + ttl, raw)
+
+    async def delete(self, key):
+        self._data.pop(key, None)
+
+    async def close(self):
+        self._data.clear()
+
+
+class SqliteBackend:
+    """
+    Tabella chiave/valore con scadenza in un file SQLite (WAL) condiviso dai worker
+    della stessa macchina. Le query girano su un thread dedicato, fuori dall'event loop.
+    """
+
+    CLEANUP_EVERY = 500  # Scritture tra una pulizia delle voci scadute e l'altra
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = None
+        self._writes = 0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shared-cache")
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS shared_cache "
+                "(key TEXT PRIMARY KEY, expires REAL NOT NULL, value TEXT NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _get(self, key):
+        row = self._connect().execute(
+            "SELECT value, expires FROM shared_cache WHERE key = ? AND expires > ?", (key, time.time())
+        ).fetchone()
+        return (row[0], row[1] - time.time()) if row else None
+
+    def _set(self, key, raw, expires):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO shared_cache (key, expires, value) VALUES (?, ?, ?)", (key, expires, raw)
+            )
+            self._writes += 1
+            if self._writes % self.CLEANUP_EVERY == 0:
+                conn.execute("DELETE FROM shared_cache WHERE expires <= ?", (time.time(),))
+
+    def _delete(self, key):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM shared_cache WHERE key = ?", (key,))
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def get(self, key):
+        return await self._run(self._get, key)
+
+    async def set(self, key, raw: str, ttl: float):
+        await self._run(self._set, key, raw, time.time() + ttl)
+
+    async def delete(self, key):
+        await self._run(self._delete, key)
+
+    async def close(self):
+        await self._run(self._close)
+
+
+class RedisError(Exception):
+    pass
+
+
+class RedisBackend:
+    """
+    Client minimale del protocollo Redis (RESP2) su asyncio: GET/PTTL in pipeline, SET PX, DEL.
+    Funziona con Redis, Valkey, KeyDB, Dragonfly... senza dipendenze aggiuntive.
+    URL: redis://[:password@]host[:port][/db]
+    """
+
+    def __init__(self, url: str, pool_size: int = 4):
+        parts = urlsplit(url)
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or 6379
+        self.password = unquote(parts.password) if parts.password else None
+        self.db = int(parts.path.strip("/") or 0)
+        self._pool = asyncio.Queue()
+        self._slots = asyncio.Semaphore(max(1, pool_size))
+
+    @staticmethod
+    def _encode(*args) -> bytes:
+        out = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            out.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(out)
+
+    @classmethod
+    async def _read_reply(cls, reader):
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError("connessione redis chiusa")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            raise RedisError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            size = int(payload)
+            if size < 0:
+                return None
+            data = await reader.readexactly(size + 2)
+            return data[:-2].decode("utf-8")
+        if kind == b"*":
+            size = int(payload)
+            return None if size < 0 else [await cls._read_reply(reader) for _ in range(size)]
+        raise RedisError(f"risposta RESP non valida: {line!r}")
+
+    async def _connect(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        setup = []
+        if self.password:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        if setup:
+            await self._roundtrip((reader, writer), setup)
+        return reader, writer
+
+    async def _roundtrip(self, conn, commands):
+        reader, writer = conn
+        writer.write(b"".join(self._encode(*cmd) for cmd in commands))
+        await writer.drain()
+        return [await self._read_reply(reader) for _ in commands]
+
+    async def _execute(self, *commands):
+        """Invia i comandi in pipeline su una connessione del pool; risposte nello stesso ordine."""
+        async with self._slots:
+            conn = self._pool.get_nowait() if not self._pool.empty() else await self._connect()
+            try:
+                replies = await self._roundtrip(conn, commands)
+            except BaseException:
+                # Connessione in stato incerto (errore o cancellazione a metà risposta): si butta
+                conn[1].close()
+                raise
+            self._pool.put_nowait(conn)
+            return replies
+
+    async def get(self, key):
+        raw, pttl = await self._execute(("GET", key), ("PTTL", key))
+        if raw is None:
+            return None
+        return raw, (pttl / 1000 if pttl and pttl > 0 else 0)
+
+    async def set(self, key, raw: str, ttl: float):
+        await self._execute(("SET", key, raw, "PX", max(1, int(ttl * 1000))))
+
+    async def delete(self, key):
+        await self._execute(("DEL", key))
+
+    async def close(self):
+        while not self._pool.empty():
+            _reader, writer = self._pool.get_nowait()
+            writer.close()
+
+
+def _build_backend(url: str):
+    if not url:
+        if settings.WEB_WORKERS <= 1:
+            return None  # Singolo processo: bastano le cache in memoria
+        url = f"sqlite:///{DEFAULT_SQLITE_PATH}"
+    scheme = url.split("://", 1)[0].lower()
+    if scheme == "memory":
+        return MemoryBackend()
+    if scheme == "sqlite":
+        # Come SQLAlchemy: sqlite:///relativo.db oppure sqlite:////percorso/assoluto.db
+        path = url.split("://", 1)[1]
+        return SqliteBackend(path[1:] if path.startswith("/") else path)
+    if scheme in ("redis", "valkey"):
+        return RedisBackend(url, settings.SHARED_CACHE_POOL)
+    raise ValueError(f"SHARED_CACHE_URL non supportato: {url}")
+
+
+class SharedCache:
+    """
+    Secondo livello di cache condiviso tra i processi worker (TMDB, link risolti).
+    Le TTLCache in memoria restano il primo livello: qui si passa solo sui loro miss.
+    Valori in JSON. Gli errori del backend valgono come miss: la cache non deve mai far fallire una richiesta.
+    """
+
+    PREFIX = "ita-addon"
+
+    def __init__(self, url: str):
+        self.backend = _build_backend(url)
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    @property
+    def cross_process(self) -> bool:
+        """True se le voci sono visibili agli altri processi (SQLite o Redis, non memory://)."""
+        return self.backend is not None and not isinstance(self.backend, MemoryBackend)
+
+    def _key(self, namespace: str, key) -> str:
+        if isinstance(key, tuple):
+            key = ":".join(str(part) for part in key)
+        return f"{self.PREFIX}:{namespace}:{key}"
+
+    async def get(self, namespace: str, key):
+        """Ritorna (valore, ttl_residuo) oppure None."""
+        if self.backend is None:
+            return None
+        try:
+            item = await self.backend.get(self._key(namespace, key))
+            if item is None:
+                return None
+            raw, ttl = item
+            return json.loads(raw), ttl
+        except Exception as e:
+            logger.warning(f"Cache condivisa non disponibile (get {namespace}): {e}")
+            return None
+
+    async def set(self, namespace: str, key, value, ttl: float):
+        if self.backend is None or ttl <= 0:
+            return
+        try:
+            await self.backend.set(self._key(namespace, key), json.dumps(value), ttl)
+        except Exception as e:
+            logger.warning(f"Cache condivisa non disponibile (set {namespace}): {e}")
+
+    async def delete(self, namespace: str, key):
+        if self.backend is None:
+            return
+        try:
+            await self.backend.delete(self._key(namespace, key))
+        except Exception as e:
+            logger.warning(f"Cache condivisa non disponibile (delete {namespace}): {e}")
+
+    async def close(self):
+        if self.backend is not None:
+            await self.backend.close()
+
+
+shared_cache = SharedCache(settings.SHARED_CACHE_URL)
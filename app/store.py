@@ -0,0 +1,239 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app import settings
+
+logger = logging.getLogger("ITA-Addon")
+
+# Tutte le cache aperte dal processo, chiuse insieme allo shutdown
+_stores = []
+
+
+class PersistentCache:
+    """
+    Cache persistente su SQLite (WAL) con indice completo in memoria.
+    - Letture puntuali dalla memoria, senza toccare il disco.
+    - Scritture e purge eseguiti su un thread dedicato (fuori dall'event loop),
+      serializzati: nessuna scrittura concorrente si perde.
+    - Le voci restano in ordine di timestamp, così la purge procede a piccoli lotti.
+    I timestamp sono in millisecondi, come nel vecchio file JSON.
+
+    Con shared=True (default con WEB_WORKERS > 1 o SHARED_CACHE_URL impostato, ad esempio
+    quando anche python -m app.warmup scrive sullo stesso file) più processi usano il file:
+    le letture passano dal database, così ogni worker vede le voci salvate dagli altri,
+    e la purge lavora direttamente sulla tabella.
+    """
+
+    SHARED_PURGE_INTERVAL = 60  # Secondi
+
+    def __init__(self, path: str, table: str = "cache", legacy_json: str = None, shared: bool = None):
+        self.path = path
+        self.table = table
+        self.legacy_json = legacy_json
+        if shared is None:
+            shared = settings.WEB_WORKERS > 1 or bool(settings.SHARED_CACHE_URL)
+        self.shared = shared
+        self._index = {}  # key -> (timestamp_ms, value), in ordine di timestamp
+        self._ordered = True  # False dopo un inserimento fuori ordine: la purge riordina
+        self._conn = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"store-{table}")
+        self._open_lock = asyncio.Lock()
+        self._opened = False
+        self._next_shared_purge = 0
+        _stores.append(self)
+
+    # --- Lato thread (I/O su disco) ---
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} "
+            "(key TEXT PRIMARY KEY, timestamp REAL NOT NULL, value TEXT NOT NULL)"
+        )
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_ts ON {self.table}(timestamp)")
+        return conn
+
+    def _load(self):
+        self._conn = self._connect()
+        self._import_legacy()
+        rows = self._conn.execute(
+            f"SELECT key, timestamp, value FROM {self.table} ORDER BY timestamp"
+        ).fetchall()
+        index = {}
+        for key, ts, value in rows:
+            try:
+                index[key] = (ts, json.loads(value))
+            except ValueError:
+                continue
+        return index
+
+    def _import_legacy(self):
+        """Importa una sola volta il vecchio file JSON, poi lo rinomina."""
+        if not self.legacy_json or not os.path.exists(self.legacy_json):
+            return
+        try:
+            with open(self.legacy_json, "r") as f:
+                data = json.load(f)
+            rows = [
+                (k, float(v.get("timestamp", 0)), json.dumps(v))
+                for k, v in data.items() if isinstance(v, dict)
+            ]
+            with self._conn:
+                self._conn.executemany(
+                    f"INSERT OR IGNORE INTO {self.table} (key, timestamp, value) VALUES (?, ?, ?)", rows
+                )
+            os.replace(self.legacy_json, self.legacy_json + ".imported")
+            logger.info(f"Importate {len(rows)} voci da {self.legacy_json}")
+        except Exception as e:
+            logger.error(f"Errore import cache legacy {self.legacy_json}: {e}")
+
+    def _write(self, key, timestamp, value):
+        with self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, timestamp, value) VALUES (?, ?, ?)",
+                (key, timestamp, value),
+            )
+
+    def _read(self, key):
+        row = self._conn.execute(
+            f"SELECT timestamp, value FROM {self.table} WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        try:
+            return row[0], json.loads(row[1])
+        except ValueError:
+            return None
+
+    def _purge_older(self, limit_ms, batch):
+        with self._conn:
+            cursor = self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN "
+                f"(SELECT key FROM {self.table} WHERE timestamp < ? ORDER BY timestamp LIMIT ?)",
+                (limit_ms, batch),
+            )
+        return cursor.rowcount
+
+    def _delete(self, keys):
+        with self._conn:
+            self._conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", [(k,) for k in keys])
+
+    # --- Lato event loop ---
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def open(self):
+        if self._opened:
+            return
+        async with self._open_lock:
+            if self._opened:
+                return
+            self._index = await self._run(self._load)
+            self._opened = True
+
+    async def get(self, key):
+        """Ritorna il valore salvato oppure None."""
+        await self.open()
+        if self.shared:
+            try:
+                item = await self._run(self._read, key)
+            except Exception as e:
+                logger.error(f"Errore lettura cache {self.table}: {e}")
+                item = self._index.get(key)
+            else:
+                if item is not None:
+                    self._put(key, item)
+                else:
+                    self._index.pop(key, None)
+            return item[1] if item else None
+        item = self._index.get(key)
+        return item[1] if item else None
+
+    async def set(self, key, value, timestamp: float = None):
+        await self.open()
+        timestamp = time.time() * 1000 if timestamp is None else timestamp
+        self._put(key, (timestamp, value))
+        try:
+            await self._run(self._write, key, timestamp, json.dumps(value))
+        except Exception as e:
+            logger.error(f"Errore scrittura cache {self.table}: {e}")
+
+    def _put(self, key, item):
+        """
+        Aggiorna l'indice senza rompere l'ordine per timestamp su cui conta la purge:
+        stesso timestamp = aggiornamento sul posto, altrimenti la voce va in coda
+        (e se è più vecchia dell'ultima l'indice verrà riordinato alla prossima purge).
+        """
+        old = self._index.get(key)
+        if old is not None and old[0] == item[0]:
+            self._index[key] = item
+            return
+        self._index.pop(key, None)
+        if self._index and item[0] < next(reversed(self._index.values()))[0]:
+            self._ordered = False
+        self._index[key] = item
+
+    async def delete(self, key):
+        await self.open()
+        if self._index.pop(key, None) is not None:
+            try:
+                await self._run(self._delete, [key])
+            except Exception as e:
+                logger.error(f"Errore cancellazione cache {self.table}: {e}")
+
+    async def purge(self, ttl: float, batch: int = 200):
+        """Rimuove al massimo 'batch' voci più vecchie di ttl secondi (purge incrementale)."""
+        await self.open()
+        limit = time.time() * 1000 - ttl * 1000
+        if not self._ordered:
+            self._index = dict(sorted(self._index.items(), key=lambda kv: kv[1][0]))
+            self._ordered = True
+        expired = []
+        for key, (ts, _value) in self._index.items():
+            if ts >= limit or len(expired) >= batch:
+                break
+            expired.append(key)
+        for key in expired:
+            del self._index[key]
+        if self.shared:
+            # Le voci degli altri worker non sono nell'indice locale: purge sulla tabella,
+            # al massimo una volta ogni SHARED_PURGE_INTERVAL per non contendersi il lock di scrittura
+            now = time.monotonic()
+            if now < self._next_shared_purge:
+                return len(expired)
+            self._next_shared_purge = now + self.SHARED_PURGE_INTERVAL
+            try:
+                return await self._run(self._purge_older, limit, batch)
+            except Exception as e:
+                logger.error(f"Errore purge cache {self.table}: {e}")
+                return 0
+        if not expired:
+            return 0
+        try:
+            await self._run(self._delete, expired)
+        except Exception as e:
+            logger.error(f"Errore purge cache {self.table}: {e}")
+        return len(expired)
+
+    async def close(self):
+        if self._conn is not None:
+            await self._run(self._conn.close)
+            self._conn = None
+        self._opened = False
+
+    def __len__(self):
+        return len(self._index)
+
+
+async def close_all():
+    for store in _stores:
+        try:
+            await store.close()
+        except Exception as e:
+            logger.warning(f"Errore chiusura cache {store.table}: {e}")
@@ -0,0 +1,170 @@
+import itertools
+import json
+import logging
+import os
+import random
+import time
+from contextvars import ContextVar
+from app import settings
+
+# Span leggeri per capire dove va il tempo di una richiesta /stream.
+#   with span("tmdb"): ...
+# Senza una traccia attiva (tracing spento, task di background) span() costa una lettura
+# di ContextVar e ritorna un context manager vuoto condiviso.
+# Con SERVER_TIMING le durate finiscono nell'header Server-Timing della risposta;
+# con TRACE_LOG_FILE una parte delle richieste (campione + quelle lente) va in un file JSON lines.
+
+logger = logging.getLogger("ITA-Addon")
+
+_current = ContextVar("trace", default=None)
+_ids = itertools.count(1)
+
+
+class Trace:
+    def __init__(self):
+        self.id = f"{os.getpid():x}-{next(_ids):x}"
+        self.started = time.perf_counter()
+        self.spans = []  # (nome, inizio relativo, durata, attributi)
+
+    def add(self, name: str, start: float, duration: float, attrs: dict):
+        self.spans.append((name, start - self.started, duration, attrs))
+
+    def server_timing(self, total: float) -> str:
+        """Durate sommate per nome (in ms), nell'ordine in cui gli span sono iniziati."""
+        totals = {}
+        for name, _start, duration, _attrs in sorted(self.spans, key=lambda s: s[1]):
+            elapsed, count = totals.get(name, (0.0, 0))
+            totals[name] = (elapsed + duration, count + 1)
+        parts = [
+            f'{name};dur={elapsed * 1000:.1f}' + (f';desc="x{count}"' if count > 1 else "")
+            for name, (elapsed, count) in totals.items()
+        ]
+        parts.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(parts)
+
+    def to_dict(self) -> list:
+        return [
+            {"name": name, "start_ms": round(start * 1000, 2), "dur_ms": round(duration * 1000, 2), **attrs}
+            for name, start, duration, attrs in sorted(self.spans, key=lambda s: s[1])
+        ]
+
+
+class _Span:
+    __slots__ = ("trace", "name", "attrs", "start")
+
+    def __init__(self, trace: Trace, name: str, attrs: dict):
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        attrs = self.attrs
+        if exc_type is not None:
+            attrs = {**attrs, "error": exc_type.__name__}
+        self.trace.add(self.name, self.start, time.perf_counter() - self.start, attrs)
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name: str, **attrs):
+    trace = _current.get()
+    if trace is None:
+        return _NO_SPAN
+    return _Span(trace, name, attrs)
+
+
+def _trace_logger():
+    """Logger dedicato al file JSON lines (non propaga ai log normali)."""
+    if not settings.TRACE_LOG_FILE:
+        return None
+    trace_logger = logging.getLogger("ITA-Addon.trace")
+    trace_logger.propagate = False
+    trace_logger.setLevel(logging.INFO)
+    if not trace_logger.handlers:
+        try:
+            os.makedirs(os.path.dirname(settings.TRACE_LOG_FILE) or ".", exist_ok=True)
+            handler = logging.FileHandler(settings.TRACE_LOG_FILE)
+        except OSError as e:
+            logger.warning(f"Trace log non disponibile ({settings.TRACE_LOG_FILE}): {e}")
+            return None
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        trace_logger.addHandler(handler)
+    return trace_logger
+
+
+class TracingMiddleware:
+    """
+    Middleware ASGI: apre una traccia per richiesta, aggiunge Server-Timing (SERVER_TIMING)
+    e scrive nel trace log le richieste campionate (TRACE_SAMPLE_RATE) o lente (TRACE_SLOW_MS).
+    Va registrato solo se almeno una delle due funzioni è attiva (vedi enabled()).
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.header = settings.SERVER_TIMING
+        self.log = _trace_logger()
+
+    @staticmethod
+    def enabled() -> bool:
+        return settings.SERVER_TIMING or bool(settings.TRACE_LOG_FILE)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        trace = Trace()
+        token = _current.set(trace)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.header:
+                    total = time.perf_counter() - trace.started
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", trace.server_timing(total).encode("latin-1")))
+                    # Visibile anche dai devtools di Stremio Web (origine diversa)
+                    headers.append((b"timing-allow-origin", b"*"))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            if self.log is not None:
+                self._write(scope, trace, status, time.perf_counter() - trace.started)
+
+    def _write(self, scope, trace: Trace, status: int, total: float):
+        slow = settings.TRACE_SLOW_MS > 0 and total * 1000 >= settings.TRACE_SLOW_MS
+        if not slow and random.random() >= settings.TRACE_SAMPLE_RATE:
+            return
+        route = scope.get("route")
+        # Mai la config nel log: contiene TMDB Key e password MFP
+        params = {k: v for k, v in (scope.get("path_params") or {}).items() if k != "config"}
+        self.log.info(json.dumps({
+            "ts": round(time.time(), 3),
+            "trace": trace.id,
+            "route": getattr(route, "path", "unmatched"),
+            "params": params,
+            "status": status,
+            "dur_ms": round(total * 1000, 2),
+            "slow": slow,
+            "spans": trace.to_dict(),
+        }))
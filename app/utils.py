@@ -1,13 +1,23 @@
 import base64
+import functools
 import json
 import logging
 import re
+import time
+import urllib.parse
 from curl_cffi.requests import AsyncSession
+from app import settings
+from app.cache import TTLCache, SingleFlight, MISSING
+from app.shared import shared_cache
+from app.tracing import span
 
 # Logger
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Cache IMDB -> TMDB condivisa fra tutti gli utenti (la chiave NON include la api_key)
+_tmdb_cache = TTLCache(maxsize=settings.TMDB_CACHE_SIZE, ttl=settings.TMDB_CACHE_TTL, name="tmdb")
+_tmdb_flight = SingleFlight()
+
 def decode_config(config_str: str) -> dict:
     """Decodifica la configurazione base64 dall'URL"""
     try:
@@ -28,10 +38,30 @@ async def get_tmdb_info(imdb_id: str, type: str, tmdb_key: str, client: AsyncSes
         return None
 
     clean_id = imdb_id.split(":")[0] # Rimuove season/episode se presenti
+    cache_key = (clean_id, type)
+
+    cached = _tmdb_cache.get(cache_key)
+    if cached is not MISSING:
+        return cached
+
+    # Richieste concorrenti per lo stesso ID (e la stessa chiave) fanno una sola chiamata a TMDB:
+    # chi ha una chiave valida non deve ricevere il None di una chiamata fatta con una chiave errata
+    with span("tmdb"):
+        return await _tmdb_flight.do(
+            (clean_id, type, tmdb_key), lambda: _fetch_tmdb_info(clean_id, type, tmdb_key, client)
+        )
+
+async def _fetch_tmdb_info(clean_id: str, type: str, tmdb_key: str, client: AsyncSession):
+    # Con più worker un altro processo potrebbe aver già fatto la conversione
+    shared = await shared_cache.get("tmdb", (clean_id, type))
+    if shared is not None:
+        result, ttl = shared
+        _tmdb_cache.set((clean_id, type), result, ttl=ttl)
+        return result
 
     try:
         # 1. Trova ID TMDB da IMDB ID
-        url = f"https://api.themoviedb.org/3/find/{clean_id}"
+        url = f"{settings.TMDB_API_URL}/find/{clean_id}"
         params = {"api_key": tmdb_key, "external_source": "imdb_id"}
         
         resp = await client.get(url, params=params)
@@ -52,6 +82,13 @@ async def get_tmdb_info(imdb_id: str, type: str, tmdb_key: str, client: AsyncSes
                 "title": res["name"], # Le serie usano 'name'
                 "year": res.get("first_air_date", "")[:4]
             }
+
+        # Salviamo solo risposte valide: un 401 (chiave errata) non deve
+        # avvelenare la cache degli altri utenti. I "non trovato" durano meno.
+        if resp.status_code == 200:
+            ttl = settings.TMDB_CACHE_TTL if result else settings.TMDB_NEGATIVE_TTL
+            _tmdb_cache.set((clean_id, type), result, ttl=ttl)
+            await shared_cache.set("tmdb", (clean_id, type), result, ttl=ttl)
             
         return result
             
@@ -60,34 +97,126 @@ async def get_tmdb_info(imdb_id: str, type: str, tmdb_key: str, client: AsyncSes
     
     return None
 
+async def get_tmdb_seasons(tmdb_id: str, tmdb_key: str, client: AsyncSession):
+    """
+    Numero di episodi per stagione di una serie.
+    Return: {1: 7, 2: 13, ...} (stagioni speciali escluse) oppure None.
+    """
+    if not tmdb_key:
+        return None
+
+    cache_key = ("seasons", tmdb_id)
+    cached = _tmdb_cache.get(cache_key)
+    if cached is not MISSING:
+        return cached
+
+    async def _fetch():
+        shared = await shared_cache.get("tmdb", cache_key)
+        if shared is not None:
+            # JSON trasforma le chiavi intere in stringhe
+            seasons = {int(k): v for k, v in shared[0].items()}
+            _tmdb_cache.set(cache_key, seasons, ttl=shared[1])
+            return seasons
+        try:
+            url = f"{settings.TMDB_API_URL}/tv/{tmdb_id}"
+            resp = await client.get(url, params={"api_key": tmdb_key})
+            if resp.status_code != 200:
+                return None
+            seasons = {
+                int(s["season_number"]): int(s.get("episode_count") or 0)
+                for s in resp.json().get("seasons", [])
+                if s.get("season_number")
+            }
+            # Le stagioni cambiano quando escono nuovi episodi: TTL più breve della mappatura ID
+            _tmdb_cache.set(cache_key, seasons, ttl=settings.TMDB_SEASONS_TTL)
+            await shared_cache.set("tmdb", cache_key, seasons, ttl=settings.TMDB_SEASONS_TTL)
+            return seasons
+        except Exception as e:
+            logger.error(f"Errore TMDB stagioni: {e}")
+            return None
+
+    # Come per /find: una sola chiamata per serie e chiave, la cache resta condivisa (solo risposte 200)
+    return await _tmdb_flight.do(("seasons", tmdb_id, tmdb_key), _fetch)
+
+def link_expiry(url: str):
+    """
+    Scadenza (epoch, secondi) dichiarata nel link tramite il parametro 'expires'
+    (es. i link VixCloud) o 'e' (es. i link MixDrop). None se il link non la dichiara.
+    """
+    try:
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(url).query)
+        for name in ("expires", "e"):
+            values = query.get(name)
+            if not values:
+                continue
+            expires = int(values[0])
+            # Alcuni host usano i millisecondi
+            if expires > 10_000_000_000:
+                expires = expires / 1000
+            # Scartiamo valori che non sembrano un epoch (es. 'e' usato per altro)
+            if expires > 1_000_000_000:
+                return expires
+    except (ValueError, TypeError):
+        pass
+    return None
+
+def links_ttl(urls, default: float, margin: float = 60) -> float:
+    """TTL utilizzabile per un insieme di link: il minimo tra default e la scadenza più vicina."""
+    ttl = default
+    now = time.time()
+    for url in urls:
+        expires = link_expiry(url)
+        if expires is not None:
+            ttl = min(ttl, expires - now - margin)
+    return max(ttl, 0)
+
+# Regex del packer compilate una sola volta.
+# Le stringhe tra apici possono contenere \' e \\ (escape del letterale JS): forma "srotolata"
+# [^'\\]*(?:\\.[^'\\]*)* così il motore non prova un'alternativa per ogni carattere.
+# \w e \b come in JS: solo ASCII ("città" sono le parole "citt" + "à").
+_PACKED_PAYLOAD_RE = re.compile(
+    r"return p}\('([^'\\]*(?:\\.[^'\\]*)*)',(\d+),(\d+),'([^'\\]*(?:\\.[^'\\]*)*)'\.split\('\|'\)", re.S
+)
+_PACKED_WORD_RE = re.compile(r"\b\w+\b", re.ASCII)
+_JS_ESCAPE_RE = re.compile(r"\\([\\'])")
+_PACKER_NUMERALS = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+@functools.lru_cache(maxsize=64)
+def _packer_keys(base: int, count: int) -> tuple:
+    """Simboli del packer (baseN iterativo) per gli indici 0..count-1, memorizzati per (base, count)."""
+    keys = []
+    for num in range(count):
+        if num == 0:
+            keys.append(_PACKER_NUMERALS[0])
+            continue
+        digits = []
+        while num:
+            num, rem = divmod(num, base)
+            digits.append(_PACKER_NUMERALS[rem])
+        keys.append("".join(reversed(digits)))
+    return tuple(keys)
+
 def unpack_js(packed_js):
     """
     Decodifica Javascript 'packed' (Dean Edwards Packer) usato da Supervideo/Mixdrop.
+    Un solo passaggio sul payload: ogni parola viene sostituita tramite una tabella
+    simbolo -> valore (come fa il ramo veloce del decoder JS nei browser).
     """
     try:
-        def baseN(num, b, numerals="0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"):
-            return ((num == 0) and numerals[0]) or (baseN(num // b, b, numerals).lstrip(numerals[0]) + numerals[num % b])
-
-        payload = re.search(r"return p}\('(.*?)',(\d+),(\d+),'(.*?)'\.split\('\|'\)", packed_js)
+        payload = _PACKED_PAYLOAD_RE.search(packed_js)
         if not payload:
             return None
             
         p, a, c, k = payload.groups()
+        # Come nel browser: prima si valuta il letterale (escape), poi si sostituiscono le parole
+        p = _JS_ESCAPE_RE.sub(r"\1", p)
         a = int(a)
         c = int(c)
         k = k.split('|')
         
-        decoded = p
-        for i in range(c - 1, -1, -1):
-            key = baseN(i, a)
-            val = k[i] if k[i] else key
-            # Simple replacement logic
-            pattern = r'\b' + re.escape(key) + r'\b'
-            try:
-                decoded = re.sub(pattern, val, decoded)
-            except:
-                pass
-        return decoded
+        keys = _packer_keys(a, c)
+        table = {key: (k[i] or key) for i, key in enumerate(keys)}
+        return _PACKED_WORD_RE.sub(lambda m: table.get(m.group(0), m.group(0)), p)
     except Exception as e:
         logger.error(f"Error unpacking JS: {e}")
         return None
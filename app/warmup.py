@@ -0,0 +1,213 @@
+"""
+Riscaldamento delle cache fuori dal percorso delle richieste (es. prima della serata o di un'uscita).
+
+Legge un file di ID IMDb, uno per riga (righe vuote e '#' ignorate):
+  tt0903747            -> film
+  tt0903747:1:2        -> serie, stagione 1 episodio 2 (anche "tt0903747 1 2")
+e per ognuno esegue get_tmdb_info e i provider utilizzabili, come una richiesta /stream vera.
+Restano così popolate la cache condivisa (mappature TMDB, link risolti) e gli embed GuardaHD.
+
+Serve la stessa cache condivisa del server (SHARED_CACHE_URL, SQLite o Redis): è l'unica che un
+server già avviato rilegge a ogni miss. Senza, il comando si rifiuta di partire: gli embed salvati
+nel file SQLite verrebbero letti dal server solo al prossimo riavvio e la cache delle risposte
+(in memoria nel server) non si può riempire da fuori. --force lo fa partire comunque
+(es. per preparare i file prima del primo avvio).
+
+Il progresso viene scritto riga per riga in un file JSONL: rilanciando lo stesso comando
+dopo un'interruzione si riparte dai titoli mancanti.
+
+Uso:
+  python -m app.warmup titoli.txt --tmdb-key KEY [--mfp-url URL --mfp-pass PASS]
+  python -m app.warmup titoli.txt --config <config base64 dell'URL di installazione>
+  python -m app.warmup titoli.txt ... --concurrency 4 --rate 2 --retry-failed
+  SHARED_CACHE_URL=sqlite:///app/config/shared_cache.db python -m app.warmup titoli.txt ...
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from collections import Counter
+from app import settings
+from app.extractors import REGISTRY, providers_for
+from app.http import http_pool, HostRateLimiter, RateLimitedClient
+from app.shared import shared_cache
+from app.store import close_all as close_stores
+from app.utils import decode_config, get_tmdb_info
+from app.workers import cpu_pool
+
+logger = logging.getLogger("ITA-Addon")
+
+_LINE_RE = re.compile(r"^(tt\d+)(?:[:\s,]+(\d+)[:\s,]+(\d+))?$")
+
+
+def parse_titles(path: str):
+    """Ritorna (lista di (type, id), righe non valide)."""
+    titles, invalid = [], []
+    seen = set()
+    with open(path, "r") as f:
+        for number, line in enumerate(f, 1):
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            match = _LINE_RE.match(line)
+            if not match:
+                invalid.append(number)
+                continue
+            imdb_id, season, episode = match.groups()
+            if season:
+                item = ("series", f"{imdb_id}:{int(season)}:{int(episode)}")
+            else:
+                item = ("movie", imdb_id)
+            if item not in seen:
+                seen.add(item)
+                titles.append(item)
+    return titles, invalid
+
+
+def load_progress(path: str) -> dict:
+    """(type, id) -> ultimo esito registrato."""
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+                done[(entry["type"], entry["id"])] = entry
+            except (ValueError, KeyError):
+                continue  # Riga troncata da un'interruzione
+    return done
+
+
+async def warm_title(type: str, id: str, user_config: dict, client) -> dict:
+    """Un titolo: mappatura TMDB + tutti i provider. Ritorna l'esito da salvare nel progresso."""
+    entry = {"type": type, "id": id, "streams": 0, "providers": {}, "error": None}
+    info = await get_tmdb_info(id, type, user_config.get("tmdb_key"), client)
+    if not info:
+        entry["error"] = "tmdb_not_found"
+        return entry
+
+    async def run(spec):
+        provider = spec.provider
+        name = provider.get_name()
+        timeout = settings.PROVIDER_TIMEOUTS.get(name, settings.PROVIDER_TIMEOUT)
+        try:
+            streams = await asyncio.wait_for(
+                provider.get_stream(id, type, user_config, client), timeout=timeout if timeout > 0 else None
+            )
+            entry["providers"][name] = len(streams or [])
+        except asyncio.TimeoutError:
+            entry["providers"][name] = "timeout"
+        except Exception as e:
+            entry["providers"][name] = f"error: {e}"
+
+    await asyncio.gather(*(run(spec) for spec in providers_for(type, user_config)))
+    entry["streams"] = sum(v for v in entry["providers"].values() if isinstance(v, int))
+    if not entry["streams"]:
+        failures = [v for v in entry["providers"].values() if not isinstance(v, int)]
+        entry["error"] = failures[0] if failures else "no_streams"
+    return entry
+
+
+def print_summary(results: list, skipped: int, invalid: list, elapsed: float):
+    total = len(results)
+    with_streams = sum(1 for r in results if r["streams"])
+    errors = Counter(r["error"].split(":")[0] for r in results if r["error"])
+    print()
+    print(f"Titoli elaborati: {total} in {elapsed:.1f} s (già fatti e saltati: {skipped}, righe non valide: {len(invalid)})")
+    if total:
+        print(f"Con stream:       {with_streams} ({with_streams * 100 / total:.0f}%)")
+        print(f"Senza stream:     {total - with_streams}")
+    for spec in REGISTRY:
+        name = spec.name
+        outcomes = [r["providers"][name] for r in results if name in r["providers"]]
+        if outcomes:
+            found = sum(1 for v in outcomes if isinstance(v, int) and v > 0)
+            failed = sum(1 for v in outcomes if not isinstance(v, int))
+            print(f"  {name:<12}    {found}/{len(outcomes)} con stream, {failed} errori/timeout")
+    if errors:
+        print("Motivi principali: " + ", ".join(f"{reason} x{count}" for reason, count in errors.most_common(5)))
+    if invalid:
+        print(f"Righe non valide: {', '.join(map(str, invalid[:20]))}{' ...' if len(invalid) > 20 else ''}")
+
+
+async def run(args):
+    if args.config:
+        user_config = decode_config(args.config)
+    else:
+        user_config = {"tmdb_key": args.tmdb_key, "mfp_url": args.mfp_url, "mfp_pass": args.mfp_pass}
+    user_config = {k: v for k, v in user_config.items() if v}
+    if not user_config.get("tmdb_key"):
+        raise SystemExit("Serve una TMDB Key (--tmdb-key, --config o variabile TMDB_KEY)")
+    if not shared_cache.cross_process:
+        if not args.force:
+            raise SystemExit(
+                "Serve la cache condivisa del server: imposta la stessa SHARED_CACHE_URL (sqlite:// o redis://). "
+                "Senza, un server già avviato non vede il riscaldamento fino al riavvio (--force per procedere)."
+            )
+        print("Nota: nessuna cache condivisa, verranno salvati solo gli embed GuardaHD "
+              "(letti dal server al prossimo avvio).")
+
+    titles, invalid = parse_titles(args.titles)
+    progress_path = args.progress or f"{args.titles}.progress.jsonl"
+    done = load_progress(progress_path)
+    todo = [
+        item for item in titles
+        if item not in done or (args.retry_failed and not done[item].get("streams"))
+    ]
+    skipped = len(titles) - len(todo)
+
+    client = RateLimitedClient(http_pool, HostRateLimiter(args.rate))
+    await http_pool.start()
+    results = []
+    queue = list(reversed(todo))
+    started = time.monotonic()
+
+    async def worker(progress):
+        while queue:
+            type, id = queue.pop()
+            entry = await warm_title(type, id, user_config, client)
+            results.append(entry)
+            progress.write(json.dumps(entry) + "\n")
+            progress.flush()
+            status = f"{entry['streams']} stream" if entry["streams"] else entry["error"]
+            print(f"[{len(results) + skipped}/{len(titles)}] {type} {id}: {status}")
+
+    try:
+        with open(progress_path, "a") as progress:
+            await asyncio.gather(*(worker(progress) for _ in range(max(1, args.concurrency))))
+    finally:
+        print_summary(results, skipped, invalid, time.monotonic() - started)
+        await http_pool.close()
+        await close_stores()
+        await shared_cache.close()
+        cpu_pool.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("titles", help="file con un ID IMDb per riga")
+    parser.add_argument("--config", help="configurazione codificata (come nell'URL di installazione)")
+    parser.add_argument("--tmdb-key", default=os.environ.get("TMDB_KEY"))
+    parser.add_argument("--mfp-url", default=os.environ.get("MFP_URL"))
+    parser.add_argument("--mfp-pass", default=os.environ.get("MFP_PASS"))
+    parser.add_argument("--concurrency", type=int, default=4, help="titoli elaborati in parallelo")
+    parser.add_argument("--rate", type=float, default=2, help="richieste/secondo per host (0 = nessun limite)")
+    parser.add_argument("--progress", help="file JSONL di avanzamento (default: <titoli>.progress.jsonl)")
+    parser.add_argument("--retry-failed", action="store_true", help="ritenta anche i titoli già fatti senza stream")
+    parser.add_argument("--verbose", action="store_true", help="mostra i log dei provider")
+    parser.add_argument("--force", action="store_true", help="procede anche senza cache condivisa con il server")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        print("Interrotto: rilancia lo stesso comando per riprendere.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from app import settings
+
+logger = logging.getLogger("ITA-Addon")
+
+
+class CpuPool:
+    """
+    Executor limitato per il lavoro CPU-bound (parsing HTML, unpack_js),
+    così una pagina grande non blocca l'event loop e le altre richieste.
+    - PARSER_EXECUTOR=thread|process, dimensione PARSER_WORKERS.
+    - Al massimo PARSER_QUEUE_LIMIT job in coda/in esecuzione: oltre si attende.
+    Con 'process' le funzioni devono essere a livello di modulo e ritornare dati semplici.
+    """
+
+    def __init__(self, kind: str, workers: int, queue_limit: int):
+        self.kind = kind if kind in ("thread", "process") else "thread"
+        self.workers = max(1, workers)
+        self.queue_limit = max(self.workers, queue_limit)
+        self._executor = None
+        self._slots = None
+        # Metriche
+        self.pending = 0       # Job accettati e non ancora terminati
+        self.dispatched = 0    # Job consegnati all'executor (in esecuzione o nella sua coda)
+        self.max_pending = 0
+        self.completed = 0
+
+    def _ensure(self):
+        if self._executor is None:
+            if self.kind == "process":
+                # multiprocessing costa ~50ms di import: solo se serve davvero
+                from concurrent.futures import ProcessPoolExecutor
+
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="cpu")
+            self._slots = asyncio.Semaphore(self.queue_limit)
+        return self._executor
+
+    async def run(self, fn, *args):
+        executor = self._ensure()
+        self.pending += 1
+        self.max_pending = max(self.max_pending, self.pending)
+        try:
+            async with self._slots:
+                self.dispatched += 1
+                try:
+                    return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+                finally:
+                    self.dispatched -= 1
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "queue_limit": self.queue_limit,
+            "pending": self.pending,
+            "running": min(self.dispatched, self.workers),
+            "queue_depth": self.pending - min(self.dispatched, self.workers),
+            "max_pending": self.max_pending,
+            "completed": self.completed,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+cpu_pool = CpuPool(settings.PARSER_EXECUTOR, settings.PARSER_WORKERS, settings.PARSER_QUEUE_LIMIT)
+
+
+async def run_cpu(fn, *args):
+    """Esegue fn(*args) nel pool CPU condiviso."""
+    return await cpu_pool.run(fn, *args)
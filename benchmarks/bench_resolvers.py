@@ -0,0 +1,176 @@
+"""
+Regressione + throughput dei resolver (app/resolvers.py) sul corpus di pagine salvate
+in tests/fixtures/resolvers (casi descritti in cases.json).
+
+1. Regressione: per ogni caso controlla il resolver scelto per l'URL e il link estratto
+   (o il motivo del fallimento), passando da Resolver.resolve() con un client finto.
+2. Throughput: dispatch per host (registro vs vecchia catena di if) ed estrazione per pagina.
+
+Uso:  python benchmarks/bench_resolvers.py [--repeat N] [--number N]
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.resolvers import ResolveError, resolver_for, _BY_HOST  # noqa: E402
+from app.workers import cpu_pool  # noqa: E402
+
+CORPUS = os.path.join(ROOT, "tests", "fixtures", "resolvers")  # Stesso corpus dei test
+
+
+class FixtureResponse:
+    def __init__(self, status_code: int, text: str = ""):
+        self.status_code = status_code
+        self.text = text
+
+
+class FixtureClient:
+    """Client finto: URL -> pagina del corpus, 404 per tutto il resto."""
+
+    def __init__(self, pages: dict):
+        self.pages = pages
+
+    async def get(self, url: str, **kwargs):
+        if url in self.pages:
+            return FixtureResponse(200, self.pages[url])
+        return FixtureResponse(404)
+
+
+def load_cases():
+    with open(os.path.join(CORPUS, "cases.json")) as f:
+        cases = json.load(f)
+    for case in cases:
+        if case.get("file"):
+            with open(os.path.join(CORPUS, case["file"])) as f:
+                case["html"] = f.read()
+    return cases
+
+
+async def check_cases(cases) -> int:
+    client = FixtureClient({c["url"]: c["html"] for c in cases if "html" in c})
+    failures = 0
+    for case in cases:
+        resolver = resolver_for(case["url"])
+        name = resolver.name if resolver else None
+        problem = None
+        if name != case["resolver"]:
+            problem = f"resolver {name}, atteso {case['resolver']}"
+        elif resolver is not None and "html" in case:
+            try:
+                result, reason = await resolver.resolve(case["url"], client), None
+            except ResolveError as e:
+                result, reason = None, e.reason
+            if "expect" in case and result != case["expect"]:
+                problem = f"link {result!r} ({reason}), atteso {case['expect']!r}"
+            elif "reason" in case and reason != case["reason"]:
+                problem = f"motivo {reason!r}, atteso {case['reason']!r}"
+        label = case.get("file") or case["url"]
+        print(f"  {'ok  ' if problem is None else 'FAIL'} {label}{'' if problem is None else ': ' + problem}")
+        failures += problem is not None
+    # Un file rimosso (404) deve dare not_found, non un errore generico
+    try:
+        await resolver_for("https://mixdrop.ag/e/missing").resolve("https://mixdrop.ag/e/missing", client)
+        print("  FAIL 404: nessun errore")
+        failures += 1
+    except ResolveError as e:
+        ok = e.reason == "not_found"
+        print(f"  {'ok  ' if ok else 'FAIL'} 404 -> {e.reason}")
+        failures += not ok
+    return failures
+
+
+def legacy_dispatch(link: str):
+    """Vecchia scelta dell'host in GuardaHDProvider (maxstream mai raggiunto)."""
+    if 'mixdrop' in link:
+        return "MixDrop"
+    elif 'supervideo' in link:
+        return "SuperVideo"
+    return None
+
+
+def legacy_extract(name: str, html: str):
+    """Vecchia estrazione per host (regex passate a re.search a ogni chiamata, solo coda ".split('|')))")."""
+    from app.utils import unpack_js
+    packed = re.search(r"(eval\(function\(p,a,c,k,e,d\).*?\.split\('\|'\)\)\))", html)
+    unpacked = unpack_js(packed.group(1)) if packed else None
+    if name == "MixDrop":
+        match = re.search(r'wurl="([^"]+)"', unpacked or "")
+        if match:
+            return "https:" + match.group(1) if match.group(1).startswith("//") else match.group(1)
+    elif name == "SuperVideo":
+        html = unpacked or html
+        match = re.search(r'file:\s*"([^"]+)"', html) or re.search(r"src:\s*'([^']+)'", html)
+        if match:
+            return match.group(1)
+    elif name == "MaxStream":
+        match = re.search(r'sources\W+src\W+(.*)",', html)
+        if match:
+            return match.group(1).replace('"', '').strip()
+    return None
+
+
+def best_of(fn, repeat: int, number: int) -> float:
+    """Secondi per chiamata (migliore di 'repeat' giri da 'number' chiamate)."""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - t0) / number)
+    return best
+
+
+def bench(cases, repeat: int, number: int):
+    urls = [c["url"] for c in cases] * 10
+    registry = best_of(lambda: [resolver_for(u) for u in urls], repeat, number) / len(urls)
+    legacy = best_of(lambda: [legacy_dispatch(u) for u in urls], repeat, number) / len(urls)
+    print(f"  dispatch                      registro {registry * 1e9:7.0f} ns/url   catena if {legacy * 1e9:7.0f} ns/url")
+    # Il costo non cresce con i mirror registrati: sono voci di un dict
+    extra = {f"mirror{n}.example": resolver_for(urls[0]) for n in range(500)}
+    _BY_HOST.update(extra)
+    try:
+        crowded = best_of(lambda: [resolver_for(u) for u in urls], repeat, number) / len(urls)
+    finally:
+        for host in extra:
+            _BY_HOST.pop(host, None)
+    print(f"  dispatch con 500 alias extra  registro {crowded * 1e9:7.0f} ns/url")
+
+    for case in cases:
+        if "html" not in case or "expect" not in case:
+            continue
+        resolver = resolver_for(case["url"])
+        per_call = best_of(lambda: resolver.extract(case["html"]), repeat, number)
+        old = legacy_extract(resolver.name, case["html"])
+        old_time = best_of(lambda: legacy_extract(resolver.name, case["html"]), repeat, number)
+        old_label = f"{old_time * 1e6:7.1f} us" if old == case["expect"] else "non estrae"
+        print(f"  {case['file']:<28}  {per_call * 1e6:7.1f} us ({1 / per_call:8.0f}/s)   vecchio: {old_label}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+
+    cases = load_cases()
+    print("Regressione:")
+    try:
+        failures = asyncio.run(check_cases(cases))
+    finally:
+        cpu_pool.shutdown()
+    print(f"Throughput (migliore di {args.repeat} x {args.number}):")
+    bench(cases, args.repeat, args.number)
+    if failures:
+        print(f"{failures} casi falliti")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Avvio a freddo + costo del logging per richiesta.
+
+1. Avvio: lancia uvicorn (processo nuovo, cache del filesystem calde) e misura il tempo fino
+   alla prima risposta 200 di /manifest.json, poi la prima (1,5 s dopo) e la seconda
+   GET / (pagina di configurazione). Riporta anche il tempo di import di app.main e quello dei
+   moduli che non vengono più importati all'avvio (jinja2, pool a processi).
+2. Logging: costo per riga vista dalla richiesta con un sink lento (write che attende
+   --sink-delay-us, come uno stdout rediretto su una pipe lenta):
+   StreamHandler sincrono, QueueHandler + thread, campionamento e livello disattivato.
+
+Uso:  python benchmarks/bench_startup.py [--runs N] [--lines N] [--sink-delay-us N]
+"""
+import argparse
+import io
+import logging
+import os
+import queue
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from logging.handlers import QueueHandler, QueueListener
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def import_time(module: str) -> float:
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return float(out.stdout.strip())
+
+
+def get(url: str) -> float:
+    t0 = time.perf_counter()
+    with urllib.request.urlopen(url, timeout=5) as response:
+        response.read()
+    return time.perf_counter() - t0
+
+
+def cold_start(env: dict) -> dict:
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while True:
+            try:
+                get(f"{base}/manifest.json")
+                break
+            except OSError:
+                if server.poll() is not None or time.perf_counter() - started > 30:
+                    raise RuntimeError("uvicorn non è partito")
+                time.sleep(0.005)
+        first_request = time.perf_counter() - started
+        # La pagina di configurazione viene preparata in background subito dopo l'avvio (PRELOAD)
+        time.sleep(1.5)
+        return {"first": first_request, "page": get(f"{base}/"), "page_again": get(f"{base}/")}
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def bench_startup(runs: int):
+    env = {**os.environ, "SHARED_CACHE_URL": "", "LIVENESS_BUDGET": "0", "PYTHONDONTWRITEBYTECODE": "1"}
+    print("Import (processo nuovo):")
+    print(f"  app.main                    {import_time('app.main') * 1000:7.1f} ms")
+    for module in ("jinja2", "concurrent.futures.process"):
+        print(f"  {module:<26}  {import_time(module) * 1000:7.1f} ms  (ora fuori dall'avvio)")
+
+    results = [cold_start(env) for _ in range(runs)]
+    print(f"Avvio uvicorn -> prima risposta (mediana di {runs}):")
+    for key, label in (("first", "prima /manifest.json"), ("page", "prima GET / (+1.5s)"), ("page_again", "seconda GET /")):
+        values = [r[key] * 1000 for r in results]
+        print(f"  {label:<22}{statistics.median(values):8.1f} ms   (min {min(values):.1f})")
+
+
+class SlowSink(io.TextIOBase):
+    """Stream che impiega 'delay' secondi per ogni write."""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.lines = 0
+
+    def write(self, text):
+        time.sleep(self.delay)  # I/O bloccante: rilascia il GIL come una write vera
+        self.lines += 1
+        return len(text)
+
+
+def bench_logging(lines: int, delay: float):
+    from app import logs
+
+    formatter = logging.Formatter(logs.FORMAT, datefmt=logs.DATEFMT)
+    sink = SlowSink(delay)
+    logger = logging.getLogger("bench.startup")
+    logger.propagate = False
+
+    def stream_handler():
+        handler = logging.StreamHandler(sink)
+        handler.setFormatter(formatter)
+        return handler
+
+    def run(label, handler, level=logging.INFO, rate=1.0):
+        logger.handlers[:] = [handler]
+        logger.setLevel(level)
+        request_log = logs.SampledLogger(logger)
+        logs.settings.LOG_REQUEST_SAMPLE = rate
+        t0 = time.perf_counter()
+        for n in range(lines):
+            logs.sample_request()
+            request_log.info("Richiesta Stream: [%s] ID: %s", "movie", f"tt{n:07d}")
+        elapsed = (time.perf_counter() - t0) / lines
+        print(f"  {label:<34}{elapsed * 1e6:8.2f} us/riga")
+
+    print(f"Logging per riga (sink con write da {delay * 1e6:.0f} us, {lines} righe):")
+    run("StreamHandler sincrono", stream_handler())
+    records = queue.SimpleQueue()
+    listener = QueueListener(records, stream_handler())
+    listener.start()
+    try:
+        run("QueueHandler + thread", QueueHandler(records))
+        run("QueueHandler, campione 10%", QueueHandler(records), rate=0.1)
+        run("livello WARNING (riga scartata)", QueueHandler(records), level=logging.WARNING)
+    finally:
+        listener.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--lines", type=int, default=5000)
+    parser.add_argument("--sink-delay-us", type=float, default=50)
+    args = parser.parse_args()
+
+    bench_startup(args.runs)
+    bench_logging(args.lines, args.sink_delay_us / 1e6)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Correttezza + microbenchmark di app.utils.unpack_js.
+
+Confronta il decoder a passaggio singolo con l'implementazione precedente
+(una re.sub per simbolo) sulle fixture dei test (tests/fixtures/unpack) e su payload
+sintetici di dimensione reale.
+
+Uso:  python benchmarks/bench_unpack.py [--repeat N]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.utils import unpack_js  # noqa: E402
+from packer import pack  # noqa: E402
+
+FIXTURES = os.path.join(ROOT, "tests", "fixtures", "unpack")  # Stesso corpus dei test
+
+
+def unpack_js_reference(packed_js):
+    """Implementazione precedente, tenuta qui come riferimento."""
+    try:
+        def baseN(num, b, numerals="0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"):
+            return ((num == 0) and numerals[0]) or (baseN(num // b, b, numerals).lstrip(numerals[0]) + numerals[num % b])
+
+        payload = re.search(r"return p}\('(.*?)',(\d+),(\d+),'(.*?)'\.split\('\|'\)", packed_js)
+        if not payload:
+            return None
+        p, a, c, k = payload.groups()
+        a = int(a)
+        c = int(c)
+        k = k.split('|')
+        decoded = p
+        for i in range(c - 1, -1, -1):
+            key = baseN(i, a)
+            val = k[i] if k[i] else key
+            pattern = r'\b' + re.escape(key) + r'\b'
+            try:
+                decoded = re.sub(pattern, val, decoded)
+            except Exception:
+                pass
+        return decoded
+    except Exception:
+        return None
+
+
+def synthetic_source(symbols: int, statements: int, seed: int = 1) -> str:
+    """Script simile a un player offuscato: molti identificatori distinti, molte ripetizioni."""
+    rnd = random.Random(seed)
+    alphabet = "abcdefghijklmnopqrstuvwxyz"
+    names = ["".join(rnd.choice(alphabet) for _ in range(rnd.randint(4, 10))) + str(i) for i in range(symbols)]
+    parts = []
+    for _ in range(statements):
+        a, b, c = rnd.choice(names), rnd.choice(names), rnd.choice(names)
+        parts.append(f'var {a}={b}.{c}("{rnd.choice(names)}",{rnd.randint(0, 999)});')
+    return "".join(parts)
+
+
+def check_fixtures():
+    names = sorted(f[:-len(".src.js")] for f in os.listdir(FIXTURES) if f.endswith(".src.js"))
+    for name in names:
+        with open(os.path.join(FIXTURES, f"{name}.src.js")) as f:
+            source = f.read().strip()
+        with open(os.path.join(FIXTURES, f"{name}.packed.js")) as f:
+            packed = f.read()
+        new, ref = unpack_js(packed), unpack_js_reference(packed)
+        assert new == source, f"{name}: output diverso dal sorgente originale"
+        # Le fixture hanno \' nel payload: il riferimento non toglie gli escape
+        note = "" if ref == source else "  (il riferimento sbaglia)"
+        print(f"  ok  {name} ({len(packed)} byte){note}")
+    return len(names)
+
+
+def bench(label, packed, repeat, same_output=True):
+    if same_output:
+        assert unpack_js(packed) == unpack_js_reference(packed), f"{label}: output diverso"
+    timings = {}
+    for impl_name, impl in (("reference", unpack_js_reference), ("single-pass", unpack_js)):
+        best = float("inf")
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            impl(packed)
+            best = min(best, time.perf_counter() - t0)
+        timings[impl_name] = best
+    speedup = timings["reference"] / timings["single-pass"]
+    print(
+        f"  {label:<28} reference {timings['reference'] * 1000:9.2f} ms   "
+        f"single-pass {timings['single-pass'] * 1000:7.2f} ms   x{speedup:.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print("Fixture:")
+    check_fixtures()
+
+    print(f"Benchmark (migliore di {args.repeat}):")
+    for name in ("mixdrop_player", "supervideo_player"):
+        with open(os.path.join(FIXTURES, f"{name}.packed.js")) as f:
+            bench(name, f.read(), args.repeat, same_output=False)
+    for symbols, statements in ((300, 400), (1500, 2500)):
+        packed = pack(synthetic_source(symbols, statements))
+        bench(f"synthetic {len(packed) // 1024}KB", packed, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Upstream finti per i benchmark offline: imitano TMDB, vixsrc, mostraguarda
+(dietro un proxy in stile MediaFlow) e gli embed MixDrop/SuperVideo con JS packed.
+
+Uso:  python benchmarks/fake_upstreams.py --port 9100 [--latency-ms 80] [--jitter-ms 40] [--failure-rate 0.02]
+
+Rotte (tutte su 127.0.0.1:PORT):
+  /tmdb/find/{imdb}                      -> movie_results / tv_results
+  /tmdb/tv/{tmdb_id}                     -> stagioni con episode_count
+  /vix/movie/{tmdb_id}/  /vix/tv/{id}/{s}/{e}/   -> pagina player con token/expires
+  /proxy/{url...}/movie/{imdb}           -> pagina mostraguarda con [data-link]
+  /mixdrop/e/{code}  /supervideo/e/{code} -> pagine embed con JS packed
+                                            (linkate come mixdrop.localhost / supervideo.localhost)
+  /playlist/...  /v/...  /hls/...        -> media finti (Range -> 206); --dead-rate ne fa sparire una parte
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import zlib
+
+from starlette.applications import Starlette
+from starlette.responses import HTMLResponse, JSONResponse, PlainTextResponse
+from starlette.routing import Route
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from packer import pack  # noqa: E402
+
+
+class FakeConfig:
+    latency_ms = 80.0
+    jitter_ms = 40.0
+    failure_rate = 0.0
+    dead_rate = 0.0
+    embeds = 4
+    page_kb = 60
+    base = "http://127.0.0.1:9100"
+
+
+CONFIG = FakeConfig()
+
+
+async def _upstream_delay():
+    """Latenza simulata + errori casuali. Ritorna una risposta d'errore o None."""
+    delay = max(CONFIG.latency_ms + random.uniform(-CONFIG.jitter_ms, CONFIG.jitter_ms), 0) / 1000
+    await asyncio.sleep(delay)
+    if random.random() < CONFIG.failure_rate:
+        return PlainTextResponse("upstream error", status_code=503)
+    return None
+
+
+def _filler(kb: int) -> str:
+    # Markup di contorno per dare alle pagine una dimensione realistica
+    block = '<div class="card"><a href="/movie/tt0000000">Titolo</a><img src="/i.jpg" alt=""></div>\n'
+    return block * max(1, kb * 1024 // len(block))
+
+
+def _tmdb_numeric(imdb_id: str) -> int:
+    digits = "".join(ch for ch in imdb_id if ch.isdigit())
+    return int(digits or 0) % 10_000_000
+
+
+async def tmdb_find(request):
+    error = await _upstream_delay()
+    if error:
+        return error
+    imdb_id = request.path_params["imdb"]
+    tmdb_id = _tmdb_numeric(imdb_id)
+    item = {"id": tmdb_id, "title": f"Film {imdb_id}", "name": f"Serie {imdb_id}",
+            "release_date": "2021-05-01", "first_air_date": "2019-09-01"}
+    return JSONResponse({"movie_results": [item], "tv_results": [item]})
+
+
+async def tmdb_tv(request):
+    error = await _upstream_delay()
+    if error:
+        return error
+    seasons = [{"season_number": n, "episode_count": 0 if n == 0 else 10} for n in range(0, 4)]
+    return JSONResponse({"id": int(request.path_params["tmdb_id"]), "seasons": seasons})
+
+
+def _vix_page(key: str) -> str:
+    expires = int(time.time()) + 6 * 3600
+    script = (
+        "window.video = {id: 1}; window.masterPlaylist = { params: { "
+        f"'token': 'tok{abs(hash(key)) % 10**8}', 'expires': '{expires}', }}, "
+        f"url: '{CONFIG.base}/playlist/{abs(hash(key)) % 10**6}?b=1', }}; "
+        'window.canPlayFHD = true; var info = {"quality":1080};'
+    )
+    return f"<html><head><title>vix</title></head><body><script>{script}</script>{_filler(CONFIG.page_kb)}</body></html>"
+
+
+async def vix_movie(request):
+    error = await _upstream_delay()
+    if error:
+        return error
+    return HTMLResponse(_vix_page(f"m{request.path_params['tmdb_id']}"))
+
+
+async def vix_tv(request):
+    error = await _upstream_delay()
+    if error:
+        return error
+    p = request.path_params
+    return HTMLResponse(_vix_page(f"t{p['tmdb_id']}-{p['season']}-{p['episode']}"))
+
+
+async def mostraguarda_movie(request):
+    error = await _upstream_delay()
+    if error:
+        return error
+    imdb_id = request.path_params["imdb"]
+    links = []
+    for i in range(CONFIG.embeds):
+        host = "mixdrop" if i % 2 == 0 else "supervideo"
+        # Hostname del mirror (*.localhost punta a 127.0.0.1): l'addon sceglie il resolver dall'host
+        embed_base = CONFIG.base.replace("127.0.0.1", f"{host}.localhost")
+        links.append(f'<li data-link="{embed_base}/{host}/e/{imdb_id}x{i}">Mirror {i}</li>')
+    body = f"<h1>Film {imdb_id} Streaming</h1><ul>{''.join(links)}</ul>{_filler(CONFIG.page_kb)}"
+    return HTMLResponse(f"<html><body>{body}</body></html>")
+
+
+def _short_tail(code: str) -> bool:
+    # Entrambe le code dello script packed che si trovano in giro, in modo deterministico per embed
+    return sum(map(ord, code)) % 2 == 0
+
+
+async def mixdrop_embed(request):
+    error = await _upstream_delay()
+    if error:
+        return error
+    code = request.path_params["code"]
+    source = (
+        f'MDCore.ref="{code}";MDCore.wurl="{CONFIG.base}/v/{code}.mp4?s=sig&e={int(time.time()) + 3 * 3600}";'
+        'MDCore.poster="//img/p.jpg";var player=videojs("videojs",{},function(){this.src(MDCore.wurl)});'
+    )
+    return HTMLResponse(f"<html><body><script>{pack(source, short_tail=_short_tail(code))}</script></body></html>")
+
+
+async def supervideo_embed(request):
+    error = await _upstream_delay()
+    if error:
+        return error
+    code = request.path_params["code"]
+    source = (
+        f'jwplayer("vplayer").setup({{sources:[{{file:"{CONFIG.base}/hls/{code}/master.m3u8"}}],'
+        'width:"100%",height:"100%",preload:"none"});'
+    )
+    return HTMLResponse(f"<html><body><script>{pack(source, short_tail=_short_tail(code))}</script></body></html>")
+
+
+async def media(request):
+    # Link diretti (playlist/mp4): morti in modo deterministico per --dead-rate
+    path = request.url.path
+    if CONFIG.dead_rate and (zlib.crc32(path.encode()) % 1000) < CONFIG.dead_rate * 1000:
+        return PlainTextResponse("not found", status_code=404)
+    body = "#EXTM3U\n" if path.endswith(".m3u8") or path.startswith("/playlist/") else "\0" * 1024
+    if request.headers.get("range"):
+        return PlainTextResponse(body[:1], status_code=206, headers={"Content-Range": f"bytes 0-0/{len(body)}"})
+    return PlainTextResponse(body)
+
+
+async def head_root(request):
+    return PlainTextResponse("ok")
+
+
+def build_app() -> Starlette:
+    return Starlette(routes=[
+        Route("/", head_root, methods=["GET", "HEAD"]),
+        Route("/tmdb/find/{imdb}", tmdb_find),
+        Route("/tmdb/tv/{tmdb_id}", tmdb_tv),
+        Route("/vix/movie/{tmdb_id}/", vix_movie),
+        Route("/vix/tv/{tmdb_id}/{season}/{episode}/", vix_tv),
+        Route("/proxy/{target:path}/movie/{imdb}", mostraguarda_movie),
+        Route("/mixdrop/e/{code}", mixdrop_embed),
+        Route("/supervideo/e/{code}", supervideo_embed),
+        Route("/playlist/{rest:path}", media, methods=["GET", "HEAD"]),
+        Route("/v/{rest:path}", media, methods=["GET", "HEAD"]),
+        Route("/hls/{rest:path}", media, methods=["GET", "HEAD"]),
+    ])
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=CONFIG.latency_ms)
+    parser.add_argument("--jitter-ms", type=float, default=CONFIG.jitter_ms)
+    parser.add_argument("--failure-rate", type=float, default=CONFIG.failure_rate)
+    parser.add_argument("--dead-rate", type=float, default=CONFIG.dead_rate, help="quota di link diretti morti (404)")
+    parser.add_argument("--embeds", type=int, default=CONFIG.embeds)
+    parser.add_argument("--page-kb", type=int, default=CONFIG.page_kb)
+    args = parser.parse_args()
+
+    CONFIG.latency_ms = args.latency_ms
+    CONFIG.jitter_ms = args.jitter_ms
+    CONFIG.failure_rate = args.failure_rate
+    CONFIG.dead_rate = args.dead_rate
+    CONFIG.embeds = args.embeds
+    CONFIG.page_kb = args.page_kb
+    CONFIG.base = f"http://127.0.0.1:{args.port}"
+    uvicorn.run(build_app(), host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+Load test offline di app.main:app contro upstream finti (benchmarks/fake_upstreams.py).
+
+Avvia gli upstream finti e l'addon (uvicorn) in due sottoprocessi, poi invia
+richieste /stream con la concorrenza indicata e riporta throughput,
+latenze p50/p95/p99, errori e memoria (RSS) del processo addon.
+
+Uso:
+  python benchmarks/loadtest.py --requests 2000 --concurrency 50
+  python benchmarks/loadtest.py --titles 0 --latency-ms 150 --failure-rate 0.05   # solo titoli unici (cache fredda)
+  python benchmarks/loadtest.py --workers 4                                       # multi-worker, cache condivisa SQLite
+  python benchmarks/loadtest.py --tenants 20 --env ADMISSION_MAX_ACTIVE=8          # più utenti (config diverse), admission control
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from curl_cffi.requests import AsyncSession
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_port(port: int, timeout: float = 20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"porta {port} non raggiungibile")
+
+
+def rss_kb(pid: int):
+    """(VmRSS, VmHWM) in kB da /proc, None se non disponibile."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            values = dict(line.split(":", 1) for line in f if ":" in line)
+        return int(values["VmRSS"].split()[0]), int(values["VmHWM"].split()[0])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def build_workload(total: int, titles: int, series_share: float, seed: int):
+    """
+    Lista di (type, id). Con titles > 0 gli ID seguono una distribuzione Zipf
+    su 'titles' titoli popolari; con titles == 0 ogni richiesta è un titolo nuovo.
+    """
+    rnd = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(titles)] if titles else None
+    workload = []
+    for n in range(total):
+        number = rnd.choices(range(titles), weights)[0] if titles else 1_000_000 + n
+        imdb_id = f"tt{number:07d}"
+        if rnd.random() < series_share:
+            workload.append(("series", f"{imdb_id}:1:{rnd.randint(1, 8)}"))
+        else:
+            workload.append(("movie", imdb_id))
+    return workload
+
+
+async def drive(base_url: str, configs: list, workload, concurrency: int, timeout: float):
+    latencies, errors, empty, statuses = [], 0, 0, {}
+    queue = list(reversed(workload))
+
+    async with AsyncSession(max_clients=concurrency, timeout=timeout) as session:
+        async def worker(config):
+            nonlocal errors, empty
+            while queue:
+                type, id = queue.pop()
+                started = time.perf_counter()
+                try:
+                    response = await session.get(f"{base_url}/{config}/stream/{type}/{id}.json")
+                    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                    if response.status_code != 200:
+                        errors += 1
+                    elif not response.json().get("streams"):
+                        empty += 1
+                except Exception:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        # Ogni client simulato usa sempre la stessa config (un utente = un tenant)
+        await asyncio.gather(*(worker(configs[n % len(configs)]) for n in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return latencies, errors, empty, statuses, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--titles", type=int, default=200, help="titoli popolari (0 = tutti diversi)")
+    parser.add_argument("--series-share", type=float, default=0.4)
+    parser.add_argument("--latency-ms", type=float, default=80)
+    parser.add_argument("--jitter-ms", type=float, default=40)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--dead-rate", type=float, default=0.0, help="quota di link diretti morti (404)")
+    parser.add_argument("--embeds", type=int, default=4)
+    parser.add_argument("--page-kb", type=int, default=60)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=1, help="processi uvicorn (WEB_WORKERS)")
+    parser.add_argument("--tenants", type=int, default=1, help="config utente diverse tra i client simulati")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="variabili d'ambiente extra per l'addon (es. STREAM_RESPONSE_DEADLINE=3)")
+    args = parser.parse_args()
+
+    fake_port, app_port = free_port(), free_port()
+    fake_base = f"http://127.0.0.1:{fake_port}"
+    workdir = tempfile.mkdtemp(prefix="addon-loadtest-")  # cache persistenti isolate
+
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": ROOT,
+        "TMDB_API_URL": f"{fake_base}/tmdb",
+        "VIX_DOMAIN": f"{fake_base}/vix",
+        "HTTP_WARMUP_URLS": fake_base,
+        "HTTP_VERSION": "1.1",  # Upstream finti in HTTP in chiaro: niente upgrade h2c
+        "HTTP_PER_HOST_LIMIT": "64",  # Tutti gli upstream finti condividono lo stesso host
+        "UPSTREAM_HOST_RATES": "",  # Limiti per host reali (mixdrop...) non pensati per il benchmark
+        "WEB_WORKERS": str(args.workers),
+    })
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+
+    fake = subprocess.Popen([
+        sys.executable, os.path.join(BENCH_DIR, "fake_upstreams.py"), "--port", str(fake_port),
+        "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+        "--failure-rate", str(args.failure_rate), "--dead-rate", str(args.dead_rate),
+        "--embeds", str(args.embeds), "--page-kb", str(args.page_kb),
+    ])
+    addon = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(app_port),
+         "--log-level", "warning", "--workers", str(args.workers)],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_port(fake_port)
+        wait_port(app_port)
+        configs = [
+            base64.b64encode(json.dumps({
+                "tmdb_key": f"bench{n}" if n else "bench", "mfp_url": f"{fake_base}/proxy", "mfp_pass": "bench",
+            }).encode()).decode()
+            for n in range(max(1, args.tenants))
+        ]
+        workload = build_workload(args.requests, args.titles, args.series_share, args.seed)
+        mem_before = rss_kb(addon.pid)
+
+        latencies, errors, empty, statuses, elapsed = asyncio.run(
+            drive(f"http://127.0.0.1:{app_port}", configs, workload, args.concurrency, args.timeout)
+        )
+        mem_after = rss_kb(addon.pid)
+    finally:
+        for proc in (addon, fake):
+            proc.terminate()
+        for proc in (addon, fake):
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    latencies.sort()
+    print(f"Richieste:      {len(latencies)} (concorrenza {args.concurrency}, titoli {args.titles or 'unici'})")
+    print(f"Durata:         {elapsed:.2f} s")
+    print(f"Throughput:     {len(latencies) / elapsed:.1f} req/s")
+    print(f"Latenza p50:    {percentile(latencies, 50) * 1000:.1f} ms")
+    print(f"Latenza p95:    {percentile(latencies, 95) * 1000:.1f} ms")
+    print(f"Latenza p99:    {percentile(latencies, 99) * 1000:.1f} ms")
+    print(f"Latenza max:    {latencies[-1] * 1000 if latencies else 0:.1f} ms")
+    print(f"Errori:         {errors}  status={statuses}")
+    print(f"Risposte vuote: {empty} (nessuno stream, parziali o rifiutate per sovraccarico)")
+    # Con --workers > 1 la memoria riportata è solo quella del processo supervisore
+    if mem_before and mem_after:
+        print(f"Memoria addon:  RSS {mem_before[0] / 1024:.1f} -> {mem_after[0] / 1024:.1f} MB, "
+              f"picco {mem_after[1] / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Packer minimale (formato Dean Edwards, base 62) per generare fixture e payload
+di prova nei benchmark. Non serve all'addon in produzione.
+"""
+import re
+from collections import Counter
+
+NUMERALS = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+WORD_RE = re.compile(r"\b\w+\b")
+
+DECODER = (
+    "eval(function(p,a,c,k,e,d){e=function(c){return(c<a?'':e(parseInt(c/a)))+((c=c%a)>35?"
+    "String.fromCharCode(c+29):c.toString(36))};if(!''.replace(/^/,String)){while(c--){d[e(c)]=k[c]||e(c)}"
+    "k=[function(e){return d[e]}];e=function(){return'\\\\w+'};c=1};while(c--){if(k[c]){p=p.replace("
+    "new RegExp('\\\\b'+e(c)+'\\\\b','g'),k[c])}}return p}"
+)
+
+
+def base_n(num: int, base: int = 62) -> str:
+    if num == 0:
+        return NUMERALS[0]
+    digits = []
+    while num:
+        num, rem = divmod(num, base)
+        digits.append(NUMERALS[rem])
+    return "".join(reversed(digits))
+
+
+def pack(source: str, base: int = 62, short_tail: bool = False) -> str:
+    """
+    Impacchetta 'source' (senza apici singoli). Le parole che coincidono con il
+    proprio simbolo restano al loro indice con valore vuoto, come nel packer originale,
+    così anche il decoder sequenziale produce lo stesso risultato.
+    short_tail=True chiude con ".split('|')))" (variante senza e,d usata da alcuni host).
+    """
+    if "'" in source:
+        raise ValueError("source must not contain single quotes")
+    words = [w for w, _ in Counter(WORD_RE.findall(source)).most_common()]
+    total = len(words)
+    codes = {base_n(i, base): i for i in range(total)}
+
+    slots = [None] * total
+    for word in words:
+        if word in codes:
+            slots[codes[word]] = word
+    free = (i for i, w in enumerate(slots) if w is None)
+    for word in words:
+        if word not in codes:
+            slots[next(free)] = word
+
+    encode = {word: base_n(i, base) for i, word in enumerate(slots)}
+    keywords = ["" if base_n(i, base) == word else word for i, word in enumerate(slots)]
+    payload = WORD_RE.sub(lambda m: encode[m.group(0)], source)
+    tail = ".split('|')))" if short_tail else ".split('|'),0,{}))"
+    return f"{DECODER}('{payload}',{base},{total},'{'|'.join(keywords)}'{tail}"
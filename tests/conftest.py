@@ -0,0 +1,6 @@
+import os
+import sys
+
+# I test importano il pacchetto app dalla radice del repository
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
@@ -0,0 +1 @@
+eval(function(p,a,c,k,e,d){e=function(c){return(c<a?'':e(parseInt(c/a)))+((c=c%a)>35?String.fromCharCode(c+29):c.toString(36))};if(!''.replace(/^/,String)){while(c--){d[e(c)]=k[c]||e(c)}k=[function(e){return d[e]}];e=function(){return'\\w+'};c=1};while(c--){if(k[c]){p=p.replace(new RegExp('\\b'+e(c)+'\\b','g'),k[c])}}return p}('0.2="3";0.b="//s-4.5.6/v/7.c?s=f&e=g&h=i";0.j="//s-4.5.6/k/7.l";0.m="";0.n=o;8 9={"a":"p qà r (t)","u":w};8 y=\'z://A.B/e/3\';$(\'#C\').D(\'E-2\',0.2);F(/\\d+x\\d+/.G(9.a)){0.H=1};$(\'.I\').J(\'L\\\'K «M»\');',62,49,'MDCore||ref|a1b2c3d4e5|delivery12|mxdcontent|net|4f2c9b1e7a3d8f60|var|vsconfig|titolo|wurl|mp4|||Xk3lP9qR_tZ2vB8nM1wA|1718301234|_t|1718283234|poster|thumbs|jpg|remotesub|chromecast|true|La|citt|incantata||2001|autostart||false||vsuri|https|mixdrop|ag|videoContainer|attr|data|if|test|hd|title|text|ultimo||bacio'.split('|'),0,{}))
\ No newline at end of file
@@ -0,0 +1 @@
+MDCore.ref="a1b2c3d4e5";MDCore.wurl="//s-delivery12.mxdcontent.net/v/4f2c9b1e7a3d8f60.mp4?s=Xk3lP9qR_tZ2vB8nM1wA&e=1718301234&_t=1718283234";MDCore.poster="//s-delivery12.mxdcontent.net/thumbs/4f2c9b1e7a3d8f60.jpg";MDCore.remotesub="";MDCore.chromecast=true;var vsconfig={"titolo":"La città incantata (2001)","autostart":false};var vsuri='https://mixdrop.ag/e/a1b2c3d4e5';$('#videoContainer').attr('data-ref',MDCore.ref);if(/\d+x\d+/.test(vsconfig.titolo)){MDCore.hd=1};$('.title').text('L\'ultimo «bacio»');
\ No newline at end of file
@@ -0,0 +1 @@
+eval(function(p,a,c,k,e,d){e=function(c){return(c<a?'':e(parseInt(c/a)))+((c=c%a)>35?String.fromCharCode(c+29):c.toString(36))};if(!''.replace(/^/,String)){while(c--){d[e(c)]=k[c]||e(c)}k=[function(e){return d[e]}];e=function(){return'\\w+'};c=1};while(c--){if(k[c]){p=p.replace(new RegExp('\\b'+e(c)+'\\b','g'),k[c])}}return p}('6(\'g\').h({j:[{7:"8://k.l.9/m/,n,.o/p.q"}],r:"8://t.9/i/u/a/c.v",w:"d%",y:"d%",z:"10",11:"12.13",15:[{7:"/16/a/17.18",19:"1a – 1bé sì",1c:"e"}],e:{1d:14,1e:0}});f 1f,4=0,1g=0,1h=0;6().1i(\'1j\',1k(x){1l(x.1m>=5&&4==0){4=1;$.1n(\'/1o?1p=1q&1r=c&1s=1-2-3&1t=1&1u=0\')}});f 1v=1w 1x(\'\\\\1y\\\\b\');',36,71,'||||x2ok||jwplayer|file|https|cc|00123||abcd1234efgh|100|captions|var|vplayer|setup||sources|hfs301|serversicuro|hls|dnzh4kn2lqkc7h5yvfqe3zbpkn4bp3ydrxwa|urlset|master|m3u8|image||supervideo|04|jpg|width||height|stretching|uniform|duration|6421|35||tracks|srt|abcd1234efgh_Italian|vtt|label|Italiano|perch|kind|fontSize|backgroundOpacity|vvplay|lastt|vastdone1|on|time|function|if|position|get|dl|op|view|file_code|hash|embed|adb|re|new|RegExp|bvplayer'.split('|'),0,{}))
\ No newline at end of file
@@ -0,0 +1 @@
+jwplayer('vplayer').setup({sources:[{file:"https://hfs301.serversicuro.cc/hls/,dnzh4kn2lqkc7h5yvfqe3zbpkn4bp3ydrxwa,.urlset/master.m3u8"}],image:"https://supervideo.cc/i/04/00123/abcd1234efgh.jpg",width:"100%",height:"100%",stretching:"uniform",duration:"6421.35",tracks:[{file:"/srt/00123/abcd1234efgh_Italian.vtt",label:"Italiano – perché sì",kind:"captions"}],captions:{fontSize:14,backgroundOpacity:0}});var vvplay,x2ok=0,lastt=0,vastdone1=0;jwplayer().on('time',function(x){if(x.position>=5&&x2ok==0){x2ok=1;$.get('/dl?op=view&file_code=abcd1234efgh&hash=1-2-3&embed=1&adb=0')}});var re=new RegExp('\\bvplayer\\b');
\ No newline at end of file
@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from app import main, resolvers
+from app.admission import Overloaded
+from app.breaker import UpstreamError, breakers
+from app.extractors.guardahd import GuardaHDProvider
+
+
+class FailingProvider:
+    def get_name(self):
+        return "FailingTest"
+
+    async def get_stream(self, id, type, config, client):
+        raise UpstreamError("HTTP 502")
+
+
+class HangingResolver:
+    name = "HangingTest"
+
+    async def resolve(self, url, client):
+        await asyncio.sleep(3600)
+
+
+def test_fast_upstream_failure_reaches_provider_breaker():
+    result = asyncio.run(main.process_provider(FailingProvider(), "tt1", "movie", {}, client=None))
+    assert result is None  # Fallito, non "nessuno stream"
+    calls = list(breakers.get("provider:FailingTest")._calls)
+    assert [ok for _ts, ok, _lat in calls] == [False]
+
+
+def test_cancelled_resolution_is_not_a_host_failure():
+    async def scenario():
+        provider = GuardaHDProvider()
+        task = asyncio.create_task(
+            provider._resolve_limited(HangingResolver(), "https://hanging.example/e/1", "tt1", None)
+        )
+        await asyncio.sleep(0.01)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(scenario())
+    assert list(breakers.get("host:HangingTest")._calls) == []
+
+
+def test_overload_is_not_cached_as_missing_link():
+    async def overloaded():
+        raise Overloaded("coda piena")
+
+    async def scenario():
+        with pytest.raises(Overloaded):
+            await resolvers.resolve_cached("https://overloaded.example/e/1", overloaded)
+
+    asyncio.run(scenario())
+    assert resolvers._resolved_cache.get("https://overloaded.example/e/1") is resolvers.MISSING
@@ -0,0 +1,51 @@
+import asyncio
+import os
+
+import pytest
+
+from app import settings
+from app.admission import HostBuckets, Overloaded
+from app.extractors.guardahd import GuardaHDProvider
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "resolvers")
+
+
+class FakeResponse:
+    def __init__(self, status_code, text=""):
+        self.status_code = status_code
+        self.text = text
+
+
+class BucketClient:
+    """Come http_pool: ogni richiesta passa dal token bucket dell'host (qui: un solo gettone)."""
+
+    def __init__(self, page: str):
+        self.page = page
+        self.buckets = HostBuckets({"mixdrop": 0.001}, default_rate=0, burst=1, max_wait=0.01)
+
+    async def get(self, url, **kwargs):
+        await self.buckets.wait(url.split("/")[2])
+        return FakeResponse(200, self.page)
+
+
+class HangingClient:
+    async def get(self, url, **kwargs):
+        await asyncio.sleep(3600)
+
+
+def resolve(client, urls):
+    headers = {"User-Agent": "test"}
+    return asyncio.run(GuardaHDProvider()._resolve_embeds(urls, "Film", "tt0000001", headers, client))
+
+
+def test_embeds_rejected_by_our_bucket_fail_the_provider():
+    with open(os.path.join(CORPUS, "mixdrop_long_tail.html"), encoding="utf-8") as f:
+        client = BucketClient(f.read())
+    with pytest.raises(Overloaded):
+        resolve(client, ["https://mixdrop.ag/e/bucket1", "https://mixdrop.ag/e/bucket2"])
+
+
+def test_embeds_past_the_deadline_fail_the_provider(monkeypatch):
+    monkeypatch.setattr(settings, "GUARDAHD_RESOLVE_DEADLINE", 0.05)
+    with pytest.raises(Overloaded):
+        resolve(HangingClient(), ["https://mixdrop.ag/e/deadline1"])
@@ -0,0 +1,101 @@
+import asyncio
+
+from app import settings
+from app.admission import HostBuckets, Overloaded
+from app.http import HttpPool, metric_host
+from app.liveness import ALIVE, DEAD, LinkChecker, UNKNOWN
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class FakeClient:
+    def __init__(self, *codes):
+        self.codes = list(codes)
+
+    async def scan(self, url, scanner, **kwargs):
+        code = self.codes.pop(0)
+        if isinstance(code, Exception):
+            raise code
+        return FakeResponse(code)
+
+
+def checker(*codes):
+    links = LinkChecker(interval=1, budget=10, concurrency=1, rate=0, recheck=60,
+                        timeout=1, max_failures=2, max_tracked=100)
+    links.client = FakeClient(*codes)
+    return links
+
+
+def test_forbidden_is_dead_only_after_repeated_failures():
+    url = "https://cdn.example/v.mp4"
+    links = checker(403, 403)
+    dead = []
+    links.on_dead(url, "key", lambda: dead.append(url))
+
+    asyncio.run(links.probe(url, {}))
+    assert links.status(url)[0] == UNKNOWN and dead == []
+
+    asyncio.run(links.probe(url, {}))
+    assert links.status(url)[0] == DEAD and dead == [url]
+
+
+def test_not_found_is_dead_at_once():
+    links = checker(404, 200)
+    asyncio.run(links.probe("https://cdn.example/gone.mp4", {}))
+    assert links.status("https://cdn.example/gone.mp4")[0] == DEAD
+    asyncio.run(links.probe("https://cdn.example/ok.mp4", {}))
+    assert links.status("https://cdn.example/ok.mp4")[0] == ALIVE
+
+
+def test_shed_probe_is_requeued_without_a_failure():
+    url = "https://cdn.example/busy.mp4"
+    links = checker(Overloaded("limite"), Overloaded("limite"), 403)
+    dead = []
+    links.on_dead(url, "key", lambda: dead.append(url))
+    for _ in range(3):
+        links._queue.pop(url, None)
+        asyncio.run(links.probe(url, {}))
+    assert dead == [] and links.status(url)[0] == UNKNOWN
+    assert links._state[url]["failures"] == 1
+
+
+def test_probes_skip_the_user_host_limits(monkeypatch):
+    from app import http
+
+    class Response:
+        status_code = 206
+        encoding = "utf-8"
+
+        async def aclose(self):
+            pass
+
+    class Session:
+        async def request(self, method, url, **kwargs):
+            return Response()
+
+    async def reject(host):
+        raise Overloaded(f"limite di richieste per {host}")
+
+    monkeypatch.setattr(http.host_buckets, "wait", reject)
+    pool = HttpPool()
+    pool._session = Session()
+    response = asyncio.run(pool.scan("https://vixsrc.example/playlist/1", None, host_limits=False))
+    assert response.status_code == 206
+    assert pool._host_limits == {}
+
+
+def test_unknown_hosts_share_metric_label_and_maps_stay_bounded(monkeypatch):
+    monkeypatch.setattr(settings, "HTTP_TRACKED_HOSTS", 3)
+    assert metric_host("mixdrop.ag") == "mixdrop.ag"
+    assert metric_host("cdn-4812.example.net") == "other"
+
+    pool = HttpPool()
+    buckets = HostBuckets({}, default_rate=1, burst=1, max_wait=0, max_hosts=3)
+    for n in range(10):
+        pool._host_limit(f"cdn{n}.example")
+        buckets._bucket(f"cdn{n}.example")
+    assert list(pool._host_limits) == ["cdn7.example", "cdn8.example", "cdn9.example"]
+    assert list(buckets._buckets) == ["cdn7.example", "cdn8.example", "cdn9.example"]
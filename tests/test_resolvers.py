@@ -0,0 +1,55 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from app.resolvers import NOT_FOUND, ResolveError, resolver_for
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "resolvers")
+
+with open(os.path.join(CORPUS, "cases.json"), encoding="utf-8") as _f:
+    CASES = json.load(_f)
+
+
+class FixtureResponse:
+    def __init__(self, status_code: int, text: str = ""):
+        self.status_code = status_code
+        self.text = text
+
+
+class FixtureClient:
+    """Client finto: URL -> pagina del corpus, 404 per tutto il resto."""
+
+    def __init__(self, pages: dict):
+        self.pages = pages
+
+    async def get(self, url: str, **kwargs):
+        if url in self.pages:
+            return FixtureResponse(200, self.pages[url])
+        return FixtureResponse(404)
+
+
+def resolve(url: str, pages: dict):
+    try:
+        return asyncio.run(resolver_for(url).resolve(url, FixtureClient(pages))), None
+    except ResolveError as e:
+        return None, e.reason
+
+
+@pytest.mark.parametrize("case", CASES, ids=lambda case: case.get("file") or case["url"])
+def test_saved_page(case):
+    resolver = resolver_for(case["url"])
+    assert (resolver.name if resolver else None) == case["resolver"]
+    if not case.get("file"):
+        return
+    with open(os.path.join(CORPUS, case["file"]), encoding="utf-8") as f:
+        result, reason = resolve(case["url"], {case["url"]: f.read()})
+    if "expect" in case:
+        assert result == case["expect"]
+    if "reason" in case:
+        assert reason == case["reason"]
+
+
+def test_removed_file_is_not_found():
+    assert resolve("https://mixdrop.ag/e/missing", {}) == (None, NOT_FOUND)
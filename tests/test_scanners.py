@@ -0,0 +1,64 @@
+import os
+
+import pytest
+
+from app.extractors.guardahd import movie_page_fields
+from app.scanners import BodyScriptScanner, MovieLinksScanner
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "scanners")
+
+
+def scan(scanner, text: str, size: int):
+    for start in range(0, len(text), size):
+        if scanner.feed(text[start:start + size]):
+            break
+    scanner.close()
+    return scanner
+
+
+@pytest.mark.parametrize("size", [1, 7, 64, 100_000])
+def test_mirrors_in_every_list_are_found(size):
+    with open(os.path.join(FIXTURES, "mostraguarda_two_lists.html"), encoding="utf-8") as f:
+        page = f.read()
+    title, links = movie_page_fields(scan(MovieLinksScanner(), page, size))
+    assert title == "Il Padrino"
+    assert links == [
+        "https://supervideo.cc/e/k8d0x1mirror1",
+        "https://mixdrop.ag/e/3nq7mirror2",
+        "https://maxstream.video/emb/mirror3",
+        "https://mixdrop.club/e/4pr8mirror4?a=1&b=2",
+    ]
+
+
+@pytest.mark.parametrize("size", [1, 5, 4096])
+def test_body_script_across_chunks(size):
+    page = "<html><head><script>var head = 1;</script></head><body class='x'>" \
+           "<script>window.video = {'token': 'abc'};</script><script>var later = 2;</script></body></html>"
+    scanner = scan(BodyScriptScanner(), page, size)
+    assert scanner.script == "window.video = {'token': 'abc'};"
+
+
+@pytest.mark.parametrize("tag", ["body", "script"])
+@pytest.mark.parametrize("split", [64, 90, 100, 500])
+def test_long_opening_tag_split_between_chunks(tag, split):
+    attrs = " ".join(f'data-a{n}="{"v" * 20}"' for n in range(30))
+    body = f"<body {attrs}>" if tag == "body" else "<body>"
+    script = f"<script {attrs}>" if tag == "script" else "<script>"
+    page = "<html><head><title>Player</title></head>" + body + "<div>x</div>" + script + "window.video = 1;</script>"
+    at = page.index(f"<{tag} ") + split
+    scanner = BodyScriptScanner()
+    scanner.feed(page[:at])
+    scanner.feed(page[at:])
+    scanner.close()
+    assert scanner.script == "window.video = 1;"
+
+
+def test_buffer_keeps_only_the_tail():
+    scanner = MovieLinksScanner()
+    scanner.feed("<h1>Film</h1>")
+    for _ in range(2000):
+        scanner.feed("<p>" + "x" * 1000 + "</p>")
+    assert len(scanner.buffer) < 10_000
+    scanner.feed('<li data-link="https://mixdrop.ag/e/late">MixDrop</li>')
+    scanner.close()
+    assert scanner.links == ["https://mixdrop.ag/e/late"]
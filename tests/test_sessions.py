@@ -0,0 +1,63 @@
+import asyncio
+
+from app.http import HttpPool
+from app.sessions import is_blocked
+
+
+class StreamedResponse:
+    """Risposta in streaming: .text non è disponibile, il corpo si legge solo a pezzi."""
+
+    encoding = "utf-8"
+
+    def __init__(self, status_code, body: bytes, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self._body = body
+
+    @property
+    def text(self):
+        raise RuntimeError("corpo in streaming")
+
+    async def aiter_content(self):
+        for start in range(0, len(self._body), 1000):
+            yield self._body[start:start + 1000]
+
+    async def aclose(self):
+        pass
+
+
+class FakeSession:
+    def __init__(self, response):
+        self.response = response
+
+    async def request(self, method, url, **kwargs):
+        return self.response
+
+
+class FakeProfiles:
+    def __init__(self, session):
+        self.profile = type("Profile", (), {"session": session, "headers": {}})()
+        self.reports = []
+
+    def pick(self):
+        return self.profile
+
+    async def report(self, profile, response, body=None):
+        self.reports.append(is_blocked(response, body))
+
+
+def scan_profiled(response):
+    pool = HttpPool()
+    pool._session = FakeSession(response)
+    pool.profiles = FakeProfiles(FakeSession(response))
+    asyncio.run(pool.scan("https://vixsrc.example/movie/1", scanner=None, profiled=True))
+    return pool.profiles.reports
+
+
+def test_challenge_page_on_profiled_scan_is_a_block():
+    page = b"<html><head><title>Just a moment...</title>" + b" " * 20000 + b"</html>"
+    assert scan_profiled(StreamedResponse(403, page)) == [True]
+
+
+def test_plain_forbidden_on_profiled_scan_is_not_a_block():
+    assert scan_profiled(StreamedResponse(403, b"<html>Forbidden</html>")) == [False]
@@ -0,0 +1,37 @@
+import asyncio
+import time
+
+from app.store import PersistentCache
+
+
+def test_update_keeps_timestamp_order_for_purge(tmp_path):
+    async def scenario():
+        cache = PersistentCache(str(tmp_path / "embeds.db"), table="embeds", shared=False)
+        now = time.time() * 1000
+        await cache.set("old", {"embedUrls": ["a", "b"]}, timestamp=now - 10_000_000)
+        await cache.set("fresh", {"embedUrls": ["c"]}, timestamp=now)
+        # Come _drop_embed: stesso timestamp, lista ridotta
+        await cache.set("old", {"embedUrls": ["a"]}, timestamp=now - 10_000_000)
+        removed = await cache.purge(ttl=3600)
+        kept = await cache.get("fresh")
+        await cache.close()
+        return removed, kept, len(cache)
+
+    removed, kept, size = asyncio.run(scenario())
+    assert removed == 1
+    assert kept == {"embedUrls": ["c"]}
+    assert size == 1
+
+
+def test_out_of_order_insert_is_purged(tmp_path):
+    async def scenario():
+        cache = PersistentCache(str(tmp_path / "embeds.db"), table="embeds", shared=False)
+        now = time.time() * 1000
+        await cache.set("fresh", 1, timestamp=now)
+        await cache.set("expired", 2, timestamp=now - 10_000_000)
+        removed = await cache.purge(ttl=3600)
+        kept = await cache.get("fresh")
+        await cache.close()
+        return removed, kept
+
+    assert asyncio.run(scenario()) == (1, 1)
@@ -0,0 +1,60 @@
+import asyncio
+import base64
+import json
+
+import orjson
+from starlette.requests import Request
+
+from app import main
+
+
+class FakeVix:
+    """Provider finto: con una TMDB Key sbagliata non trova nulla (come VixSrc con un 401 da TMDB)."""
+
+    def get_name(self):
+        return "VixSrc"
+
+    async def get_stream(self, id, type, config, client):
+        if config.get("tmdb_key") != "good":
+            return []
+        return [{"url": f"https://cdn.example/{id}.m3u8", "title": "VixSrc"}]
+
+
+class FakeSpec:
+    name = "VixSrc"
+    cost = 1
+    provider = FakeVix()
+
+
+def encode(config: dict) -> str:
+    return base64.b64encode(json.dumps(config).encode()).decode()
+
+
+def request():
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": [], "query_string": b""})
+
+
+def streams(response):
+    return orjson.loads(response.body)["streams"]
+
+
+def test_failure_of_one_tenant_is_not_served_to_another(monkeypatch):
+    monkeypatch.setattr(main, "providers_for", lambda type, config: [FakeSpec()])
+    main._stream_cache.clear()
+
+    async def scenario():
+        bad = await main.get_streams(encode({"tmdb_key": "bad"}), "movie", "tt0000001", request())
+        good = await main.get_streams(encode({"tmdb_key": "good"}), "movie", "tt0000001", request())
+        return bad, good
+
+    bad, good = asyncio.run(scenario())
+    assert streams(bad) == []
+    assert [s["url"] for s in streams(good)] == ["https://cdn.example/tt0000001.m3u8"]
+
+
+def test_same_credentials_share_the_cache_entry():
+    config = {"tmdb_key": "good", "mfp_url": "https://mfp.example", "mfp_pass": "x"}
+    assert main.stream_cache_key("movie", "tt1", config) == main.stream_cache_key("movie", "tt1", dict(config))
+    for key, value in (("tmdb_key", "other"), ("mfp_url", "https://other.example"), ("mfp_pass", "y")):
+        changed = {**config, key: value}
+        assert main.stream_cache_key("movie", "tt1", config) != main.stream_cache_key("movie", "tt1", changed)
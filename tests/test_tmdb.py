@@ -0,0 +1,37 @@
+import asyncio
+
+from app import utils
+
+
+class FakeResponse:
+    def __init__(self, status_code, data=None):
+        self.status_code = status_code
+        self._data = data
+
+    def json(self):
+        return self._data
+
+
+class FakeTMDB:
+    """Risponde 401 alla chiave sbagliata, dopo una piccola attesa (richieste concorrenti)."""
+
+    async def get(self, url, params=None):
+        await asyncio.sleep(0.01)
+        if params["api_key"] != "good":
+            return FakeResponse(401)
+        return FakeResponse(200, {"seasons": [{"season_number": 1, "episode_count": 8}]})
+
+
+def test_seasons_with_a_bad_key_do_not_fail_other_users():
+    utils._tmdb_cache.clear()
+
+    async def scenario():
+        client = FakeTMDB()
+        return await asyncio.gather(
+            utils.get_tmdb_seasons("1399", "bad", client),
+            utils.get_tmdb_seasons("1399", "good", client),
+        )
+
+    bad, good = asyncio.run(scenario())
+    assert bad is None
+    assert good == {1: 8}
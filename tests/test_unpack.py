@@ -0,0 +1,35 @@
+import os
+
+import pytest
+
+from app.utils import unpack_js
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "unpack")
+
+
+def read(name: str) -> str:
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("name", ["mixdrop_player", "supervideo_player"])
+def test_unpack_matches_browser_output(name):
+    # .src.js è il risultato di eval() del .packed.js in Node
+    assert unpack_js(read(f"{name}.packed.js")) == read(f"{name}.src.js")
+
+
+def test_escaped_quotes_and_backslashes():
+    unpacked = unpack_js(read("mixdrop_player.packed.js"))
+    assert "var vsuri='https://mixdrop.ag/e/a1b2c3d4e5'" in unpacked
+    assert "text('L\\'ultimo «bacio»')" in unpacked
+    assert "if(/\\d+x\\d+/.test(vsconfig.titolo))" in unpacked
+
+
+def test_non_ascii_letters_are_word_boundaries():
+    unpacked = unpack_js(read("supervideo_player.packed.js"))
+    assert 'label:"Italiano – perché sì"' in unpacked
+    assert "new RegExp('\\\\bvplayer\\\\b')" in unpacked
+
+
+def test_not_packed():
+    assert unpack_js("<html>nessun player</html>") is None